@@ -1,43 +1,392 @@
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, MongoClient, monitoring
 from beanie import init_beanie
-from expenses.models import Expense
-from users.models import UserProfile
+from expenses.models import (
+    Expense,
+    ExpenseRollup,
+    ExpenseTombstone,
+    UserExpenseState,
+)
+from users.models import UserDeletionJob, UserProfile
 from django.conf import settings
+from config.metrics import CommandTimingListener
+from expenses.explain import summarize_plan
+
+slow_query_logger = logging.getLogger("config.db.slow_queries")
 
-# Global motor client
+TOMBSTONE_TTL_INDEX = "deleted_at_ttl"
+
+# Global motor client, the process it was created in and its listeners
 motor_client = None
+motor_client_pid = None
+# Process whose client the Beanie documents are bound to
+beanie_pid = None
+pool_stats_listener = None
+slow_query_listener = None
 
 
-async def initialize_beanie():
-    """Initialize the MongoDB connection with Beanie ODM"""
-    global motor_client
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Count connection pool events to report pool utilization"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def _increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment("pool_clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._increment("checkouts")
+
+    def connection_checked_in(self, event):
+        self._increment("checkins")
+
+    def stats(self):
+        """Get the pool counters and the derived open/in use connection counts"""
+        with self._lock:
+            return {
+                "connections_open": (
+                    self.connections_created - self.connections_closed
+                ),
+                "connections_in_use": self.checkouts - self.checkins,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+            }
+
+
+# Where each command keeps its query, for the query shape
+QUERY_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+# Commands that can be explained by rerunning them under `explain`
+EXPLAINABLE_COMMANDS = {"find", "count", "distinct", "aggregate"}
+# Fields added to commands by the driver, dropped before explaining them
+DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber"}
+
+
+def redact(value):
+    """
+    Replace the values of a query with "?", keeping its field names,
+    operators and "$field" paths, so queries differing only by their values
+    share one shape.
+    """
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(i, dict) for i in value):
+        # Clauses ($or, $and) and pipeline stages
+        return [redact(item) for item in value]
+    return "?"
+
+
+def command_shape(command_name, command):
+    """
+    Get the redacted shape of a command: its collection, query shape and
+    sort, which are safe to log and identical for queries differing only by
+    their values.
+    """
+    # getMore holds its cursor ID under its name, and names the collection apart
+    collection_field = "collection" if command_name == "getMore" else command_name
+    shape = {"command": command_name, "collection": command.get(collection_field)}
+    query_field = QUERY_FIELDS.get(command_name)
+    if query_field and query_field in command:
+        query = command[query_field]
+        if command_name in ("update", "delete"):
+            # Statements of a write batch share their shape
+            query = [statement.get("q", {}) for statement in query[:1]]
+        shape["query"] = redact(query)
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    return shape
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """
+    Log the MongoDB commands slower than threshold_ms with their redacted
+    shape and duration. A sample of them (explain_rate, 0 to 1) is also run
+    again under `explain` on a separate client and thread, to log the
+    documents and keys they examined and the indexes they used.
+    """
 
-    # Create Motor client
-    connection_string = f"mongodb://{settings.DATABASES['default']['HOST']}:{settings.DATABASES['default']['PORT']}"
-    motor_client = AsyncIOMotorClient(connection_string)
+    def __init__(self, threshold_ms, explain_rate=0.0, explain_client_factory=None):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self._explain_client_factory = explain_client_factory
+        self._explain_client = None
+        self._explain_executor = None
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _key(self, event):
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        if event.command_name not in QUERY_FIELDS and event.command_name != "getMore":
+            return
+        with self._lock:
+            self._started[self._key(event)] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finished(event, "success")
+
+    def failed(self, event):
+        self._finished(event, "failure")
+
+    def _finished(self, event, outcome):
+        with self._lock:
+            started = self._started.pop(self._key(event), None)
+        duration_ms = event.duration_micros / 1000
+        if started is None or duration_ms < self.threshold_ms:
+            return
+
+        database_name, command = started
+        shape = command_shape(event.command_name, command)
+        slow_query_logger.warning(
+            "slow query: %.1f ms %s",
+            duration_ms,
+            shape,
+            extra={"duration_ms": duration_ms, "shape": shape, "outcome": outcome},
+        )
+        if (
+            event.command_name in EXPLAINABLE_COMMANDS
+            and self._explain_client_factory
+            and random.random() < self.explain_rate
+        ):
+            self._submit_explain(database_name, command, shape)
+
+    def _submit_explain(self, database_name, command, shape):
+        """Explain a slow command in the background, then log its plan"""
+        with self._lock:
+            if self._explain_executor is None:
+                self._explain_client = self._explain_client_factory()
+                self._explain_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="slow-query-explain"
+                )
+        command = {
+            key: value for key, value in command.items() if key not in DRIVER_FIELDS
+        }
+        self._explain_executor.submit(self._explain, database_name, command, shape)
+
+    def _explain(self, database_name, command, shape):
+        try:
+            explain = self._explain_client[database_name].command(
+                {"explain": command, "verbosity": "executionStats"}
+            )
+            if "queryPlanner" not in explain and explain.get("stages"):
+                # Aggregations explain the query of their first stage
+                explain = explain["stages"][0]["$cursor"]
+            plan = summarize_plan(explain)
+        except Exception as e:
+            slow_query_logger.info("could not explain %s: %s", shape, e)
+            return
+        slow_query_logger.warning(
+            "slow query plan: %s examined %s documents and %s keys, indexes %s",
+            shape,
+            plan["docs_examined"],
+            plan["keys_examined"],
+            plan["indexes"] or "none",
+            extra={"shape": shape, "plan": plan},
+        )
+
+    def close(self):
+        """Stop the explain thread and close its client"""
+        with self._lock:
+            if self._explain_executor is not None:
+                self._explain_executor.shutdown(wait=False)
+                self._explain_client.close()
+                self._explain_executor = self._explain_client = None
+
+
+def _connection_string():
+    """Get the MongoDB connection string from the database settings"""
+    return f"mongodb://{settings.DATABASES['default']['HOST']}:{settings.DATABASES['default']['PORT']}"
+
+
+def _create_explain_client():
+    """Create the small synchronous client running sampled explains"""
+    return MongoClient(
+        _connection_string(),
+        maxPoolSize=1,
+        serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    )
+
+
+def _create_motor_client(*listeners):
+    """
+    Create a Motor client configured from the MONGODB_* settings, reporting
+    its events to the listeners and to the request timings.
+    """
+    connection_string = _connection_string()
+    options = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        # 0 leaves idle connections and socket reads unbounded
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS or None,
+        "socketTimeoutMS": settings.MONGODB_SOCKET_TIMEOUT_MS or None,
+        "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "readPreference": settings.MONGODB_READ_PREFERENCE,
+        "event_listeners": [
+            listener for listener in listeners if listener
+        ] + [CommandTimingListener()],
+    }
+    if settings.MONGODB_COMPRESSORS:
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+    return AsyncIOMotorClient(connection_string, **options)
+
+
+async def initialize_beanie():
+    """
+    Initialize the MongoDB connection with Beanie ODM.
+    Beanie creates the indexes declared in each model's Settings.indexes
+    if they do not exist yet, so the access paths are indexed on startup.
+    """
+    client = get_motor_client()
 
     # Initialize Beanie with the document models
     await init_beanie(
-        database=motor_client[settings.DATABASES["default"]["NAME"]],
-        document_models=[Expense, UserProfile],
+        database=client[settings.DATABASES["default"]["NAME"]],
+        document_models=[
+            Expense,
+            ExpenseRollup,
+            ExpenseTombstone,
+            UserExpenseState,
+            UserDeletionJob,
+            UserProfile,
+        ],
     )
+    await apply_tombstone_retention()
 
-    return motor_client
+    global beanie_pid
+    beanie_pid = os.getpid()
+    return client
+
+
+async def ensure_beanie():
+    """
+    Initialize Beanie unless it was already initialized in this process.
+    Beanie binds the documents to the client they were initialized with, so
+    a worker forked after the initialization (e.g. gunicorn --preload)
+    initializes them again on its own client.
+    """
+    if beanie_pid != os.getpid():
+        await initialize_beanie()
+
+
+async def apply_tombstone_retention():
+    """
+    Create the TTL index through which MongoDB drops the tombstones older
+    than EXPENSES_TOMBSTONE_RETENTION_DAYS, or change its expiry in place
+    with collMod when the setting changed.
+    """
+    collection = ExpenseTombstone.get_motor_collection()
+    expire_after = settings.EXPENSES_TOMBSTONE_RETENTION_DAYS * 86400
+    index = (await collection.index_information()).get(TOMBSTONE_TTL_INDEX)
+    if index is None:
+        await collection.create_index(
+            [("deleted_at", ASCENDING)],
+            name=TOMBSTONE_TTL_INDEX,
+            expireAfterSeconds=expire_after,
+        )
+    elif index.get("expireAfterSeconds") != expire_after:
+        await collection.database.command(
+            {
+                "collMod": collection.name,
+                "index": {
+                    "name": TOMBSTONE_TTL_INDEX,
+                    "expireAfterSeconds": expire_after,
+                },
+            }
+        )
 
 
 def get_motor_client():
-    """Get the global Motor client"""
-    global motor_client
-    if not motor_client:
-        # If running in a sync context, create the client but don't initialize Beanie
-        connection_string = f"mongodb://{settings.DATABASES['default']['HOST']}:{settings.DATABASES['default']['PORT']}"
-        motor_client = AsyncIOMotorClient(connection_string)
+    """
+    Get the Motor client of the current process, creating it on first use.
+    A client inherited from a parent process (e.g. a gunicorn master forking
+    workers) is not reused, so each worker owns exactly one client and pool.
+    The documents only use the new client once Beanie is initialized again
+    in the worker, see ensure_beanie.
+    """
+    global motor_client, motor_client_pid, pool_stats_listener, slow_query_listener
+    if motor_client is None or motor_client_pid != os.getpid():
+        pool_stats_listener = PoolStatsListener()
+        slow_query_listener = None
+        if settings.MONGODB_SLOW_QUERY_MS > 0:
+            slow_query_listener = SlowQueryListener(
+                settings.MONGODB_SLOW_QUERY_MS,
+                settings.MONGODB_SLOW_QUERY_EXPLAIN_RATE,
+                _create_explain_client,
+            )
+        motor_client = _create_motor_client(pool_stats_listener, slow_query_listener)
+        motor_client_pid = os.getpid()
     return motor_client
 
 
+def get_pool_stats():
+    """Get the connection pool utilization of the current process"""
+    stats = {"pid": os.getpid(), "max_pool_size": settings.MONGODB_MAX_POOL_SIZE}
+    if pool_stats_listener and motor_client_pid == os.getpid():
+        stats.update(pool_stats_listener.stats())
+    return stats
+
+
 def close_motor_client():
     """Close the global Motor client"""
-    global motor_client
+    global motor_client, motor_client_pid, beanie_pid
     if motor_client:
         motor_client.close()
         motor_client = None
+        motor_client_pid = None
+        beanie_pid = None
+    if slow_query_listener:
+        slow_query_listener.close()
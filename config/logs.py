@@ -0,0 +1,127 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config import metrics
+
+# Attributes of every LogRecord, so the ones passed through `extra` stand out
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line: time, level, logger, message
+    and the fields passed through `extra`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundStreamHandler(QueueHandler):
+    """
+    Write records to a stream from a background thread. Logging only puts
+    the record on a bounded queue, so a burst of log lines never blocks the
+    event loop on a slow stream; records arriving while the queue is full
+    are dropped and counted instead. Formatting happens in the background
+    thread too, with the formatter set on this handler.
+    """
+
+    def __init__(self, stream=None, max_queue_size: int = 10000):
+        super().__init__(queue.Queue(max_queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self._start()
+        atexit.register(self.stop)
+        # The listener thread does not survive a fork (e.g. gunicorn workers)
+        os.register_at_fork(after_in_child=self._restart)
+
+    def _start(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self._running = True
+
+    def _restart(self):
+        self.queue = queue.Queue(self.queue.maxsize)
+        self._start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, as its arguments may change once queued
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.events.inc("log_dropped", record.levelname)
+
+    def stop(self):
+        """Write the queued records and stop the background thread"""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+
+class RateLimitedLog:
+    """
+    Log an event at most once per interval per reason, with the number of
+    occurrences since the last line, instead of one line per occurrence.
+    Every occurrence is counted in the events_total metric.
+    """
+
+    def __init__(self, logger: logging.Logger, event: str, interval: float):
+        self.logger = logger
+        self.event = event
+        self.interval = interval
+        self._pending: Dict[str, int] = {}
+        self._last_logged: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, reason: str, level: int = logging.WARNING, detail: Optional[str] = None
+    ):
+        """Count an occurrence, and log it if the reason was quiet for an interval"""
+        metrics.events.inc(self.event, reason)
+        now = time.monotonic()
+        with self._lock:
+            count = self._pending.get(reason, 0) + 1
+            if now - self._last_logged.get(reason, float("-inf")) < self.interval:
+                self._pending[reason] = count
+                return
+            self._pending[reason] = 0
+            self._last_logged[reason] = now
+        self.logger.log(
+            level,
+            "%s: %s (%d occurrences since the last report)%s",
+            self.event,
+            reason,
+            count,
+            f": {detail}" if detail else "",
+            extra={"event": self.event, "reason": reason, "occurrences": count},
+        )
@@ -0,0 +1,274 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction
+from pymongo import monitoring
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+# Upper bounds of the per-request database command count buckets
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with one series per combination of label
+    values. Observations are counted in the first bucket they fit in; the
+    cumulative counts are computed when rendering.
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        """Record one observation in the series of the label values"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum and count
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        """Drop every series"""
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        """Render the histogram in the Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                (label_values, [list(counts), total, count])
+                for label_values, (counts, total, count) in self._series.items()
+            )
+        for label_values, (counts, total, count) in series:
+            labels = [
+                f'{label}="{_escape(value)}"'
+                for label, value in zip(self.labels, label_values)
+            ]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    """Prometheus-style counter with one series per combination of label values"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series: Dict[Tuple[str, ...], int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: int = 1):
+        """Add amount to the series of the label values"""
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> int:
+        """Get the current value of the series of the label values"""
+        with self._lock:
+            return self._series.get(label_values, 0)
+
+    def clear(self):
+        """Drop every series"""
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        """Render the counter in the Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, value in series:
+            labels = ",".join(
+                f'{label}="{_escape(label_value)}"'
+                for label, label_value in zip(self.labels, label_values)
+            )
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response, by route, method and status.",
+    ("route", "method", "status"),
+    DURATION_BUCKETS,
+)
+request_phase_duration = Histogram(
+    "http_request_phase_duration_seconds",
+    "Time spent per request in each phase (auth, db, validate, serialize, encode).",
+    ("phase",),
+    DURATION_BUCKETS,
+)
+request_db_commands = Histogram(
+    "http_request_db_commands",
+    "MongoDB commands run per request.",
+    (),
+    COUNT_BUCKETS,
+)
+db_command_duration = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round trip time, by command and outcome.",
+    ("command", "outcome"),
+    DURATION_BUCKETS,
+)
+events = Counter(
+    "events_total",
+    "Occurrences of events logged at a limited rate (see config.logs), by reason.",
+    ("event", "reason"),
+)
+METRICS = [
+    request_duration,
+    request_phase_duration,
+    request_db_commands,
+    db_command_duration,
+    events,
+]
+
+
+class RequestTimings:
+    """Time spent in each phase of one request, and its database command count"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.db_commands = 0
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        # Database commands are reported from Motor's executor threads
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_db_command(self, seconds: float):
+        with self._lock:
+            self.phases["db"] = self.phases.get("db", 0.0) + seconds
+            self.db_commands += 1
+
+    def server_timing(self, total: float) -> str:
+        """Render the timings as a Server-Timing header value, in milliseconds"""
+        with self._lock:
+            phases = dict(self.phases)
+            db_commands = self.db_commands
+        entries = []
+        for phase, seconds in phases.items():
+            entry = f"{phase};dur={seconds * 1000:.2f}"
+            if phase == "db":
+                entry += f';desc="{db_commands} commands"'
+            entries.append(entry)
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+# Timings of the request being served. Motor copies the context into the
+# threads running the commands, so the command listener sees it too.
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the time spent in the block to a phase of the current request"""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def timed(name: str) -> Callable:
+    """Decorator adding the time spent in a function to a request phase"""
+
+    def decorator(fn):
+        if iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with phase(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """
+    Record the round trip time of every MongoDB command, in the command
+    histogram and in the database phase of the request that issued it.
+    """
+
+    def started(self, event):
+        pass
+
+    def _record(self, event, outcome: str):
+        seconds = event.duration_micros / 1_000_000
+        db_command_duration.observe(seconds, event.command_name, outcome)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add_db_command(seconds)
+
+    def succeeded(self, event):
+        self._record(event, "success")
+
+    def failed(self, event):
+        self._record(event, "failure")
+
+
+def observe_request(
+    timings: RequestTimings, total: float, route: str, method: str, status: int
+):
+    """Record a finished request in the request histograms"""
+    request_duration.observe(total, route, method, str(status))
+    for name, seconds in list(timings.phases.items()):
+        request_phase_duration.observe(seconds, name)
+    request_db_commands.observe(timings.db_commands)
+
+
+def render_prometheus() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,97 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from config import metrics
+
+
+class SitePathMiddleware:
+    """
+    Run the middleware listed in settings.SITE_MIDDLEWARE only for requests
+    outside settings.API_PATH_PREFIX. API requests authenticate with bearer
+    tokens and never use sessions, CSRF cookies or messages, so they go
+    straight to the view, without the thread hops those sync middleware cause
+    under ASGI.
+
+    The wrapped middleware only take part through __call__ (process_request
+    and process_response); their process_view and process_exception hooks are
+    not run. The admin views enforce CSRF with their own decorators.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.site_response = get_response
+        for middleware_path in reversed(settings.SITE_MIDDLEWARE):
+            self.site_response = import_string(middleware_path)(self.site_response)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _handler(self, request):
+        """Pick the bare view handler for API paths, the site stack otherwise"""
+        if request.path_info.startswith(settings.API_PATH_PREFIX):
+            return self.get_response
+        return self.site_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._handler(request)(request)
+
+    async def __acall__(self, request):
+        return await self._handler(request)(request)
+
+
+class ServerTimingMiddleware:
+    """
+    Time each request by phase (see config.metrics): authentication,
+    MongoDB round trips, model validation, serialization and JSON encoding. The timings are
+    sent back in a Server-Timing header and recorded in the histograms served
+    by /api/metrics/. Streamed bodies are produced after the response is
+    returned, so their time is not included.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_timings.reset(token)
+        return self._finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_timings.reset(token)
+        return self._finish(request, response, timings, start)
+
+    def _start(self):
+        timings = metrics.RequestTimings()
+        return timings, metrics.current_timings.set(timings), time.perf_counter()
+
+    def _finish(self, request, response, timings, start):
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        route = match.route if match else "unmatched"
+        metrics.observe_request(
+            timings, total, route, request.method, response.status_code
+        )
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timings.server_timing(total)
+        return response
@@ -0,0 +1,58 @@
+import datetime
+import json
+from typing import Any
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+from config.metrics import phase
+
+# orjson is a requirement; the stdlib encoder only stands in if it is missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder keeping full datetime precision, so the stdlib fallback
+    renders datetimes exactly like orjson and datetime.isoformat().
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def stdlib_dumps(data: Any) -> bytes:
+    """Encode data as compact JSON with the stdlib encoder"""
+    return json.dumps(data, cls=JSONEncoder, separators=(",", ":")).encode()
+
+
+def orjson_dumps(data: Any) -> bytes:
+    """Encode data as compact JSON with orjson"""
+    return orjson.dumps(data)
+
+
+# Encode data as JSON bytes, with UUIDs and datetimes rendered as strings
+dumps = orjson_dumps if orjson is not None else stdlib_dumps
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse encoding with orjson when it is installed, and with the
+    stdlib encoder otherwise. UUIDs and datetimes can be passed as is.
+    """
+
+    def __init__(self, data: Any, safe: bool = True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        with phase("encode"):
+            content = dumps(data)
+        super().__init__(content=content, **kwargs)
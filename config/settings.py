@@ -54,6 +54,60 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Middleware profile
+# "full" runs the stack above for every request. "lean" serves API_PATH_PREFIX
+# with no middleware at all (API views authenticate with bearer tokens and are
+# csrf_exempt) and runs the stack only for other paths such as the admin,
+# through config.middleware.SitePathMiddleware.
+MIDDLEWARE_PROFILE = config('MIDDLEWARE_PROFILE', default='full')
+API_PATH_PREFIX = '/api/'
+SITE_MIDDLEWARE = MIDDLEWARE
+if MIDDLEWARE_PROFILE == 'lean':
+    MIDDLEWARE = ['config.middleware.SitePathMiddleware']
+    # The admin checks look for the session, auth and message middleware in
+    # MIDDLEWARE; in this profile SitePathMiddleware runs them for the admin
+    SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
+# Logging
+# Records are written to stderr by a background thread (see
+# config.logs.BackgroundStreamHandler), as JSON lines or, with
+# LOG_FORMAT=text, as plain text. Repeated failures on the request path
+# (bad tokens, rejected expenses) are counted in /api/metrics/ and logged at
+# most once per LOG_RATE_LIMIT_INTERVAL seconds per reason.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_FORMAT = config('LOG_FORMAT', default='json')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'config.logs.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'background': {
+            'class': 'config.logs.BackgroundStreamHandler',
+            'formatter': LOG_FORMAT,
+            'stream': 'ext://sys.stderr',
+        },
+    },
+    'root': {'handlers': ['background'], 'level': LOG_LEVEL},
+    'loggers': {
+        'django': {'handlers': ['background'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+LOG_RATE_LIMIT_INTERVAL = config('LOG_RATE_LIMIT_INTERVAL', default=10, cast=float)
+
+# Request timings
+# config.middleware.ServerTimingMiddleware times every request by phase
+# (auth, db, validate, serialize, encode), records the timings in histograms
+# served in the Prometheus text format by /api/metrics/ (internal clients
+# only) and, with SERVER_TIMING_HEADER, sends them back in a Server-Timing
+# header.
+REQUEST_TIMING = config('REQUEST_TIMING', default=True, cast=bool)
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+if REQUEST_TIMING:
+    MIDDLEWARE = ['config.middleware.ServerTimingMiddleware'] + MIDDLEWARE
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -139,6 +193,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # JWT Settings
 JWT_SECRET_KEY = config('JWT_SECRET_KEY', default="CHANGE THIS IN PRODUCTION")
 JWT_ALGORITHM = 'HS256'
+# Verified tokens kept in memory so a reused token is not decoded again.
+# Entries live for at most JWT_CACHE_TTL seconds and never past the token's
+# own expiry; a size of 0 disables the cache.
+JWT_CACHE_SIZE = config('JWT_CACHE_SIZE', default=10000, cast=int)
+JWT_CACHE_TTL = config('JWT_CACHE_TTL', default=300, cast=int)
 
 # MongoDB settings for Beanie (used by the async API)
 # These settings are used in config/db.py to initialize Beanie
@@ -149,3 +208,83 @@ MONGODB_PORT = 27017
 # MONGODB_USERNAME = 'your_username'
 # MONGODB_PASSWORD = 'your_password'
 # MONGODB_AUTH_SOURCE = 'admin'
+
+# Motor connection pool, one per worker process (see config/db.py).
+# A timeout or idle time of 0 means no limit. MONGODB_COMPRESSORS is a comma
+# separated list of zstd, snappy and zlib (zstd and snappy need extra packages).
+MONGODB_MAX_POOL_SIZE = config('MONGODB_MAX_POOL_SIZE', default=100, cast=int)
+MONGODB_MIN_POOL_SIZE = config('MONGODB_MIN_POOL_SIZE', default=0, cast=int)
+MONGODB_MAX_IDLE_TIME_MS = config('MONGODB_MAX_IDLE_TIME_MS', default=0, cast=int)
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = config('MONGODB_SERVER_SELECTION_TIMEOUT_MS', default=30000, cast=int)
+MONGODB_CONNECT_TIMEOUT_MS = config('MONGODB_CONNECT_TIMEOUT_MS', default=20000, cast=int)
+MONGODB_SOCKET_TIMEOUT_MS = config('MONGODB_SOCKET_TIMEOUT_MS', default=0, cast=int)
+MONGODB_COMPRESSORS = config('MONGODB_COMPRESSORS', default='')
+MONGODB_READ_PREFERENCE = config('MONGODB_READ_PREFERENCE', default='primary')
+
+# Slow query log: MongoDB commands taking at least MONGODB_SLOW_QUERY_MS are
+# logged to the "config.db.slow_queries" logger with their query shape (values
+# redacted). A fraction MONGODB_SLOW_QUERY_EXPLAIN_RATE of the slow reads is
+# explained again in the background to log the documents they examined.
+# A threshold of 0 disables the log.
+MONGODB_SLOW_QUERY_MS = config('MONGODB_SLOW_QUERY_MS', default=100, cast=float)
+MONGODB_SLOW_QUERY_EXPLAIN_RATE = config('MONGODB_SLOW_QUERY_EXPLAIN_RATE', default=0.0, cast=float)
+
+# Clients allowed to read the monitoring endpoints under /api/stats/
+INTERNAL_IPS = config('INTERNAL_IPS', default='127.0.0.1', cast=lambda value: [ip.strip() for ip in value.split(',')])
+
+# Expense list pagination
+# Default and maximum number of expenses returned per page by GET /api/expenses/
+EXPENSES_PAGE_SIZE = config('EXPENSES_PAGE_SIZE', default=100, cast=int)
+EXPENSES_MAX_PAGE_SIZE = config('EXPENSES_MAX_PAGE_SIZE', default=1000, cast=int)
+
+# Every expense list query walks an index, but filters the index does not
+# cover (e.g. description with any sort, or tag when sorting by amount) are
+# checked on each fetched document. Such queries log a warning, or are
+# rejected with a 400 when this is enabled.
+EXPENSES_REJECT_UNINDEXED_FILTERS = config('EXPENSES_REJECT_UNINDEXED_FILTERS', default=False, cast=bool)
+
+# Expenses per chunk when streaming the whole history (?stream=1 or NDJSON),
+# which bounds the memory used by a streaming response
+EXPENSES_STREAM_BATCH_SIZE = config('EXPENSES_STREAM_BATCH_SIZE', default=500, cast=int)
+
+# Bulk expense imports (POST /api/expenses/bulk/): rows accepted per request
+# and documents written per insert_many call
+EXPENSES_BULK_MAX_ROWS = config('EXPENSES_BULK_MAX_ROWS', default=10000, cast=int)
+EXPENSES_BULK_CHUNK_SIZE = config('EXPENSES_BULK_CHUNK_SIZE', default=1000, cast=int)
+
+# Engine behind GET /api/expenses/search/: the MongoDB text index, or
+# 'expenses.search.InvertedIndexSearchBackend', a pure-Python inverted index
+# for databases without text search (e.g. mongomock in tests)
+EXPENSES_SEARCH_BACKEND = config('EXPENSES_SEARCH_BACKEND', default='expenses.search.MongoTextSearchBackend')
+
+# Delta sync (GET /api/expenses/changes/): deleted expenses leave tombstones
+# for EXPENSES_TOMBSTONE_RETENTION_DAYS, and older checkpoints must resync.
+# The TTL index dropping them is created on startup, and its expiry updated
+# in place (collMod) when the retention changes. Changes younger than
+# EXPENSES_CHANGES_SETTLE_SECONDS are held back, so writes still in flight on
+# other workers cannot land behind a checkpoint already handed out.
+EXPENSES_TOMBSTONE_RETENTION_DAYS = config('EXPENSES_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+EXPENSES_CHANGES_SETTLE_SECONDS = config('EXPENSES_CHANGES_SETTLE_SECONDS', default=2, cast=float)
+
+# Read-through cache of single expenses and expense list pages, keyed by the
+# user's expense version, so a write in any worker retires the entries of
+# every worker. LocalCacheBackend keeps a bounded LRU per worker
+# process; to share entries between workers, use
+# 'expenses.cache.DjangoCacheBackend' with OPTIONS {'alias': '<CACHES alias>'}
+# pointing at e.g. a RedisCache. A TTL of 0 disables the cache.
+EXPENSES_CACHE = {
+    'BACKEND': 'expenses.cache.LocalCacheBackend',
+    'TTL': config('EXPENSES_CACHE_TTL', default=60, cast=int),
+    'OPTIONS': {'max_size': config('EXPENSES_CACHE_SIZE', default=10000, cast=int)},
+}
+
+# Deleting a user purges their expenses in the background, USER_DELETION_BATCH_SIZE
+# expenses per delete_many, pausing USER_DELETION_PAUSE_SECONDS between
+# batches so a large purge leaves room for the other requests
+USER_DELETION_BATCH_SIZE = config('USER_DELETION_BATCH_SIZE', default=1000, cast=int)
+USER_DELETION_PAUSE_SECONDS = config('USER_DELETION_PAUSE_SECONDS', default=0.05, cast=float)
+# The purge runs on the server's event loop, which only outlives the request
+# under ASGI; under WSGI (runserver, wsgi_gunicorn) it is cut short. Unfinished
+# jobs without progress for USER_DELETION_STALE_SECONDS are reported as stale
+# and rerun by `manage.py purge_deleted_users`, e.g. from cron.
+USER_DELETION_STALE_SECONDS = config('USER_DELETION_STALE_SECONDS', default=300, cast=int)
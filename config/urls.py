@@ -16,9 +16,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from config import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/stats/db/', views.DatabasePoolStatsView.as_view(), name='stats-db'),
+    path('api/stats/cache/', views.ExpenseCacheStatsView.as_view(), name='stats-cache'),
+    path('api/metrics/', views.MetricsView.as_view(), name='metrics'),
     path('api/users/', include('users.urls')),
     path('api/expenses/', include('expenses.urls')),
 ]
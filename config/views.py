@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.views import View
+
+from config import metrics
+from config.db import get_pool_stats
+from config.responses import FastJsonResponse
+from expenses.cache import expense_cache
+
+
+def is_internal_request(request: HttpRequest) -> bool:
+    """Whether a request comes from a client listed in settings.INTERNAL_IPS"""
+    return request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+
+
+class DatabasePoolStatsView(View):
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
+        """Get the MongoDB connection pool utilization of this worker process"""
+        if not is_internal_request(request):
+            return FastJsonResponse({"detail": "not found"}, status=404)
+
+        return FastJsonResponse(get_pool_stats())
+
+
+class ExpenseCacheStatsView(View):
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
+        """Get the expense cache hit rates of this worker process"""
+        if not is_internal_request(request):
+            return FastJsonResponse({"detail": "not found"}, status=404)
+
+        return FastJsonResponse(expense_cache.stats())
+
+
+class MetricsView(View):
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        """Get the request and MongoDB command histograms of this worker process"""
+        if not is_internal_request(request):
+            return FastJsonResponse({"detail": "not found"}, status=404)
+
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
@@ -0,0 +1,200 @@
+import abc
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class CacheBackend(abc.ABC):
+    """
+    Interface of the stores behind ExpenseCache. Values are plain picklable
+    objects (dicts, lists, strings, numbers, UUIDs and datetimes), so a
+    Redis-compatible store can implement it by serializing them.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a cached value, None if absent or expired"""
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, ttl: float):
+        """Cache a value for ttl seconds"""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """Drop a cached value if present"""
+
+    @abc.abstractmethod
+    async def clear(self):
+        """Drop every cached value"""
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    Bounded in-process LRU cache with per entry expiry.
+    Each worker process holds its own copy.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    async def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend(CacheBackend):
+    """
+    Store entries in one of the caches configured in settings.CACHES, e.g.
+    django.core.cache.backends.redis.RedisCache to share them between workers.
+    """
+
+    def __init__(self, alias: str = "default"):
+        self.cache = caches[alias]
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self.cache.aget(key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.cache.aset(key, value, ttl)
+
+    async def delete(self, key: str):
+        await self.cache.adelete(key)
+
+    async def clear(self):
+        await self.cache.aclear()
+
+
+class ExpenseCache:
+    """
+    Read-through cache of serialized expenses and expense list pages.
+
+    Entries are keyed by the user's expense version (see expenses.state),
+    which every write bumps in MongoDB after changing the expenses. A reader
+    holding the current version can only be served data at least that new,
+    whichever worker made the write and whether or not the backend is
+    shared between workers; entries of older versions are never read again
+    and age out with their ttl.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = {"expense": 0, "list": 0}
+        self.misses = {"expense": 0, "list": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def _get_or_load(
+        self, kind: str, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Get a cached value, or load and cache it. None is never cached."""
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits[kind] += 1
+            return value
+
+        self.misses[kind] += 1
+        value = await loader()
+        if value is not None:
+            await self.backend.set(key, value, self.ttl)
+        return value
+
+    async def get_expense(
+        self,
+        user_id: UUID,
+        expense_id: UUID,
+        version: int,
+        loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get a serialized expense at the user's expense version, loading it
+        on a miss. Read the version before calling, never after.
+        """
+        if not self.enabled:
+            return await loader()
+        key = f"expenses:{user_id}:{version}:expense:{expense_id}"
+        return await self._get_or_load("expense", key, loader)
+
+    async def get_page(
+        self,
+        user_id: UUID,
+        version: int,
+        page: str,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Get a page of serialized expenses at the user's expense version,
+        loading it on a miss. page identifies the page among the user's lists
+        (limit, cursor, filters...). Read the version before calling.
+        """
+        if not self.enabled:
+            return await loader()
+        digest = hashlib.blake2b(page.encode(), digest_size=16).hexdigest()
+        key = f"expenses:{user_id}:{version}:list:{digest}"
+        return tuple(await self._get_or_load("list", key, loader))
+
+    async def clear(self):
+        """Drop every cached value and reset the counters"""
+        await self.backend.clear()
+        for counters in (self.hits, self.misses):
+            for kind in counters:
+                counters[kind] = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the hit/miss counters and hit rate per kind of read"""
+        stats = {}
+        for kind in self.hits:
+            hits, misses = self.hits[kind], self.misses[kind]
+            total = hits + misses
+            stats[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / total, 4) if total else None,
+            }
+        return stats
+
+
+def _create_expense_cache() -> ExpenseCache:
+    """Create the expense cache configured by settings.EXPENSES_CACHE"""
+    options = settings.EXPENSES_CACHE
+    backend = import_string(options["BACKEND"])(**options.get("OPTIONS", {}))
+    return ExpenseCache(backend, options["TTL"])
+
+
+expense_cache = _create_expense_cache()
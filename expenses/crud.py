@@ -1,6 +1,32 @@
-from typing import List, Dict, Any, Optional, Union
+import logging
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Union
 from uuid import UUID
-from .models import Expense
+import pymongo
+from beanie.odm.utils.encoder import Encoder
+from django.conf import settings
+from django.utils import timezone
+from pydantic import TypeAdapter, ValidationError
+from pymongo.errors import BulkWriteError
+from config.logs import RateLimitedLog
+from config.metrics import phase
+from . import rollups, state
+from .cache import expense_cache
+from .models import Expense, ExpenseRollup, ExpenseTombstone
+from .pagination import (
+    decode_checkpoint,
+    decode_cursor,
+    encode_checkpoint,
+    encode_cursor,
+)
+
+logger = logging.getLogger(__name__)
+
+# Queries filtering outside their index, logged at most once per interval per shape
+unindexed_filter_log = RateLimitedLog(
+    logger, "expense_unindexed_filter", settings.LOG_RATE_LIMIT_INTERVAL
+)
 
 
 async def get_expense_by_id(
@@ -16,8 +42,8 @@ async def get_expense_by_id(
         if isinstance(user_id, str):
             user_id = UUID(user_id)
 
-        # Query using Beanie
-        return await Expense.find_one({"id": expense_id, "user_id": user_id})
+        # Query using Beanie (the `id` field is stored as `_id`)
+        return await Expense.find_one({"_id": expense_id, "user_id": user_id})
     except (ValueError, Exception):
         return None
 
@@ -37,6 +63,412 @@ async def get_all_expenses(user_id: Union[str, UUID]) -> List[Expense]:
     return expenses
 
 
+def _decode_cursor_for(cursor: str, field: str) -> Tuple[Any, UUID]:
+    """
+    Decode a cursor whose sort key must be a value of field.
+    Raises ValueError if the cursor is malformed or was made for another sort.
+    """
+    value, expense_id = decode_cursor(cursor)
+    if isinstance(value, datetime) != (field in ("created_at", "updated_at")):
+        raise ValueError("invalid cursor")
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        # Compared with the naive UTC dates and date filters
+        value = timezone.make_naive(value, dt_timezone.utc)
+    return value, expense_id
+
+
+# Filters accepted by plan_expenses_query
+EXPENSE_FILTERS = ("tags", "min_amount", "max_amount", "start", "end", "description")
+EXPENSE_SORTS = ("-created_at", "created_at", "-amount", "amount")
+# Beyond this many tags MongoDB stops merging per-tag index scans and sorts
+# in memory, so longer lists are rejected
+MAX_FILTER_TAGS = 20
+
+
+def plan_expenses_query(
+    user_id: UUID,
+    filters: Optional[Dict[str, Any]] = None,
+    sort: str = "-created_at",
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Translate list filters and a sort into a find() walking a single index:
+    `user_id_amount_id` when sorting by amount, `user_id_tag_created_at_id`
+    when sorting by date within tags, `user_id_created_at_id` otherwise.
+    The index bounds the user and the filters on its keys, and returns the
+    documents in sort order, so no plan scans the collection or sorts in
+    memory. Filters on other fields are applied to each fetched document.
+
+    filters takes tags (list), min_amount and max_amount (inclusive), start
+    (inclusive) and end (exclusive) dates, and a description prefix. sort is
+    one of EXPENSE_SORTS, a leading "-" meaning descending.
+    Returns {"filter", "sort", "hint", "residual"}, residual naming the
+    filters the index cannot bound.
+    Raises ValueError if a filter, the sort or the cursor is invalid.
+    """
+    filters = {
+        name: value
+        for name, value in (filters or {}).items()
+        if value is not None and value != "" and value != []
+    }
+    for name in filters:
+        if name not in EXPENSE_FILTERS:
+            raise ValueError(f"unknown filter {name}")
+    if sort not in EXPENSE_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(EXPENSE_SORTS)}")
+    field = sort.lstrip("-")
+    direction = pymongo.DESCENDING if sort.startswith("-") else pymongo.ASCENDING
+
+    query: Dict[str, Any] = {"user_id": user_id}
+    tags = filters.get("tags")
+    if tags:
+        if len(tags) > MAX_FILTER_TAGS:
+            raise ValueError(f"at most {MAX_FILTER_TAGS} tags allowed")
+        query["tag"] = tags[0] if len(tags) == 1 else {"$in": list(tags)}
+    if "min_amount" in filters or "max_amount" in filters:
+        query["amount"] = {}
+        if "min_amount" in filters:
+            query["amount"]["$gte"] = filters["min_amount"]
+        if "max_amount" in filters:
+            query["amount"]["$lte"] = filters["max_amount"]
+    if "start" in filters or "end" in filters:
+        query["created_at"] = {}
+        if "start" in filters:
+            query["created_at"]["$gte"] = filters["start"]
+        if "end" in filters:
+            query["created_at"]["$lt"] = filters["end"]
+    if "description" in filters:
+        query["description"] = {"$regex": f"^{re.escape(filters['description'])}"}
+
+    if field == "amount":
+        hint, bounded = "user_id_amount_id", {"min_amount", "max_amount"}
+    elif tags:
+        hint, bounded = "user_id_tag_created_at_id", {"tags", "start", "end"}
+    else:
+        hint, bounded = "user_id_created_at_id", {"start", "end"}
+
+    if cursor:
+        value, expense_id = _decode_cursor_for(cursor, field)
+        descending = direction == pymongo.DESCENDING
+        after, up_to = ("$lt", "$lte") if descending else ("$gt", "$gte")
+        # The inclusive bound narrows the index scan, the $or breaks ties.
+        # A filter's own bound on the same operator is kept when tighter, so
+        # a cursor cannot reach past the filters
+        bounds = query.setdefault(field, {})
+        tighter = min if descending else max
+        bounds[up_to] = tighter(bounds[up_to], value) if up_to in bounds else value
+        query["$or"] = [
+            {field: {after: value}},
+            {field: value, "_id": {after: expense_id}},
+        ]
+
+    return {
+        "filter": query,
+        "sort": [(field, direction), ("_id", direction)],
+        "hint": hint,
+        "residual": sorted(set(filters) - bounded),
+    }
+
+
+def _find_expenses_data(
+    user_id: UUID,
+    filters: Optional[Dict[str, Any]],
+    sort: str,
+    cursor: Optional[str] = None,
+    **kwargs,
+):
+    """
+    Start a raw find for a planned expense query.
+    Logs a rate limited warning when some filters are not bounded by the index, or
+    raises ValueError if settings.EXPENSES_REJECT_UNINDEXED_FILTERS is set.
+    """
+    plan = plan_expenses_query(user_id, filters, sort, cursor)
+    if plan["residual"]:
+        message = (
+            f"filters {', '.join(plan['residual'])} are not bounded by the "
+            f"index {plan['hint']} used for sort {sort}"
+        )
+        if settings.EXPENSES_REJECT_UNINDEXED_FILTERS:
+            raise ValueError(message)
+        unindexed_filter_log.record(message)
+
+    return (
+        Expense.get_motor_collection()
+        .find(_encode_query(plan["filter"]), EXPENSE_DATA_PROJECTION, **kwargs)
+        .sort(plan["sort"])
+        .hint(plan["hint"])
+    )
+
+
+# Fields returned by the read endpoints (`_id` is always included)
+EXPENSE_DATA_PROJECTION = {
+    "amount": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "tag": 1,
+    "description": 1,
+}
+
+
+def _encode_query(query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Encode a filter the way Beanie does (UUIDs as standard BSON binary).
+    """
+    return Encoder().encode(query)
+
+
+def document_to_data(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a raw expense document to the response shape of serialize_expense.
+    """
+    return {
+        "id": document["_id"].as_uuid(),
+        "amount": document["amount"],
+        "created_at": document["created_at"],
+        # Expenses written before updated_at existed fall back to created_at
+        "updated_at": document.get("updated_at", document["created_at"]),
+        "tag": document["tag"],
+        "description": document.get("description"),
+    }
+
+
+async def get_expense_data(
+    expense_id: Union[str, UUID], user_id: Union[str, UUID]
+) -> Optional[Dict[str, Any]]:
+    """
+    Get an expense by ID for a specific user, already serialized.
+    Reads the raw document without building an Expense model.
+    """
+    try:
+        # Convert string IDs to UUID if needed
+        if isinstance(expense_id, str):
+            expense_id = UUID(expense_id)
+        if isinstance(user_id, str):
+            user_id = UUID(user_id)
+    except ValueError:
+        return None
+
+    document = await Expense.get_motor_collection().find_one(
+        _encode_query({"_id": expense_id, "user_id": user_id}),
+        EXPENSE_DATA_PROJECTION,
+    )
+    return document_to_data(document) if document else None
+
+
+async def get_expenses_page_data(
+    user_id: Union[str, UUID],
+    limit: int,
+    cursor: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    sort: str = "-created_at",
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Get one page of a user's expenses, serialized from raw documents without
+    building Expense models, optionally filtered and sorted as described in
+    plan_expenses_query (newest first by default).
+    Pages are keyed on (sort value, id) so the cost of a page does not depend
+    on how deep into the history it is. Returns the expenses and the cursor of
+    the next page, or None on the last page.
+    Raises ValueError if the cursor, a filter or the sort is invalid.
+    """
+    if isinstance(user_id, str):
+        user_id = UUID(user_id)
+
+    # Fetch one extra document to know whether another page follows
+    documents = await (
+        _find_expenses_data(user_id, filters, sort, cursor)
+        .limit(limit + 1)
+        .to_list(length=None)
+    )
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last[sort.lstrip("-")], last["_id"].as_uuid())
+    with phase("serialize"):
+        return [document_to_data(document) for document in documents], next_cursor
+
+
+async def get_cached_expense_data(
+    expense_id: Union[str, UUID], user_id: Union[str, UUID], version: int
+) -> Optional[Dict[str, Any]]:
+    """
+    Same as get_expense_data, served from the expense cache when possible.
+    version is the user's expense version (state.get_version), read before.
+    """
+    try:
+        # Convert string IDs to UUID if needed
+        if isinstance(expense_id, str):
+            expense_id = UUID(expense_id)
+        if isinstance(user_id, str):
+            user_id = UUID(user_id)
+    except ValueError:
+        return None
+
+    return await expense_cache.get_expense(
+        user_id, expense_id, version, lambda: get_expense_data(expense_id, user_id)
+    )
+
+
+async def get_cached_expenses_page_data(
+    user_id: Union[str, UUID],
+    version: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    sort: str = "-created_at",
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Same as get_expenses_page_data, served from the expense cache when possible.
+    version is the user's expense version (state.get_version), read before.
+    Raises ValueError if the cursor, a filter or the sort is invalid.
+    """
+    if isinstance(user_id, str):
+        user_id = UUID(user_id)
+
+    page = [limit, cursor, sort, sorted((filters or {}).items())]
+    return await expense_cache.get_page(
+        user_id,
+        version,
+        repr(page),
+        lambda: get_expenses_page_data(user_id, limit, cursor, filters, sort),
+    )
+
+
+def iter_expenses_data(
+    user_id: Union[str, UUID],
+    batch_size: int,
+    filters: Optional[Dict[str, Any]] = None,
+    sort: str = "-created_at",
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Iterate over all expenses of a user, newest first unless sorted otherwise
+    and already serialized, without loading them all at once. The cursor
+    fetches batch_size documents per round trip.
+    Raises ValueError, before iterating, if a filter or the sort is invalid.
+    """
+    if isinstance(user_id, str):
+        user_id = UUID(user_id)
+
+    cursor = _find_expenses_data(user_id, filters, sort, batch_size=batch_size)
+    return (document_to_data(document) async for document in cursor)
+
+
+class ExpiredCheckpointError(ValueError):
+    """A delta sync checkpoint is older than the tombstone retention"""
+
+
+# Sort order of changes; served by the `user_id_updated_at_id` and
+# `user_id_deleted_at_id` indexes
+EXPENSE_CHANGES_SORT = [("updated_at", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+TOMBSTONES_SORT = [("deleted_at", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+
+
+def changes_query(
+    field: str,
+    user_id: UUID,
+    until: datetime,
+    since: Optional[Tuple[datetime, UUID]] = None,
+) -> Dict[str, Any]:
+    """
+    Build the filter selecting a user's documents whose `field` timestamp
+    falls after the (timestamp, id) checkpoint and before until.
+    """
+    query: Dict[str, Any] = {"user_id": user_id, field: {"$lt": until}}
+    if since:
+        changed_at, document_id = since
+        query["$or"] = [
+            {field: {"$gt": changed_at}},
+            {field: changed_at, "_id": {"$gt": document_id}},
+        ]
+    return query
+
+
+async def get_expense_changes(
+    user_id: Union[str, UUID], limit: int, since: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Get a user's expenses created, updated or deleted after a checkpoint,
+    oldest change first. Without a checkpoint, every expense is returned.
+    Both reads walk an index from the checkpoint, so the cost follows the
+    number of changes, not the size of the history.
+    Returns {"upserts", "deletions", "next", "has_more"}, where next is the
+    checkpoint to pass as since on the following call.
+    Raises ValueError if the checkpoint is malformed, and
+    ExpiredCheckpointError if deletions after it may have been forgotten.
+    """
+    if isinstance(user_id, str):
+        user_id = UUID(user_id)
+
+    now = datetime.utcnow()
+    checkpoint, issued_at = None, now
+    if since:
+        changed_at, expense_id, issued_at = decode_checkpoint(since)
+        checkpoint = (changed_at, expense_id)
+    # Changes before the checkpoint may be old, but the deletions the client
+    # needs are those made after it started syncing
+    retention = timedelta(days=settings.EXPENSES_TOMBSTONE_RETENTION_DAYS)
+    if issued_at < now - retention:
+        raise ExpiredCheckpointError("checkpoint expired, sync from scratch")
+    until = now - timedelta(seconds=settings.EXPENSES_CHANGES_SETTLE_SECONDS)
+
+    # Fetch one extra change of each kind to know whether more follow
+    documents = (
+        await Expense.get_motor_collection()
+        .find(
+            _encode_query(changes_query("updated_at", user_id, until, checkpoint)),
+            EXPENSE_DATA_PROJECTION,
+        )
+        .sort(EXPENSE_CHANGES_SORT)
+        .limit(limit + 1)
+        .to_list(length=None)
+    )
+    changes = [
+        (document["updated_at"], document["_id"].as_uuid(), document)
+        for document in documents
+    ]
+    # Nothing was synced before the first checkpoint, so there is nothing to delete
+    if checkpoint:
+        tombstones = (
+            await ExpenseTombstone.get_motor_collection()
+            .find(
+                _encode_query(
+                    changes_query("deleted_at", user_id, until, checkpoint)
+                )
+            )
+            .sort(TOMBSTONES_SORT)
+            .limit(limit + 1)
+            .to_list(length=None)
+        )
+        changes += [
+            (tombstone["deleted_at"], tombstone["_id"].as_uuid(), None)
+            for tombstone in tombstones
+        ]
+
+    # Merge both kinds of changes in (timestamp, id) order
+    changes.sort(key=lambda change: change[:2])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        next_checkpoint = encode_checkpoint(*changes[-1][:2], issued_at)
+    else:
+        # Every change before until was returned
+        next_checkpoint = encode_checkpoint(until, UUID(int=0), until)
+
+    with phase("serialize"):
+        upserts = [
+            document_to_data(document) for _, _, document in changes if document
+        ]
+    return {
+        "upserts": upserts,
+        "deletions": [
+            expense_id for _, expense_id, document in changes if not document
+        ],
+        "next": next_checkpoint,
+        "has_more": has_more,
+    }
+
+
 async def create_expense(
     user_id: Union[str, UUID], amount: float, tag: str = None, description: str = None
 ) -> Expense:
@@ -52,60 +484,341 @@ async def create_expense(
 
     # Save to database
     await expense.save()
+    await rollups.add_expense(
+        user_id, expense.created_at, expense.tag, expense.amount
+    )
+    await state.bump_version(user_id, count=1, total=expense.amount)
     return expense
 
 
+# Fields accepted for each row of a bulk import
+_BULK_FIELDS = ("amount", "tag", "description", "created_at")
+
+
+def _validation_detail(error: ValidationError) -> str:
+    """
+    Summarize a Pydantic validation error as "field: message" pairs.
+    """
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+async def bulk_create_expenses(
+    user_id: Union[str, UUID], rows: List[Any], chunk_size: int
+) -> List[Dict[str, Any]]:
+    """
+    Create many expenses for a user with unordered insert_many calls of up
+    to chunk_size documents. Invalid rows are skipped, not fatal.
+    Returns one result per row, in order: {"index", "id"} for created rows
+    and {"index", "detail"} for rejected ones.
+    """
+    if isinstance(user_id, str):
+        user_id = UUID(user_id)
+
+    # Validate every row before writing anything
+    results: List[Dict[str, Any]] = []
+    pending: List[Tuple[int, Expense]] = []
+    with phase("validate"):
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results.append({"index": index, "detail": "row must be a JSON object"})
+                continue
+            try:
+                fields = {field: row[field] for field in _BULK_FIELDS if field in row}
+                expense = Expense(user_id=user_id, **fields)
+            except ValidationError as e:
+                results.append({"index": index, "detail": _validation_detail(e)})
+                continue
+            if timezone.is_aware(expense.created_at):
+                # Expenses are stored, and rolled up by month, as naive UTC
+                expense.created_at = timezone.make_naive(
+                    expense.created_at, dt_timezone.utc
+                )
+            results.append({"index": index, "id": str(expense.id)})
+            pending.append((index, expense))
+
+    created_count, created_total = 0, 0.0
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start : start + chunk_size]
+        failed = set()
+        try:
+            await Expense.insert_many([expense for _, expense in chunk], ordered=False)
+        except BulkWriteError as e:
+            # The rest of an unordered batch is still written
+            for error in e.details["writeErrors"]:
+                failed.add(error["index"])
+                index = chunk[error["index"]][0]
+                results[index] = {"index": index, "detail": error["errmsg"]}
+        created = [
+            expense
+            for position, (_, expense) in enumerate(chunk)
+            if position not in failed
+        ]
+        await rollups.add_expenses(created)
+        created_count += len(created)
+        created_total += sum(expense.amount for expense in created)
+
+    if pending:
+        await state.bump_version(user_id, count=created_count, total=created_total)
+    return results
+
+
+# Fields a client may change, with the adapters validating their new values
+_UPDATABLE_FIELDS = {
+    field: TypeAdapter(Expense.model_fields[field].annotation)
+    for field in ("amount", "tag", "description")
+}
+
+
 async def update_expense(
     expense_id: Union[str, UUID], user_id: Union[str, UUID], data: Dict[str, Any]
-) -> Optional[Expense]:
+) -> Optional[Dict[str, Any]]:
     """
-    Update an expense with the provided data.
+    Update an expense with the provided data in a single round trip.
+    Returns the updated expense serialized, None if it does not exist.
+    Raises ValueError if a new value is invalid.
     """
-    # Get the expense
-    expense = await get_expense_by_id(expense_id, user_id)
-    if not expense:
+    # Validate the new values
+    changes = {
+        field: adapter.validate_python(data[field])
+        for field, adapter in _UPDATABLE_FIELDS.items()
+        if field in data
+    }
+    if not changes:
+        return await get_expense_data(expense_id, user_id)
+
+    try:
+        # Convert string IDs to UUID if needed
+        if isinstance(expense_id, str):
+            expense_id = UUID(expense_id)
+        if isinstance(user_id, str):
+            user_id = UUID(user_id)
+    except ValueError:
         return None
 
-    # Update fields
-    if "amount" in data:
-        expense.amount = data["amount"]
-    if "tag" in data:
-        expense.tag = data["tag"]
-    if "description" in data:
-        expense.description = data["description"]
+    # Update atomically, reading back the previous version so the rollups
+    # can be adjusted; the new version is the previous one with the changes
+    changes["updated_at"] = datetime.utcnow()
+    previous = await Expense.get_motor_collection().find_one_and_update(
+        _encode_query({"_id": expense_id, "user_id": user_id}),
+        {"$set": changes},
+        projection=EXPENSE_DATA_PROJECTION,
+        return_document=pymongo.ReturnDocument.BEFORE,
+    )
+    if not previous:
+        return None
 
-    # Save changes
-    await expense.save()
-    return expense
+    document = {**previous, **changes}
+    await state.bump_version(user_id, total=document["amount"] - previous["amount"])
+
+    await rollups.change_expense(
+        user_id,
+        previous["created_at"],
+        previous["tag"],
+        previous["amount"],
+        document["tag"],
+        document["amount"],
+    )
+    return document_to_data(document)
 
 
 async def delete_expense(
     expense_id: Union[str, UUID], user_id: Union[str, UUID]
-) -> Optional[Expense]:
+) -> Optional[Dict[str, Any]]:
     """
-    Delete an expense. Returns the expense data if successful, None otherwise.
+    Delete an expense in a single round trip.
+    Returns the deleted expense serialized if successful, None otherwise.
     """
-    # Get the expense
-    expense = await get_expense_by_id(expense_id, user_id)
-    if not expense:
+    try:
+        # Convert string IDs to UUID if needed
+        if isinstance(expense_id, str):
+            expense_id = UUID(expense_id)
+        if isinstance(user_id, str):
+            user_id = UUID(user_id)
+    except ValueError:
+        return None
+
+    document = await Expense.get_motor_collection().find_one_and_delete(
+        _encode_query({"_id": expense_id, "user_id": user_id}),
+        projection=EXPENSE_DATA_PROJECTION,
+    )
+    if not document:
         return None
 
-    # Store expense for return value
-    deleted_expense = expense
+    # Let delta sync clients know the expense is gone
+    await ExpenseTombstone.get_motor_collection().insert_one(
+        _encode_query(
+            {"_id": expense_id, "user_id": user_id, "deleted_at": datetime.utcnow()}
+        )
+    )
+    await state.bump_version(user_id, count=-1, total=-document["amount"])
+    await rollups.remove_expense(
+        user_id, document["created_at"], document["tag"], document["amount"]
+    )
+    return document_to_data(document)
+
+
+async def delete_expenses_batch(user_id: UUID, batch_size: int) -> int:
+    """
+    Delete up to batch_size expenses of a user, without tombstones, for
+    purging a deleted user. The IDs are read from the user_id-prefixed index
+    and deleted by `_id`, so each batch is one bounded delete_many.
+    Returns the number of expenses deleted, 0 once none are left.
+    """
+    collection = Expense.get_motor_collection()
+    documents = (
+        await collection.find(_encode_query({"user_id": user_id}), {"_id": 1})
+        .limit(batch_size)
+        .to_list(length=None)
+    )
+    if not documents:
+        return 0
+
+    ids = [document["_id"] for document in documents]
+    result = await collection.delete_many({"_id": {"$in": ids}})
+    return result.deleted_count
+
+
+# Collections holding data derived from a user's expenses, by the field
+# holding the user's ID. The user's version (UserExpenseState) is kept.
+USER_DATA_MODELS = [
+    (ExpenseRollup, "user_id"),
+    (ExpenseTombstone, "user_id"),
+]
+
+
+async def delete_user_data(user_id: UUID):
+    """
+    Delete the rollups and tombstones of a user, once their expenses are
+    gone, and reset their counters. The version is bumped rather than
+    dropped: restarting it from 0 would let a user recreated with the same
+    ID reach the ETags and cache keys of the deleted user's data.
+    """
+    for model, field in USER_DATA_MODELS:
+        await model.get_motor_collection().delete_many(
+            _encode_query({field: user_id})
+        )
+    await state.reset_counters(user_id)
+
+
+async def count_user_data(user_id: UUID) -> Dict[str, int]:
+    """Count the expenses and derived documents left of a user, by collection"""
+    counts = {}
+    for model, field in [(Expense, "user_id")] + USER_DATA_MODELS:
+        collection = model.get_motor_collection()
+        counts[collection.name] = await collection.count_documents(
+            _encode_query({field: user_id})
+        )
+    return counts
+
+
+# Date formats used to bucket created_at by period ("week" is the ISO week)
+SUMMARY_PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m"}
+
+
+def _is_month_start(value: Optional[datetime]) -> bool:
+    """Whether a range bound is absent or falls on the first instant of a month"""
+    return value is None or (value.day == 1 and value.time() == datetime.min.time())
+
+
+async def summarize_expenses(
+    user_id: Union[str, UUID],
+    group_by: List[str],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sum a user's expenses per tag and/or per period of created_at with an
+    aggregation pipeline, so only the summarized rows leave the database.
+    Rows hold the total, count, min and max of their group.
+    group_by may hold "tag" and at most one of "day", "week" or "month";
+    start is inclusive and end exclusive.
+    Raises ValueError if the grouping is invalid.
+    """
+    if isinstance(user_id, str):
+        user_id = UUID(user_id)
+
+    unknown = set(group_by) - {"tag", *SUMMARY_PERIOD_FORMATS}
+    if unknown:
+        raise ValueError(f"cannot group by {', '.join(sorted(unknown))}")
+    periods = [key for key in group_by if key in SUMMARY_PERIOD_FORMATS]
+    if len(periods) > 1:
+        raise ValueError("group by at most one of day, week or month")
+
+    # Monthly and per-tag totals over whole months come from the rollups
+    whole_months = _is_month_start(start) and _is_month_start(end)
+    if set(group_by) <= {"tag", "month"} and whole_months:
+        return await rollups.summarize_rollups(
+            user_id,
+            group_by,
+            rollups.month_of(start) if start else None,
+            rollups.month_of(end) if end else None,
+        )
+
+    pipeline = summary_pipeline(user_id, group_by, start, end)
+    collection = Expense.get_motor_collection()
+    return await collection.aggregate(pipeline).to_list(length=None)
+
+
+def summary_pipeline(
+    user_id: UUID,
+    group_by: List[str],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build the pipeline summarizing a user's expenses from the expenses
+    themselves, for a grouping already validated by summarize_expenses.
+    """
+    periods = [key for key in group_by if key in SUMMARY_PERIOD_FORMATS]
+    match: Dict[str, Any] = {"user_id": user_id}
+    if start or end:
+        match["created_at"] = {}
+        if start:
+            match["created_at"]["$gte"] = start
+        if end:
+            match["created_at"]["$lt"] = end
+
+    group_key: Dict[str, Any] = {}
+    if periods:
+        group_key["period"] = {
+            "$dateToString": {
+                "format": SUMMARY_PERIOD_FORMATS[periods[0]],
+                "date": "$created_at",
+            }
+        }
+    if "tag" in group_by:
+        group_key["tag"] = "$tag"
 
-    # Delete from database
-    await expense.delete()
-    return deleted_expense
+    return [
+        {"$match": _encode_query(match)},
+        {
+            "$group": {
+                "_id": group_key or None,
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1},
+                "min": {"$min": "$amount"},
+                "max": {"$max": "$amount"},
+            }
+        },
+        {"$sort": {"_id": 1}},
+        {"$addFields": {"period": "$_id.period", "tag": "$_id.tag"}},
+        {"$project": {"_id": 0}},
+    ]
 
 
 def serialize_expense(expense: Expense) -> Dict[str, Any]:
     """
-    Serialize an expense object to a dictionary.
+    Serialize an expense object to a dictionary. UUIDs and datetimes are
+    kept as is for the response encoder to render.
     """
     return {
-        "id": str(expense.id),
+        "id": expense.id,
         "amount": expense.amount,
-        "created_at": expense.created_at.isoformat(),
+        "created_at": expense.created_at,
+        "updated_at": expense.updated_at,
         "tag": expense.tag,
         "description": expense.description,
     }
@@ -115,4 +828,5 @@ def serialize_expenses(expenses: List[Expense]) -> List[Dict[str, Any]]:
     """
     Serialize a list of expense objects.
     """
-    return [serialize_expense(expense) for expense in expenses]
+    with phase("serialize"):
+        return [serialize_expense(expense) for expense in expenses]
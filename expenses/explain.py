@@ -0,0 +1,99 @@
+from typing import List, Dict, Any, Optional
+
+
+async def explain_find(
+    collection,
+    query: Dict[str, Any],
+    sort: Optional[List] = None,
+    limit: Optional[int] = None,
+    hint: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run `explain` for a find query on a Motor collection and summarize the plan.
+    """
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    if hint:
+        cursor = cursor.hint(hint)
+    return summarize_plan(await cursor.explain())
+
+
+async def explain_aggregate(
+    collection, pipeline: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Run `explain` for an aggregation pipeline on a Motor collection and
+    summarize the plan of the query feeding it.
+    """
+    explain = await collection.database.command(
+        {
+            "explain": {
+                "aggregate": collection.name,
+                "pipeline": pipeline,
+                "cursor": {},
+            },
+            "verbosity": "executionStats",
+        }
+    )
+    # Pipelines the query engine cannot run whole explain their query in a
+    # leading $cursor stage
+    if "stages" in explain:
+        explain = explain["stages"][0]["$cursor"]
+    return summarize_plan(explain)
+
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce an explain document to the winning plan's stages, the indexes it
+    uses and the execution counters.
+    """
+    winning_plan = explain["queryPlanner"]["winningPlan"]
+    # Servers using the slot based engine nest the classic plan under queryPlan
+    winning_plan = winning_plan.get("queryPlan", winning_plan)
+
+    stages = []
+    indexes = []
+    pending = [winning_plan]
+    while pending:
+        stage = pending.pop()
+        stages.append(stage.get("stage"))
+        if stage.get("indexName"):
+            indexes.append(stage["indexName"])
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+        pending.extend(stage.get("inputStages", []))
+
+    execution_stats = explain.get("executionStats", {})
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "docs_examined": execution_stats.get("totalDocsExamined"),
+        "keys_examined": execution_stats.get("totalKeysExamined"),
+        "returned": execution_stats.get("nReturned"),
+        "time_ms": execution_stats.get("executionTimeMillis"),
+    }
+
+
+def is_index_backed(summary: Dict[str, Any], sorted_by_index: bool = True) -> bool:
+    """
+    A plan is index backed when it neither scans the collection nor, unless
+    sorted_by_index is False, sorts in memory.
+    """
+    if "COLLSCAN" in summary["stages"]:
+        return False
+    return not sorted_by_index or "SORT" not in summary["stages"]
+
+
+async def index_usage(collection) -> List[Dict[str, Any]]:
+    """
+    Get the number of operations served by each index of a collection since
+    the server started.
+    """
+    stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+    return [
+        {"name": stat["name"], "ops": stat["accesses"]["ops"]}
+        for stat in sorted(stats, key=lambda stat: stat["name"])
+    ]
@@ -0,0 +1,28 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from config.db import close_motor_client, initialize_beanie
+from expenses.models import Expense
+
+
+class Command(BaseCommand):
+    help = (
+        "Set updated_at to created_at on expenses written before updated_at "
+        "existed, so delta sync and its index see them."
+    )
+
+    def handle(self, *args, **options):
+        updated = asyncio.run(self._backfill())
+        self.stdout.write(self.style.SUCCESS(f"{updated} expenses updated"))
+
+    async def _backfill(self):
+        await initialize_beanie()
+        try:
+            result = await Expense.get_motor_collection().update_many(
+                {"updated_at": {"$exists": False}},
+                [{"$set": {"updated_at": "$created_at"}}],
+            )
+            return result.modified_count
+        finally:
+            close_motor_client()
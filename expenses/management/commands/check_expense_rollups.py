@@ -0,0 +1,62 @@
+import asyncio
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.db import close_motor_client, initialize_beanie
+from expenses.rollups import check_rollups, recompute_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the monthly expense rollups with totals recomputed from the "
+        "expenses and report every rollup that disagrees."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id", help="Only check the rollups of this user (default: all)"
+        )
+        parser.add_argument(
+            "--fix", action="store_true", help="Recompute the disagreeing rollups"
+        )
+
+    def handle(self, *args, **options):
+        user_id = UUID(options["user_id"]) if options["user_id"] else None
+        mismatches = asyncio.run(self._check(user_id, options["fix"]))
+
+        for mismatch in mismatches:
+            self.stdout.write(
+                f"{mismatch['user_id']} {mismatch['month']} {mismatch['tag']}: "
+                f"expected {self._describe(mismatch['expected'])}, "
+                f"stored {self._describe(mismatch['stored'])}"
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("rollups are consistent"))
+        elif options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"{len(mismatches)} rollups fixed"))
+        else:
+            raise CommandError(f"{len(mismatches)} rollups are inconsistent")
+
+    async def _check(self, user_id, fix):
+        await initialize_beanie()
+        try:
+            mismatches = await check_rollups(user_id)
+            if fix:
+                for mismatch in mismatches:
+                    await recompute_rollup(
+                        mismatch["user_id"], mismatch["month"], mismatch["tag"]
+                    )
+            return mismatches
+        finally:
+            close_motor_client()
+
+    def _describe(self, rollup):
+        """Short description of a rollup, or of its absence"""
+        if rollup is None:
+            return "nothing"
+        return (
+            f"total={rollup.get('total')} count={rollup.get('count')} "
+            f"min={rollup.get('min')} max={rollup.get('max')}"
+        )
@@ -0,0 +1,221 @@
+import asyncio
+from datetime import datetime, timedelta
+from itertools import combinations
+from uuid import UUID
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+
+from config.db import close_motor_client, initialize_beanie
+from expenses import crud, rollups
+from expenses.explain import (
+    explain_aggregate,
+    explain_find,
+    index_usage,
+    is_index_backed,
+)
+from expenses.models import Expense, ExpenseRollup, ExpenseTombstone
+from expenses.pagination import encode_cursor
+from expenses.search import text_search_pipeline
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain the MongoDB queries issued by the API: every list query plan, "
+        "the summaries and the text search, and report index usage, so queries "
+        "falling back to collection scans or missing their index are caught."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id",
+            help="User whose data the queries run against (default: any user)",
+        )
+        parser.add_argument(
+            "--fail-on-scan",
+            action="store_true",
+            help="Exit with an error if any query is not fully index backed",
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self._handle(options["user_id"], options["fail_on_scan"]))
+
+    async def _handle(self, user_id, fail_on_scan):
+        await initialize_beanie()
+        try:
+            failures = await self._report(user_id)
+        finally:
+            close_motor_client()
+
+        if failures and fail_on_scan:
+            raise CommandError(f"queries not index backed: {', '.join(failures)}")
+
+    async def _report(self, user_id):
+        if user_id:
+            user_id = UUID(user_id)
+            expense = await Expense.find_one({"user_id": user_id})
+        else:
+            expense = await Expense.find_one({})
+            user_id = expense.user_id if expense else UUID(int=0)
+
+        expense_id = expense.id if expense else UUID(int=0)
+        created_at = expense.created_at if expense else None
+        page_size = settings.EXPENSES_PAGE_SIZE + 1
+
+        # (name, model, filter, sort, limit, hint) mirroring the finds in crud.py
+        finds = [
+            (
+                "get_expense_by_id",
+                Expense,
+                {"_id": expense_id, "user_id": user_id},
+                None,
+                None,
+                None,
+            ),
+            ("get_user_by_id", UserProfile, {"_id": user_id}, None, None, None),
+        ]
+        until = datetime.utcnow()
+        since = (created_at or until, expense_id)
+        finds += [
+            (
+                "get_expense_changes (upserts)",
+                Expense,
+                crud.changes_query("updated_at", user_id, until, since),
+                crud.EXPENSE_CHANGES_SORT,
+                page_size,
+                None,
+            ),
+            (
+                "get_expense_changes (deletions)",
+                ExpenseTombstone,
+                crud.changes_query("deleted_at", user_id, until, since),
+                crud.TOMBSTONES_SORT,
+                page_size,
+                None,
+            ),
+        ]
+        for name, sort, filters, cursor in self._lists(expense):
+            plan = crud.plan_expenses_query(user_id, filters, sort, cursor)
+            finds.append(
+                (name, Expense, plan["filter"], plan["sort"], page_size, plan["hint"])
+            )
+
+        # (name, model, pipeline) of the summaries and the text search
+        aggregates = [
+            (
+                "summarize_expenses (month, tag: rollups)",
+                ExpenseRollup,
+                rollups.summary_pipeline(user_id, ["month", "tag"]),
+            ),
+            (
+                "summarize_expenses (day)",
+                Expense,
+                crud.summary_pipeline(user_id, ["day"]),
+            ),
+            (
+                "summarize_expenses (week, tag, start, end)",
+                Expense,
+                crud.summary_pipeline(
+                    user_id, ["week", "tag"], until - timedelta(days=90), until
+                ),
+            ),
+            (
+                "MongoTextSearchBackend.search (tags, min_amount)",
+                Expense,
+                text_search_pipeline(
+                    user_id,
+                    "coffee",
+                    {"tags": ["food"], "min_amount": 10},
+                    settings.EXPENSES_PAGE_SIZE,
+                ),
+            ),
+        ]
+
+        failures = []
+        used = set()
+        for name, model, query, sort, limit, hint in finds:
+            # Let Beanie encode the filter (UUIDs, datetimes) as it would for the query
+            encoded_query = model.find(query).get_filter_query()
+            explain = explain_find(
+                model.get_motor_collection(), encoded_query, sort, limit, hint
+            )
+            if not await self._write(name, explain, True, used):
+                failures.append(name)
+        for name, model, pipeline in aggregates:
+            # Summaries sort their groups and searches their scores in memory
+            explain = explain_aggregate(model.get_motor_collection(), pipeline)
+            if not await self._write(name, explain, False, used):
+                failures.append(name)
+
+        for model in (Expense, ExpenseRollup, ExpenseTombstone, UserProfile):
+            collection = model.get_motor_collection()
+            self.stdout.write(f"index usage ({collection.name})")
+            for usage in await index_usage(collection):
+                # _id_ lookups (IDHACK/EXPRESS plans) do not name their index
+                unused = usage["name"] not in used and usage["name"] != "_id_"
+                note = " (no query above uses it)" if unused else ""
+                self.stdout.write(f"  {usage['name']}: {usage['ops']} ops{note}")
+
+        return failures
+
+    def _lists(self, expense):
+        """
+        (name, sort, filters, cursor) of the list queries: every sort with
+        every combination of the tag, amount and date filters, and every sort
+        from a cursor when there is an expense to start from.
+        """
+        until = datetime.utcnow()
+        filter_options = [
+            {"tags": ["food", "travel"]},
+            {"min_amount": 10, "max_amount": 100},
+            {"start": until - timedelta(days=30), "end": until},
+        ]
+        lists = []
+        for sort in crud.EXPENSE_SORTS:
+            for count in range(len(filter_options) + 1):
+                for options in combinations(filter_options, count):
+                    filters = {}
+                    for option in options:
+                        filters.update(option)
+                    name = f"sort {sort}, {', '.join(filters) or 'no filters'}"
+                    lists.append(
+                        (f"get_expenses_page_data ({name})", sort, filters, None)
+                    )
+            if expense:
+                value = getattr(expense, sort.lstrip("-"))
+                lists.append(
+                    (
+                        f"get_expenses_page_data (sort {sort}, cursor)",
+                        sort,
+                        {},
+                        encode_cursor(value, expense.id),
+                    )
+                )
+        return lists
+
+    async def _write(self, name, explain, sorted_by_index, used) -> bool:
+        """
+        Write the plan summary of an explained query and collect its indexes
+        into used. Returns whether the query is index backed.
+        """
+        try:
+            summary = await explain
+        except OperationFailure as e:
+            # e.g. the planner's hint names an index missing from the collection
+            self.stdout.write(self.style.ERROR(name))
+            self.stdout.write(f"  error:         {e}")
+            return False
+        used.update(summary["indexes"])
+
+        index_backed = is_index_backed(summary, sorted_by_index)
+        style = self.style.SUCCESS if index_backed else self.style.ERROR
+        self.stdout.write(style(name))
+        self.stdout.write(f"  stages:        {' <- '.join(summary['stages'])}")
+        indexes = ", ".join(summary["indexes"]) or "-"
+        self.stdout.write(f"  indexes:       {indexes}")
+        self.stdout.write(f"  keys examined: {summary['keys_examined']}")
+        self.stdout.write(f"  docs examined: {summary['docs_examined']}")
+        self.stdout.write(f"  returned:      {summary['returned']}")
+        return index_backed
@@ -0,0 +1,31 @@
+import asyncio
+from uuid import UUID
+
+from django.core.management.base import BaseCommand
+
+from config.db import close_motor_client, initialize_beanie
+from expenses.state import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-user expense count and total from the expenses, "
+        "to backfill them for users created before they were maintained."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id", help="Only rebuild the counters of this user (default: all)"
+        )
+
+    def handle(self, *args, **options):
+        user_id = UUID(options["user_id"]) if options["user_id"] else None
+        written = asyncio.run(self._rebuild(user_id))
+        self.stdout.write(self.style.SUCCESS(f"{written} users' counters written"))
+
+    async def _rebuild(self, user_id):
+        await initialize_beanie()
+        try:
+            return await rebuild_counters(user_id)
+        finally:
+            close_motor_client()
@@ -0,0 +1,31 @@
+import asyncio
+from uuid import UUID
+
+from django.core.management.base import BaseCommand
+
+from config.db import close_motor_client, initialize_beanie
+from expenses.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the monthly expense rollups from the expenses, to backfill "
+        "them or to repair drift reported by check_expense_rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user-id", help="Only rebuild the rollups of this user (default: all)"
+        )
+
+    def handle(self, *args, **options):
+        user_id = UUID(options["user_id"]) if options["user_id"] else None
+        written = asyncio.run(self._rebuild(user_id))
+        self.stdout.write(self.style.SUCCESS(f"{written} rollups written"))
+
+    async def _rebuild(self, user_id):
+        await initialize_beanie()
+        try:
+            return await rebuild_rollups(user_id)
+        finally:
+            close_motor_client()
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import Binary
+from django.core.management.base import BaseCommand, CommandError
+
+from config.db import close_motor_client, initialize_beanie
+from expenses.models import Expense, ExpenseTag
+from expenses.rollups import rebuild_rollups
+from expenses.state import rebuild_counters
+from users import crud as users_crud
+
+
+def zipf_sizes(users: int, largest: int, smallest: int, exponent: float) -> List[int]:
+    """
+    History size of each user by rank, following Zipf's law: the user at
+    rank k gets largest / k ** exponent expenses, and never fewer than smallest.
+    """
+    return [
+        max(smallest, round(largest / rank**exponent)) for rank in range(1, users + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users with large expense histories for the heavy-history load "
+        "test scenario, and write their IDs to a file read by the locustfile. "
+        "History sizes follow a Zipf distribution, the largest going to the "
+        "most active user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument(
+            "--max-expenses",
+            type=int,
+            default=1_000_000,
+            help="History size of the most active user",
+        )
+        parser.add_argument(
+            "--min-expenses",
+            type=int,
+            default=10_000,
+            help="Smallest history size",
+        )
+        parser.add_argument(
+            "--zipf-exponent",
+            type=float,
+            default=1.0,
+            help="Skew of the history sizes and of the activity in the load test",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread the expenses over this many past days",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--output",
+            default="locust_results/seeded_users.json",
+            help="File listing the seeded users, read by the locustfile",
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Delete the users listed in --output and their expenses instead",
+        )
+
+    def handle(self, *args, **options):
+        if options["delete"]:
+            try:
+                with open(options["output"]) as file:
+                    seeded = json.load(file)
+            except FileNotFoundError:
+                raise CommandError(f"{options['output']} does not exist")
+            deleted = asyncio.run(self._delete(seeded["users"]))
+            self.stdout.write(self.style.SUCCESS(f"{deleted} seeded users deleted"))
+            return
+
+        if options["min_expenses"] > options["max_expenses"]:
+            raise CommandError("--min-expenses must not exceed --max-expenses")
+        sizes = zipf_sizes(
+            options["users"],
+            options["max_expenses"],
+            options["min_expenses"],
+            options["zipf_exponent"],
+        )
+        users = asyncio.run(self._seed(sizes, options["days"], options["chunk_size"]))
+
+        os.makedirs(os.path.dirname(options["output"]) or ".", exist_ok=True)
+        with open(options["output"], "w") as file:
+            json.dump(
+                {"zipf_exponent": options["zipf_exponent"], "users": users},
+                file,
+                indent=2,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(users)} users with {sum(sizes):,} expenses seeded, "
+                f"listed in {options['output']}"
+            )
+        )
+
+    async def _seed(self, sizes: List[int], days: int, chunk_size: int):
+        await initialize_beanie()
+        try:
+            users = []
+            for rank, size in enumerate(sizes, start=1):
+                user = await users_crud.create_user(uuid.uuid4())
+                await self._insert_expenses(user.id, size, days, chunk_size)
+                await rebuild_counters(user.id)
+                await rebuild_rollups(user.id)
+                users.append({"id": str(user.id), "rank": rank, "expenses": size})
+                self.stdout.write(f"{user.id}: {size:,} expenses")
+            return users
+        finally:
+            close_motor_client()
+
+    async def _insert_expenses(
+        self, user_id: uuid.UUID, count: int, days: int, chunk_size: int
+    ):
+        """
+        Insert raw expense documents, skipping model validation to seed
+        millions of rows quickly.
+        """
+        collection = Expense.get_motor_collection()
+        user = Binary.from_uuid(user_id)
+        now = datetime.utcnow()
+        span = timedelta(days=days).total_seconds()
+        for start in range(0, count, chunk_size):
+            documents = []
+            for index in range(start, min(start + chunk_size, count)):
+                created_at = now - timedelta(seconds=random.uniform(0, span))
+                tag = random.choice(ExpenseTag.CHOICES)
+                documents.append(
+                    {
+                        "_id": Binary.from_uuid(uuid.uuid4()),
+                        "user_id": user,
+                        "amount": round(random.lognormvariate(3, 1), 2),
+                        "tag": tag,
+                        "description": f"Seeded {tag} expense {index}",
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                    }
+                )
+            await collection.insert_many(documents, ordered=False)
+
+    async def _delete(self, users) -> int:
+        await initialize_beanie()
+        try:
+            deleted = 0
+            for user in users:
+                if await users_crud.delete_user(user["id"]):
+                    deleted += 1
+            # Wait for the background purges started by delete_user
+            pending = asyncio.all_tasks() - {asyncio.current_task()}
+            await asyncio.gather(*pending)
+            return deleted
+        finally:
+            close_motor_client()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.db import close_motor_client, command_shape, get_motor_client, redact
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the operations recorded by the MongoDB profiler in "
+        "system.profile by query shape (values redacted), slowest in total "
+        "first. --level turns the profiler on or off for the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--level",
+            type=int,
+            choices=[0, 1, 2],
+            help="Set the profiling level first: 0 off, 1 slow operations, 2 all",
+        )
+        parser.add_argument(
+            "--slowms",
+            type=int,
+            help="With --level 1, the duration from which operations are profiled",
+        )
+        parser.add_argument(
+            "--top", type=int, default=10, help="Number of shapes to report"
+        )
+
+    def handle(self, *args, **options):
+        if options["slowms"] is not None and options["level"] is None:
+            raise CommandError("--slowms needs --level")
+        summaries = asyncio.run(self._summarize(options["level"], options["slowms"]))
+        if options["level"] is not None:
+            self.stdout.write(f"profiling level set to {options['level']}")
+        if not summaries:
+            self.stdout.write("system.profile holds no operations")
+            return
+
+        for summary in summaries[: options["top"]]:
+            self.stdout.write(
+                f"{summary['total_ms']:>10} ms total, {summary['count']:>6} ops, "
+                f"max {summary['max_ms']} ms, "
+                f"{summary['docs_examined']} docs / {summary['keys_examined']} keys "
+                f"examined, {summary['returned']} returned, "
+                f"plans {', '.join(sorted(summary['plans'])) or '-'}\n"
+                f"    {summary['ns']} {json.dumps(summary['shape'], default=str)}"
+            )
+
+    async def _summarize(self, level, slowms):
+        database = get_motor_client()[settings.DATABASES["default"]["NAME"]]
+        try:
+            if level is not None:
+                command = {"profile": level}
+                if slowms is not None:
+                    command["slowms"] = slowms
+                await database.command(command)
+            return summarize_profile(
+                await database["system.profile"].find().to_list(length=None)
+            )
+        finally:
+            close_motor_client()
+
+
+def profile_shape(entry):
+    """Get the redacted shape of the operation of a system.profile entry"""
+    command = entry.get("originatingCommand") or entry.get("command") or {}
+    if entry.get("op") in ("update", "remove"):
+        # Write statements are profiled one by one, without their command
+        return {"command": entry["op"], "query": redact(command.get("q", {}))}
+    if not command:
+        return {"command": entry.get("op")}
+    return command_shape(next(iter(command)), command)
+
+
+def summarize_profile(entries):
+    """
+    Group system.profile entries by namespace and shape, summing their
+    durations and counters. Returns the groups by total duration, descending.
+    """
+    groups = {}
+    for entry in entries:
+        shape = profile_shape(entry)
+        key = (entry.get("ns"), json.dumps(shape, sort_keys=True, default=str))
+        summary = groups.get(key)
+        if summary is None:
+            summary = groups[key] = defaultdict(int, ns=key[0], shape=shape)
+            summary["plans"] = set()
+        summary["count"] += 1
+        summary["total_ms"] += entry.get("millis", 0)
+        summary["max_ms"] = max(summary["max_ms"], entry.get("millis", 0))
+        summary["docs_examined"] += entry.get("docsExamined", 0)
+        summary["keys_examined"] += entry.get("keysExamined", 0)
+        summary["returned"] += entry.get("nreturned", 0)
+        if entry.get("planSummary"):
+            summary["plans"].add(entry["planSummary"])
+    return sorted(groups.values(), key=lambda summary: -summary["total_ms"])
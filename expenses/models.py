@@ -4,6 +4,7 @@ import uuid
 from uuid import UUID
 from beanie import Document
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
 
 
 class ExpenseTag:
@@ -42,6 +43,7 @@ class Expense(Document):
     id: UUID = Field(default_factory=uuid.uuid4)
     amount: float
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
     tag: str = ExpenseTag.OTHER
     description: Optional[str] = None
     user_id: UUID
@@ -49,6 +51,49 @@ class Expense(Document):
     class Settings:
         name = "expenses"  # Collection name in MongoDB
         use_state_management = True
+        # `id` is stored as `_id`, which MongoDB always indexes uniquely.
+        # Lookups by (id, user_id) use that index. Per-user listings by date
+        # (and their keyset pagination) use `user_id_created_at_id`, or
+        # `user_id_tag_created_at_id` when filtered by tag, and listings by
+        # amount `user_id_amount_id` (see crud.plan_expenses_query). Delta
+        # sync reads changes in update order from `user_id_updated_at_id`.
+        # Description searches use the text index, whose user_id prefix
+        # confines each search to one user's expenses.
+        indexes = [
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("created_at", DESCENDING),
+                    ("_id", DESCENDING),
+                ],
+                name="user_id_created_at_id",
+            ),
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("tag", ASCENDING),
+                    ("created_at", DESCENDING),
+                    ("_id", DESCENDING),
+                ],
+                name="user_id_tag_created_at_id",
+            ),
+            IndexModel(
+                [("user_id", ASCENDING), ("amount", ASCENDING), ("_id", ASCENDING)],
+                name="user_id_amount_id",
+            ),
+            IndexModel(
+                [("user_id", ASCENDING), ("description", TEXT)],
+                name="user_id_description_text",
+            ),
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("updated_at", ASCENDING),
+                    ("_id", ASCENDING),
+                ],
+                name="user_id_updated_at_id",
+            ),
+        ]
 
     class Config:
         arbitrary_types_allowed = True
@@ -56,3 +101,88 @@ class Expense(Document):
     def __str__(self):
         """String representation of the expense"""
         return f"{self.amount} - {self.tag} - {self.created_at.strftime('%Y-%m-%d')}"
+
+
+class ExpenseRollup(Document):
+    """Per-user monthly totals of one tag, maintained incrementally on writes"""
+
+    user_id: UUID
+    month: str  # "YYYY-MM" of the expenses' created_at
+    tag: str
+    total: float = 0
+    # Stored as "count"; the attribute is renamed to keep Document.count usable
+    expense_count: int = Field(default=0, alias="count")
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    class Settings:
+        name = "expense_rollups"  # Collection name in MongoDB
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("month", ASCENDING), ("tag", ASCENDING)],
+                name="user_id_month_tag",
+                unique=True,
+            ),
+        ]
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __str__(self):
+        """String representation of the rollup"""
+        return f"{self.month} - {self.tag} - {self.total}"
+
+
+class ExpenseTombstone(Document):
+    """Record of a deleted expense, kept for delta sync clients"""
+
+    id: UUID  # The deleted expense's ID
+    user_id: UUID
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "expense_tombstones"  # Collection name in MongoDB
+        indexes = [
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("deleted_at", ASCENDING),
+                    ("_id", ASCENDING),
+                ],
+                name="user_id_deleted_at_id",
+            ),
+        ]
+        # The TTL index dropping expired tombstones is maintained by
+        # config.db.apply_tombstone_retention, as init_beanie cannot change
+        # the expiry of an existing index
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __str__(self):
+        """String representation of the tombstone"""
+        return f"{self.id} - {self.deleted_at.strftime('%Y-%m-%d')}"
+
+
+class UserExpenseState(Document):
+    """
+    Per-user version of the expenses, bumped by every write to them, with
+    the number and total amount of the user's expenses kept alongside.
+    """
+
+    id: UUID  # The user's ID, so the state is looked up by `_id`
+    version: int = 0
+    last_modified: Optional[datetime] = None
+    # Stored as "count"; the attribute is renamed to keep Document.count usable
+    expense_count: int = Field(default=0, alias="count")
+    total: float = 0
+
+    class Settings:
+        name = "user_expense_state"  # Collection name in MongoDB
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __str__(self):
+        """String representation of the state"""
+        return f"{self.id} - {self.version}"
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple, Union
+from uuid import UUID
+
+
+def encode_cursor(value: Union[datetime, float], expense_id: UUID) -> str:
+    """
+    Encode the keyset position of the last expense on a page, its sort key
+    (a datetime or a number) and its ID, into an opaque cursor.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([value, str(expense_id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Union[datetime, float], UUID]:
+    """
+    Decode a cursor produced by encode_cursor.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, expense_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"unexpected sort key {value!r}")
+        return value, UUID(expense_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def encode_checkpoint(
+    changed_at: datetime, expense_id: UUID, issued_at: datetime
+) -> str:
+    """
+    Encode a delta sync checkpoint: the (timestamp, ID) position of the last
+    change returned, and the time from which the client relies on deletion
+    tombstones, which stays the start of the sync while it pages through.
+    """
+    payload = json.dumps(
+        [changed_at.isoformat(), str(expense_id), issued_at.isoformat()]
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_checkpoint(checkpoint: str) -> Tuple[datetime, UUID, datetime]:
+    """
+    Decode a checkpoint produced by encode_checkpoint into its position and
+    issue time. Checkpoints holding only a position were issued at it.
+    Raises ValueError if the checkpoint is malformed.
+    """
+    try:
+        padded = checkpoint + "=" * (-len(checkpoint) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        if len(payload) == 2:
+            payload.append(payload[0])
+        changed_at, expense_id, issued_at = payload
+        return (
+            datetime.fromisoformat(changed_at),
+            UUID(expense_id),
+            datetime.fromisoformat(issued_at),
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def parse_limit(value: str, default: int, maximum: int) -> int:
+    """
+    Parse the `limit` query parameter, falling back to the default page size.
+    Raises ValueError if the value is not a positive integer.
+    """
+    if value is None or value == "":
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
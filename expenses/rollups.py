@@ -0,0 +1,329 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID
+
+import pymongo
+from beanie.odm.utils.encoder import Encoder
+
+from .models import Expense, ExpenseRollup
+
+# Relative tolerance when comparing maintained totals with recomputed ones,
+# since repeated $inc of floats accumulates rounding errors
+TOTAL_TOLERANCE = 1e-6
+
+
+def month_of(created_at: datetime) -> str:
+    """
+    Get the rollup month ("YYYY-MM") of an expense creation date.
+    """
+    return created_at.strftime("%Y-%m")
+
+
+def month_bounds(month: str) -> Tuple[datetime, datetime]:
+    """
+    Get the first instant of a rollup month and of the month after it.
+    """
+    start = datetime.strptime(month, "%Y-%m")
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def _bucket(user_id: UUID, month: str, tag: str) -> Dict[str, Any]:
+    """Filter selecting the rollup of one user, month and tag"""
+    return Encoder().encode({"user_id": user_id, "month": month, "tag": tag})
+
+
+def _add_update(amounts: List[float]) -> Dict[str, Any]:
+    """Update adding amounts to a rollup"""
+    return {
+        "$inc": {"total": sum(amounts), "count": len(amounts)},
+        "$min": {"min": min(amounts)},
+        "$max": {"max": max(amounts)},
+    }
+
+
+async def add_expense(user_id: UUID, created_at: datetime, tag: str, amount: float):
+    """
+    Account for a new expense in its rollup.
+    """
+    await ExpenseRollup.get_motor_collection().update_one(
+        _bucket(user_id, month_of(created_at), tag),
+        _add_update([amount]),
+        upsert=True,
+    )
+
+
+async def add_expenses(expenses: Iterable[Expense]):
+    """
+    Account for many new expenses with a single bulk write.
+    """
+    amounts = defaultdict(list)
+    for expense in expenses:
+        key = (expense.user_id, month_of(expense.created_at), expense.tag)
+        amounts[key].append(expense.amount)
+    if not amounts:
+        return
+
+    await ExpenseRollup.get_motor_collection().bulk_write(
+        [
+            pymongo.UpdateOne(_bucket(*key), _add_update(values), upsert=True)
+            for key, values in amounts.items()
+        ],
+        ordered=False,
+    )
+
+
+async def remove_expense(user_id: UUID, created_at: datetime, tag: str, amount: float):
+    """
+    Take a removed expense out of its rollup. Sum and count are adjusted with
+    $inc; min and max cannot be, so the rollup is recomputed from its month of
+    expenses when the removed amount was one of its bounds.
+    """
+    month = month_of(created_at)
+    rollup = await ExpenseRollup.get_motor_collection().find_one_and_update(
+        _bucket(user_id, month, tag),
+        {"$inc": {"total": -amount, "count": -1}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+    if rollup is None:
+        return
+    if rollup["count"] <= 0 or amount <= rollup["min"] or amount >= rollup["max"]:
+        await recompute_rollup(user_id, month, tag)
+
+
+async def change_expense(
+    user_id: UUID,
+    created_at: datetime,
+    old_tag: str,
+    old_amount: float,
+    new_tag: str,
+    new_amount: float,
+):
+    """
+    Account for an updated expense whose tag and/or amount changed.
+    """
+    if old_tag != new_tag:
+        await remove_expense(user_id, created_at, old_tag, old_amount)
+        await add_expense(user_id, created_at, new_tag, new_amount)
+        return
+    if old_amount == new_amount:
+        return
+
+    # Same rollup: apply the difference in a single update
+    month = month_of(created_at)
+    rollup = await ExpenseRollup.get_motor_collection().find_one_and_update(
+        _bucket(user_id, month, new_tag),
+        {
+            "$inc": {"total": new_amount - old_amount},
+            "$min": {"min": new_amount},
+            "$max": {"max": new_amount},
+        },
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+    if rollup is None or old_amount <= rollup["min"] or old_amount >= rollup["max"]:
+        await recompute_rollup(user_id, month, new_tag)
+
+
+async def recompute_rollup(user_id: UUID, month: str, tag: str):
+    """
+    Recompute one rollup from the expenses of its month, deleting it when
+    none remain.
+    """
+    start, end = month_bounds(month)
+    rows = await _aggregate(
+        {"user_id": user_id, "tag": tag, "created_at": {"$gte": start, "$lt": end}}
+    ).to_list(length=None)
+
+    collection = ExpenseRollup.get_motor_collection()
+    if not rows:
+        await collection.delete_one(_bucket(user_id, month, tag))
+        return
+    fields = {field: rows[0][field] for field in ("total", "count", "min", "max")}
+    await collection.update_one(
+        _bucket(user_id, month, tag), {"$set": fields}, upsert=True
+    )
+
+
+def _aggregate(match: Dict[str, Any]):
+    """
+    Compute rollups from the expenses matching a filter.
+    Returns a Motor aggregation cursor of rollup shaped documents.
+    """
+    pipeline = [
+        {"$match": Encoder().encode(match)},
+        {
+            "$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "month": {
+                        "$dateToString": {"format": "%Y-%m", "date": "$created_at"}
+                    },
+                    "tag": "$tag",
+                },
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1},
+                "min": {"$min": "$amount"},
+                "max": {"$max": "$amount"},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "month": "$_id.month",
+                "tag": "$_id.tag",
+                "total": 1,
+                "count": 1,
+                "min": 1,
+                "max": 1,
+            }
+        },
+    ]
+    return Expense.get_motor_collection().aggregate(pipeline)
+
+
+def _scope(user_id: Optional[UUID]) -> Dict[str, Any]:
+    """Filter restricting to one user, or to everything"""
+    return Encoder().encode({"user_id": user_id}) if user_id else {}
+
+
+async def rebuild_rollups(
+    user_id: Optional[UUID] = None, batch_size: int = 1000
+) -> int:
+    """
+    Recompute the rollups of one user, or of everyone, from the expenses.
+    Writes made while a rebuild runs may be lost, so run it while the
+    affected users are idle.
+    Returns the number of rollups written.
+    """
+    collection = ExpenseRollup.get_motor_collection()
+    await collection.delete_many(_scope(user_id))
+
+    written = 0
+    batch = []
+    async for rollup in _aggregate(_scope(user_id)):
+        batch.append(rollup)
+        if len(batch) >= batch_size:
+            await collection.insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+def _rollup_key(rollup: Dict[str, Any]) -> Tuple[Any, str, str]:
+    """Identity of a rollup document"""
+    return (rollup["user_id"], rollup["month"], rollup["tag"])
+
+
+def _matches(expected: Dict[str, Any], stored: Dict[str, Any]) -> bool:
+    """Whether a stored rollup agrees with the one recomputed from expenses"""
+    tolerance = TOTAL_TOLERANCE * max(1.0, abs(expected["total"]))
+    return (
+        abs(expected["total"] - stored.get("total", 0)) <= tolerance
+        and expected["count"] == stored.get("count")
+        and expected["min"] == stored.get("min")
+        and expected["max"] == stored.get("max")
+    )
+
+
+async def check_rollups(user_id: Optional[UUID] = None) -> List[Dict[str, Any]]:
+    """
+    Compare the stored rollups with rollups recomputed from the expenses.
+    Returns one {"user_id", "month", "tag", "expected", "stored"} entry per
+    disagreeing rollup, where either side may be None when missing.
+    """
+    expected = {}
+    async for rollup in _aggregate(_scope(user_id)):
+        expected[_rollup_key(rollup)] = rollup
+
+    stored = {}
+    async for rollup in ExpenseRollup.get_motor_collection().find(
+        _scope(user_id), {"_id": 0}
+    ):
+        stored[_rollup_key(rollup)] = rollup
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=lambda key: key[1:]):
+        if key in expected and key in stored and _matches(expected[key], stored[key]):
+            continue
+        user, month, tag = key
+        mismatches.append(
+            {
+                "user_id": user.as_uuid(),
+                "month": month,
+                "tag": tag,
+                "expected": expected.get(key),
+                "stored": stored.get(key),
+            }
+        )
+    return mismatches
+
+
+async def summarize_rollups(
+    user_id: Union[str, UUID],
+    group_by: List[str],
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sum a user's rollups per tag and/or month, reading O(months x tags)
+    documents instead of every expense. start_month is inclusive and
+    end_month exclusive.
+    """
+    if isinstance(user_id, str):
+        user_id = UUID(user_id)
+
+    pipeline = summary_pipeline(user_id, group_by, start_month, end_month)
+    collection = ExpenseRollup.get_motor_collection()
+    rows = await collection.aggregate(pipeline).to_list(length=None)
+    return [
+        {
+            **(row["_id"] or {}),
+            "total": row["total"],
+            "count": row["count"],
+            "min": row["min"],
+            "max": row["max"],
+        }
+        for row in rows
+    ]
+
+
+def summary_pipeline(
+    user_id: UUID,
+    group_by: List[str],
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Build the pipeline summing a user's rollups (see summarize_rollups)"""
+    match: Dict[str, Any] = {"user_id": user_id}
+    if start_month or end_month:
+        match["month"] = {}
+        if start_month:
+            match["month"]["$gte"] = start_month
+        if end_month:
+            match["month"]["$lt"] = end_month
+
+    group_key = {}
+    if "month" in group_by:
+        group_key["period"] = "$month"
+    if "tag" in group_by:
+        group_key["tag"] = "$tag"
+
+    return [
+        {"$match": Encoder().encode(match)},
+        {
+            "$group": {
+                "_id": group_key or None,
+                "total": {"$sum": "$total"},
+                "count": {"$sum": "$count"},
+                "min": {"$min": "$min"},
+                "max": {"$max": "$max"},
+            }
+        },
+        {"$sort": {"_id": 1}},
+    ]
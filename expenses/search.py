@@ -0,0 +1,316 @@
+import abc
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from beanie.odm.utils.encoder import Encoder
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from config.metrics import phase
+
+from . import state
+from .crud import EXPENSE_DATA_PROJECTION, document_to_data
+from .models import Expense
+from .pagination import decode_cursor, encode_cursor
+
+# Filters accepted by the search backends besides the text query
+SEARCH_FILTERS = ("tags", "min_amount", "max_amount", "start", "end")
+
+
+def _filters_query(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the MongoDB conditions of the search filters"""
+    query: Dict[str, Any] = {}
+    tags = filters.get("tags")
+    if tags:
+        query["tag"] = {"$in": list(tags)}
+    if filters.get("min_amount") is not None or filters.get("max_amount") is not None:
+        query["amount"] = {}
+        if filters.get("min_amount") is not None:
+            query["amount"]["$gte"] = filters["min_amount"]
+        if filters.get("max_amount") is not None:
+            query["amount"]["$lte"] = filters["max_amount"]
+    if filters.get("start") or filters.get("end"):
+        query["created_at"] = {}
+        if filters.get("start"):
+            query["created_at"]["$gte"] = filters["start"]
+        if filters.get("end"):
+            query["created_at"]["$lt"] = filters["end"]
+    return query
+
+
+def _decode_score_cursor(cursor: Optional[str]) -> Optional[Tuple[float, UUID]]:
+    """
+    Decode a search cursor, the (score, id) of the last result of a page.
+    Raises ValueError if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    score, expense_id = decode_cursor(cursor)
+    if not isinstance(score, (int, float)):
+        raise ValueError("invalid cursor")
+    return score, expense_id
+
+
+def text_search_pipeline(
+    user_id: UUID,
+    text: str,
+    filters: Dict[str, Any],
+    limit: int,
+    after: Optional[Tuple[float, UUID]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build the pipeline of MongoTextSearchBackend fetching one page of
+    matches, plus one to know whether another page follows, ranked after
+    the (score, id) of the previous page's last result.
+    """
+    match = {"user_id": user_id, "$text": {"$search": text}}
+    match.update(_filters_query(filters))
+
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": Encoder().encode(match)},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after:
+        score, expense_id = after
+        pipeline.append(
+            {
+                "$match": Encoder().encode(
+                    {
+                        "$or": [
+                            {"score": {"$lt": score}},
+                            {"score": score, "_id": {"$lt": expense_id}},
+                        ]
+                    }
+                )
+            }
+        )
+    # Ranking needs every match's score, so matches are sorted in memory;
+    # the text index keeps that to the documents containing the words
+    pipeline += [
+        {"$sort": {"score": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {**EXPENSE_DATA_PROJECTION, "score": 1}},
+    ]
+    return pipeline
+
+
+class SearchBackend(abc.ABC):
+    """
+    Interface of the expense description search engines. Results are ranked
+    by relevance, most relevant first, and paged with (score, id) cursors.
+    """
+
+    @abc.abstractmethod
+    async def search(
+        self,
+        user_id: UUID,
+        text: str,
+        filters: Dict[str, Any],
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get one page of a user's expenses whose description matches text,
+        each with its relevance "score", and the cursor of the next page.
+        Raises ValueError if the cursor is malformed.
+        """
+
+
+class MongoTextSearchBackend(SearchBackend):
+    """
+    Search with the `user_id_description_text` text index, ranked by
+    MongoDB's textScore. Text queries follow MongoDB's $search syntax:
+    stemmed words, "quoted phrases" and -excluded words.
+    """
+
+    async def search(self, user_id, text, filters, limit, cursor=None):
+        pipeline = text_search_pipeline(
+            user_id, text, filters, limit, _decode_score_cursor(cursor)
+        )
+        documents = (
+            await Expense.get_motor_collection()
+            .aggregate(pipeline)
+            .to_list(length=None)
+        )
+
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            last = documents[-1]
+            next_cursor = encode_cursor(last["score"], last["_id"].as_uuid())
+        with phase("serialize"):
+            results = [
+                {**document_to_data(document), "score": document["score"]}
+                for document in documents
+            ]
+        return results, next_cursor
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return re.findall(r"\w+", text.lower()) if text else []
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index of expense descriptions, scoring matches with
+    TF-IDF: rare words weigh more than words found in most descriptions.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = {document["_id"].as_uuid(): document for document in documents}
+        self.postings: Dict[str, Dict[UUID, int]] = defaultdict(dict)
+        for expense_id, document in self.documents.items():
+            for token in tokenize(document.get("description")):
+                postings = self.postings[token]
+                postings[expense_id] = postings.get(expense_id, 0) + 1
+
+    def search(self, text: str) -> Dict[UUID, float]:
+        """
+        Score the documents containing any word of text, skipping those
+        containing a -excluded word. Returns the score of each match.
+        """
+        words = [word for word in text.split() if not word.startswith("-")]
+        excluded = {
+            token
+            for word in text.split()
+            if word.startswith("-")
+            for token in tokenize(word[1:])
+        }
+
+        scores: Dict[UUID, float] = defaultdict(float)
+        for token in {token for word in words for token in tokenize(word)}:
+            postings = self.postings.get(token, {})
+            if not postings:
+                continue
+            idf = math.log(1 + len(self.documents) / len(postings))
+            for expense_id, frequency in postings.items():
+                scores[expense_id] += frequency * idf
+        for token in excluded:
+            for expense_id in self.postings.get(token, {}):
+                scores.pop(expense_id, None)
+        return scores
+
+
+def _matches_filters(document: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Whether an expense document passes the search filters"""
+    if filters.get("tags") and document["tag"] not in filters["tags"]:
+        return False
+    amount = document["amount"]
+    if filters.get("min_amount") is not None and amount < filters["min_amount"]:
+        return False
+    if filters.get("max_amount") is not None and amount > filters["max_amount"]:
+        return False
+    created_at = document["created_at"]
+    if filters.get("start") and created_at < filters["start"]:
+        return False
+    if filters.get("end") and created_at >= filters["end"]:
+        return False
+    return True
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """
+    Pure-Python search for servers without text search support (e.g. test
+    databases). Each worker builds an inverted index of a user's expenses on
+    their first search and reuses it until the user's expenses change, which
+    the per-user expense version tells. Indexes of up to max_users users are
+    kept, least recently used first out. Building an index reads the user's
+    whole history, so prefer MongoTextSearchBackend in production.
+    """
+
+    def __init__(self, max_users: int = 100):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[UUID, Tuple[tuple, InvertedIndex]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def _index(self, user_id: UUID) -> InvertedIndex:
+        """Get the index of a user's expenses, building it if outdated"""
+        # Read the version first, so an index is never newer than its version
+        version = await state.get_version(user_id)
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry and entry[0] == version:
+                self._indexes.move_to_end(user_id)
+                return entry[1]
+
+        documents = (
+            await Expense.get_motor_collection()
+            .find(Encoder().encode({"user_id": user_id}), EXPENSE_DATA_PROJECTION)
+            .to_list(length=None)
+        )
+        index = InvertedIndex(documents)
+        with self._lock:
+            self._indexes[user_id] = (version, index)
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    async def search(self, user_id, text, filters, limit, cursor=None):
+        after = _decode_score_cursor(cursor)
+        index = await self._index(user_id)
+
+        ranked = sorted(
+            (
+                (score, expense_id)
+                for expense_id, score in index.search(text).items()
+                if _matches_filters(index.documents[expense_id], filters)
+            ),
+            reverse=True,
+        )
+        if after:
+            ranked = [result for result in ranked if result < after]
+
+        next_cursor = None
+        if len(ranked) > limit:
+            ranked = ranked[:limit]
+            next_cursor = encode_cursor(*ranked[-1])
+        with phase("serialize"):
+            results = [
+                {**document_to_data(index.documents[expense_id]), "score": score}
+                for score, expense_id in ranked
+            ]
+        return results, next_cursor
+
+
+_backends: Dict[str, SearchBackend] = {}
+
+
+def get_search_backend() -> SearchBackend:
+    """Get the search backend configured by settings.EXPENSES_SEARCH_BACKEND"""
+    path = settings.EXPENSES_SEARCH_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+async def search_expenses(
+    user_id: UUID,
+    text: str,
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Search a user's expense descriptions, most relevant first.
+    filters takes tags, min_amount, max_amount, start and end, as in
+    crud.plan_expenses_query. Returns the page of results, each with its
+    relevance "score", and the cursor of the next page.
+    Raises ValueError if the text is empty, or a filter or the cursor invalid.
+    """
+    if not text or not text.strip():
+        raise ValueError("q is required")
+    filters = {
+        name: value
+        for name, value in (filters or {}).items()
+        if value is not None and value != "" and value != []
+    }
+    for name in filters:
+        if name not in SEARCH_FILTERS:
+            raise ValueError(f"unknown filter {name}")
+    return await get_search_backend().search(user_id, text, filters, limit, cursor)
@@ -0,0 +1,124 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+import pymongo
+from beanie.odm.utils.encoder import Encoder
+
+from .models import Expense, UserExpenseState
+
+
+async def bump_version(user_id: UUID, count: int = 0, total: float = 0):
+    """
+    Record a write to a user's expenses, adding count expenses and total to
+    the user's counters (negative for deletions) in the same update. Call it
+    after the write: the expense cache and the ETags are keyed by this
+    version, so a reader seeing the new version, in any worker, can never
+    be served data older than the write.
+    """
+    await UserExpenseState.get_motor_collection().update_one(
+        Encoder().encode({"_id": user_id}),
+        {
+            "$inc": {"version": 1, "count": count, "total": total},
+            "$set": {"last_modified": datetime.utcnow()},
+        },
+        upsert=True,
+    )
+
+
+async def reset_counters(user_id: UUID):
+    """
+    Zero a user's counters once all their expenses were deleted, bumping
+    the version like any write.
+    """
+    await UserExpenseState.get_motor_collection().update_one(
+        Encoder().encode({"_id": user_id}),
+        {
+            "$inc": {"version": 1},
+            "$set": {"count": 0, "total": 0, "last_modified": datetime.utcnow()},
+        },
+        upsert=True,
+    )
+
+
+async def get_version(user_id: UUID) -> Tuple[int, Optional[datetime]]:
+    """
+    Get the version of a user's expenses and the time of their last write.
+    Users without writes since versions were introduced are at version 0,
+    with an unknown last write.
+    """
+    state = await UserExpenseState.get_motor_collection().find_one(
+        Encoder().encode({"_id": user_id}), {"_id": 0}
+    )
+    if state is None:
+        return 0, None
+    return state.get("version", 0), state.get("last_modified")
+
+
+async def get_stats(user_id: UUID) -> Dict[str, Any]:
+    """
+    Get the number and total amount of a user's expenses and the time of
+    their last write, from the counters kept by bump_version.
+    """
+    state = await UserExpenseState.get_motor_collection().find_one(
+        Encoder().encode({"_id": user_id}),
+        {"_id": 0, "count": 1, "total": 1, "last_modified": 1},
+    )
+    state = state or {}
+    return {
+        "count": state.get("count", 0),
+        "total": state.get("total", 0),
+        "last_activity": state.get("last_modified"),
+    }
+
+
+async def rebuild_counters(
+    user_id: Optional[UUID] = None, batch_size: int = 1000
+) -> int:
+    """
+    Recompute the expense counters of one user, or of everyone, from the
+    expenses, e.g. to backfill them. Writes made while a rebuild runs may be
+    miscounted, so run it while the affected users are idle.
+    Returns the number of users whose counters were written.
+    """
+    collection = UserExpenseState.get_motor_collection()
+    scope = Encoder().encode({"user_id": user_id}) if user_id else {}
+    # Users left without expenses have no group below
+    await collection.update_many(
+        Encoder().encode({"_id": user_id}) if user_id else {},
+        {"$set": {"count": 0, "total": 0}},
+    )
+
+    written = 0
+    batch = []
+    groups = Expense.get_motor_collection().aggregate(
+        [
+            {"$match": scope},
+            {
+                "$group": {
+                    "_id": "$user_id",
+                    "count": {"$sum": 1},
+                    "total": {"$sum": "$amount"},
+                }
+            },
+        ]
+    )
+    async for group in groups:
+        batch.append(
+            pymongo.UpdateOne(
+                {"_id": group["_id"]},
+                {
+                    "$set": {"count": group["count"], "total": group["total"]},
+                    "$setOnInsert": {"version": 0},
+                },
+                upsert=True,
+            )
+        )
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        written += len(batch)
+    return written
@@ -0,0 +1,47 @@
+from typing import Any, AsyncIterator, Dict, List
+
+from config.responses import dumps
+
+JSON_CONTENT_TYPE = "application/json"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+async def _encoded_batches(
+    items: AsyncIterator[Dict[str, Any]], batch_size: int
+) -> AsyncIterator[List[bytes]]:
+    """
+    Encode items to JSON and group them so each chunk written to the client
+    holds up to batch_size items.
+    """
+    batch = []
+    async for item in items:
+        batch.append(dumps(item))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def json_array_chunks(
+    items: AsyncIterator[Dict[str, Any]], batch_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Stream items as a single JSON array, one chunk per batch.
+    """
+    yield b"["
+    separator = b""
+    async for batch in _encoded_batches(items, batch_size):
+        yield separator + b",".join(batch)
+        separator = b","
+    yield b"]"
+
+
+async def ndjson_chunks(
+    items: AsyncIterator[Dict[str, Any]], batch_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Stream items as newline delimited JSON, one chunk per batch.
+    """
+    async for batch in _encoded_batches(items, batch_size):
+        yield b"\n".join(batch) + b"\n"
@@ -3,5 +3,10 @@ from . import views
 
 urlpatterns = [
     path('', views.ExpenseListView.as_view(), name='expense-list'),
+    path('bulk/', views.ExpenseBulkView.as_view(), name='expense-bulk'),
+    path('summary/', views.ExpenseSummaryView.as_view(), name='expense-summary'),
+    path('stats/', views.ExpenseStatsView.as_view(), name='expense-stats'),
+    path('search/', views.ExpenseSearchView.as_view(), name='expense-search'),
+    path('changes/', views.ExpenseChangesView.as_view(), name='expense-changes'),
     path('<str:expense_id>/', views.ExpenseDetailView.as_view(), name='expense-detail'),
 ] 
\ No newline at end of file
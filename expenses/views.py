@@ -1,35 +1,207 @@
+import hashlib
 import json
-from django.http import JsonResponse, HttpRequest
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from config.logs import RateLimitedLog
+from config.responses import FastJsonResponse
 from users.auth import get_user_id_from_request
-from . import crud
+from . import crud, state
+from .search import search_expenses
+from .pagination import parse_limit
+from .streaming import (
+    JSON_CONTENT_TYPE,
+    NDJSON_CONTENT_TYPE,
+    json_array_chunks,
+    ndjson_chunks,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rejected expense creations, logged at most once per interval per error type
+create_failure_log = RateLimitedLog(
+    logger, "expense_create_failure", settings.LOG_RATE_LIMIT_INTERVAL
+)
+
+
+def _parse_datetime(value: str, name: str):
+    """
+    Parse an ISO date or datetime query parameter into a naive UTC datetime.
+    Raises ValueError if the value is not a valid date.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"{name} must be an ISO date or datetime")
+        parsed = datetime.combine(date, datetime.min.time())
+    if timezone.is_aware(parsed):
+        # Expenses are stored as naive UTC datetimes
+        parsed = timezone.make_naive(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _etag(user_id, version: int, *parts) -> str:
+    """
+    Build a strong ETag for a representation of a user's expenses at a version.
+    The user is part of it, so a client switching accounts never gets a 304.
+    """
+    key = ":".join(str(part) for part in (user_id, version, *parts))
+    return quote_etag(hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+
+def _parse_amount(value: str, name: str):
+    """
+    Parse an amount query parameter.
+    Raises ValueError if the value is not a number.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def _parse_filters(request: HttpRequest):
+    """
+    Parse the expense list filters: repeated or comma separated `tag`,
+    `min_amount`, `max_amount`, `start`, `end` and a `description` prefix.
+    Raises ValueError if a value is invalid.
+    """
+    return {
+        "tags": [
+            tag.strip()
+            for value in request.GET.getlist("tag")
+            for tag in value.split(",")
+            if tag.strip()
+        ],
+        "min_amount": _parse_amount(request.GET.get("min_amount"), "min_amount"),
+        "max_amount": _parse_amount(request.GET.get("max_amount"), "max_amount"),
+        "start": _parse_datetime(request.GET.get("start"), "start"),
+        "end": _parse_datetime(request.GET.get("end"), "end"),
+        "description": request.GET.get("description"),
+    }
+
+
+def _timestamp(value: datetime) -> float:
+    """Get the POSIX timestamp of a naive UTC datetime read from MongoDB"""
+    return value.replace(tzinfo=dt_timezone.utc).timestamp()
+
+
+def _not_modified(request: HttpRequest, etag: str, last_modified=None):
+    """
+    Answer If-None-Match / If-Modified-Since with a 304 response, or return
+    None if the client's copy is outdated.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(_timestamp(last_modified)),
+    )
+    if response is not None:
+        _set_validators(response, etag, last_modified)
+    return response
+
+
+def _set_validators(response: HttpResponse, etag: str, last_modified=None):
+    """Set the ETag and Last-Modified of a response, and require revalidation"""
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(_timestamp(last_modified))
+    patch_cache_control(response, private=True, no_cache=True)
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class ExpenseListView(View):
-    async def get(self, request: HttpRequest) -> JsonResponse:
-        """Get all expenses for the authenticated user"""
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
+        """Get a page of expenses for the authenticated user"""
         # Authenticate request
         user_id = get_user_id_from_request(request)
         if not user_id:
-            return JsonResponse({"detail": "Authentication failed"}, status=401)
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
 
-        # Get all expenses
-        expenses = await crud.get_all_expenses(user_id)
+        try:
+            filters = _parse_filters(request)
+            sort = request.GET.get("sort") or "-created_at"
+        except ValueError as e:
+            return FastJsonResponse({"detail": str(e)}, status=400)
 
-        # Serialize expenses
-        expenses_data = crud.serialize_expenses(expenses)
+        # Stream the whole history when asked to, or when NDJSON is preferred
+        preferred_type = request.get_preferred_type(
+            [JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE]
+        )
+        stream = request.GET.get("stream", "").lower() in ("1", "true")
+        if stream or preferred_type == NDJSON_CONTENT_TYPE:
+            try:
+                return self._stream(user_id, preferred_type, filters, sort)
+            except ValueError as e:
+                return FastJsonResponse({"detail": str(e)}, status=400)
 
-        return JsonResponse(expenses_data, safe=False)
+        # Get one page of expenses
+        try:
+            limit = parse_limit(
+                request.GET.get("limit"),
+                settings.EXPENSES_PAGE_SIZE,
+                settings.EXPENSES_MAX_PAGE_SIZE,
+            )
+            cursor = request.GET.get("cursor")
+            # Read the version before the page, so the ETag is never newer
+            version, _ = await state.get_version(user_id)
+            etag = _etag(user_id, version, request.GET.urlencode())
+            not_modified = _not_modified(request, etag)
+            if not_modified:
+                return not_modified
+
+            expenses_data, next_cursor = await crud.get_cached_expenses_page_data(
+                user_id, version, limit, cursor, filters, sort
+            )
+        except ValueError as e:
+            return FastJsonResponse({"detail": str(e)}, status=400)
 
-    async def post(self, request: HttpRequest) -> JsonResponse:
+        response = FastJsonResponse(expenses_data, safe=False)
+        _set_validators(response, etag)
+        if next_cursor:
+            # Advertise the next page with an RFC 8288 Link header, keeping
+            # the filters and sort of this one
+            query = request.GET.copy()
+            query["cursor"] = next_cursor
+            query["limit"] = limit
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+            response["Link"] = f'<{next_url}>; rel="next"'
+        return response
+
+    def _stream(
+        self, user_id, content_type: str, filters, sort: str
+    ) -> StreamingHttpResponse:
+        """Stream all matching expenses of a user as a JSON array or as NDJSON"""
+        batch_size = settings.EXPENSES_STREAM_BATCH_SIZE
+
+        expenses_data = crud.iter_expenses_data(user_id, batch_size, filters, sort)
+        if content_type == NDJSON_CONTENT_TYPE:
+            chunks = ndjson_chunks(expenses_data, batch_size)
+        else:
+            content_type = JSON_CONTENT_TYPE
+            chunks = json_array_chunks(expenses_data, batch_size)
+        return StreamingHttpResponse(chunks, content_type=content_type)
+
+    async def post(self, request: HttpRequest) -> FastJsonResponse:
         """Create a new expense"""
         # Authenticate request
         user_id = get_user_id_from_request(request)
         if not user_id:
-            return JsonResponse({"detail": "Authentication failed"}, status=401)
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
 
         # Parse request data
         try:
@@ -40,7 +212,7 @@ class ExpenseListView(View):
 
             # Validate required fields
             if amount is None:
-                return JsonResponse({"detail": "amount is required"}, status=400)
+                return FastJsonResponse({"detail": "amount is required"}, status=400)
 
             # Create expense
             expense = await crud.create_expense(
@@ -48,67 +220,249 @@ class ExpenseListView(View):
             )
 
             # Return created expense
-            return JsonResponse(crud.serialize_expense(expense), status=201)
+            return FastJsonResponse(crud.serialize_expense(expense), status=201)
 
         except json.JSONDecodeError:
-            return JsonResponse({"detail": "Invalid JSON"}, status=400)
+            return FastJsonResponse({"detail": "Invalid JSON"}, status=400)
         except Exception as e:
-            print(type(e))
-            return JsonResponse({"detail": str(e)}, status=400)
+            create_failure_log.record(type(e).__name__, detail=str(e))
+            return FastJsonResponse({"detail": str(e)}, status=400)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ExpenseBulkView(View):
+    async def post(self, request: HttpRequest) -> FastJsonResponse:
+        """Create many expenses from a JSON array or NDJSON body"""
+        # Authenticate request
+        user_id = get_user_id_from_request(request)
+        if not user_id:
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
+
+        # Parse request data
+        try:
+            rows = self._parse_rows(request)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return FastJsonResponse({"detail": "Invalid JSON"}, status=400)
+        if not isinstance(rows, list):
+            return FastJsonResponse({"detail": "expected a JSON array"}, status=400)
+        if len(rows) > settings.EXPENSES_BULK_MAX_ROWS:
+            return FastJsonResponse(
+                {"detail": f"at most {settings.EXPENSES_BULK_MAX_ROWS} rows allowed"},
+                status=400,
+            )
+
+        try:
+            chunk_size = parse_limit(
+                request.GET.get("chunk_size"),
+                settings.EXPENSES_BULK_CHUNK_SIZE,
+                settings.EXPENSES_BULK_MAX_ROWS,
+            )
+        except ValueError:
+            return FastJsonResponse(
+                {"detail": "chunk_size must be a positive integer"}, status=400
+            )
+
+        # Create expenses
+        start = time.perf_counter()
+        results = await crud.bulk_create_expenses(user_id, rows, chunk_size)
+        elapsed = time.perf_counter() - start
+
+        created = sum(1 for result in results if "id" in result)
+        return FastJsonResponse(
+            {
+                "created": created,
+                "failed": len(results) - created,
+                "rows_per_second": round(len(results) / elapsed) if elapsed else None,
+                "results": results,
+            }
+        )
+
+    def _parse_rows(self, request: HttpRequest):
+        """Parse the body as NDJSON or as a JSON array depending on its content type"""
+        if request.content_type != NDJSON_CONTENT_TYPE:
+            return json.loads(request.body)
+
+        rows = []
+        for line in request.body.decode().splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Reported for its own row instead of failing the whole upload
+                rows.append(None)
+        return rows
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ExpenseSummaryView(View):
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
+        """Get spending totals per tag and/or per day, week or month"""
+        # Authenticate request
+        user_id = get_user_id_from_request(request)
+        if not user_id:
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
+
+        # Summarize expenses
+        try:
+            group_by = [
+                key.strip()
+                for key in request.GET.get("group_by", "").split(",")
+                if key.strip()
+            ]
+            summary = await crud.summarize_expenses(
+                user_id,
+                group_by,
+                start=_parse_datetime(request.GET.get("start"), "start"),
+                end=_parse_datetime(request.GET.get("end"), "end"),
+            )
+        except ValueError as e:
+            return FastJsonResponse({"detail": str(e)}, status=400)
+
+        return FastJsonResponse(summary, safe=False)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ExpenseStatsView(View):
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
+        """Get the number and total of the user's expenses and last activity"""
+        # Authenticate request
+        user_id = get_user_id_from_request(request)
+        if not user_id:
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
+
+        # Read the counters maintained by the writes, not the expenses
+        return FastJsonResponse(await state.get_stats(user_id))
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ExpenseSearchView(View):
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
+        """Search the descriptions of the authenticated user's expenses"""
+        # Authenticate request
+        user_id = get_user_id_from_request(request)
+        if not user_id:
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
+
+        # Search, most relevant first
+        try:
+            filters = _parse_filters(request)
+            filters.pop("description")
+            limit = parse_limit(
+                request.GET.get("limit"),
+                settings.EXPENSES_PAGE_SIZE,
+                settings.EXPENSES_MAX_PAGE_SIZE,
+            )
+            results, next_cursor = await search_expenses(
+                user_id,
+                request.GET.get("q"),
+                filters,
+                limit,
+                request.GET.get("cursor"),
+            )
+        except ValueError as e:
+            return FastJsonResponse({"detail": str(e)}, status=400)
+
+        response = FastJsonResponse(results, safe=False)
+        if next_cursor:
+            query = request.GET.copy()
+            query["cursor"] = next_cursor
+            query["limit"] = limit
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+            response["Link"] = f'<{next_url}>; rel="next"'
+        return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ExpenseChangesView(View):
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
+        """Get the expenses created, updated or deleted since a checkpoint"""
+        # Authenticate request
+        user_id = get_user_id_from_request(request)
+        if not user_id:
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
+
+        # Get the changes
+        try:
+            limit = parse_limit(
+                request.GET.get("limit"),
+                settings.EXPENSES_PAGE_SIZE,
+                settings.EXPENSES_MAX_PAGE_SIZE,
+            )
+            changes = await crud.get_expense_changes(
+                user_id, limit, request.GET.get("since")
+            )
+        except crud.ExpiredCheckpointError as e:
+            return FastJsonResponse({"detail": str(e)}, status=410)
+        except ValueError as e:
+            return FastJsonResponse({"detail": str(e)}, status=400)
+
+        return FastJsonResponse(changes)
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class ExpenseDetailView(View):
-    async def get(self, request: HttpRequest, expense_id: str) -> JsonResponse:
+    async def get(self, request: HttpRequest, expense_id: str) -> FastJsonResponse:
         """Get a specific expense"""
         # Authenticate request
         user_id = get_user_id_from_request(request)
         if not user_id:
-            return JsonResponse({"detail": "Authentication failed"}, status=401)
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
+
+        # Answer from the version alone if the client's copy is current
+        version, last_modified = await state.get_version(user_id)
+        etag = _etag(user_id, version, expense_id)
+        not_modified = _not_modified(request, etag, last_modified)
+        if not_modified:
+            return not_modified
 
         # Get expense
-        expense = await crud.get_expense_by_id(expense_id, user_id)
-        if not expense:
-            return JsonResponse({"detail": "expense not found"}, status=404)
+        expense_data = await crud.get_cached_expense_data(
+            expense_id, user_id, version
+        )
+        if not expense_data:
+            return FastJsonResponse({"detail": "expense not found"}, status=404)
 
         # Return expense
-        return JsonResponse(crud.serialize_expense(expense))
+        response = FastJsonResponse(expense_data)
+        _set_validators(response, etag, last_modified)
+        return response
 
-    async def patch(self, request: HttpRequest, expense_id: str) -> JsonResponse:
+    async def patch(self, request: HttpRequest, expense_id: str) -> FastJsonResponse:
         """Update an expense"""
         # Authenticate request
         user_id = get_user_id_from_request(request)
         if not user_id:
-            return JsonResponse({"detail": "Authentication failed"}, status=401)
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
 
         # Parse request data
         try:
             data = json.loads(request.body)
 
             # Update expense
-            expense = await crud.update_expense(expense_id, user_id, data)
-            if not expense:
-                return JsonResponse({"detail": "expense not found"}, status=404)
+            expense_data = await crud.update_expense(expense_id, user_id, data)
+            if not expense_data:
+                return FastJsonResponse({"detail": "expense not found"}, status=404)
 
             # Return updated expense
-            return JsonResponse(crud.serialize_expense(expense))
+            return FastJsonResponse(expense_data)
 
         except json.JSONDecodeError:
-            return JsonResponse({"detail": "Invalid JSON"}, status=400)
+            return FastJsonResponse({"detail": "Invalid JSON"}, status=400)
         except Exception as e:
-            return JsonResponse({"detail": str(e)}, status=400)
+            return FastJsonResponse({"detail": str(e)}, status=400)
 
-    async def delete(self, request: HttpRequest, expense_id: str) -> JsonResponse:
+    async def delete(self, request: HttpRequest, expense_id: str) -> FastJsonResponse:
         """Delete an expense"""
         # Authenticate request
         user_id = get_user_id_from_request(request)
         if not user_id:
-            return JsonResponse({"detail": "Authentication failed"}, status=401)
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
 
         # Delete expense
-        expense = await crud.delete_expense(expense_id, user_id)
-        if not expense:
-            return JsonResponse({"detail": "expense not found"}, status=404)
+        expense_data = await crud.delete_expense(expense_id, user_id)
+        if not expense_data:
+            return FastJsonResponse({"detail": "expense not found"}, status=404)
 
         # Return deleted expense data
-        return JsonResponse(crud.serialize_expense(expense))
+        return FastJsonResponse(expense_data)
@@ -8,18 +8,76 @@ RUN_TIME="2m"                 # Increased run time to allow for gradual ramp-up
 DB_TYPE="mongodb"              # Database type (sqlite, postgres, etc.)
 SERVER_TYPE="asgi_gunicorn"   # Server type (asgi_gunicorn, wsgi_gunicorn, asgi_daphne)
 WORKER_COUNT=4                # Number of workers
-CSV_PREFIX="locust_${DB_TYPE}_${SERVER_TYPE}_${WORKER_COUNT}"  # Prefix for CSV files
+SCENARIO="normal"             # Scenario (normal, heavy, bulk, mixed)
+MODE="paced"                  # paced (think time between tasks) or throughput (zero wait)
+SEED=false                    # Seed heavy-history users before the run
 TEST_FILE="tests/load/locustfile.py"  # Path to locustfile
 
+usage() {
+  cat <<EOF
+Usage: $0 [options]
+  -s, --scenario NAME   normal, heavy, bulk or mixed (default: $SCENARIO)
+      --throughput      Zero wait between tasks, to measure the saturation throughput
+      --seed            Seed the heavy-history users first (manage.py seed_load_test_users)
+      --server TYPE     Label of the server under test: asgi_gunicorn, asgi_daphne, wsgi_gunicorn (default: $SERVER_TYPE)
+  -w, --workers N       Label of the server's worker count (default: $WORKER_COUNT)
+  -u, --users N         Simulated users (default: $USERS)
+  -r, --spawn-rate N    Users spawned per second (default: $SPAWN_RATE)
+  -t, --run-time TIME   Run time, e.g. 30s, 2m (default: $RUN_TIME)
+      --host URL        Target host (default: $HOST)
+
+The server is not started by this script; --server and --workers only label
+the results. Each run appends its request statistics to
+\$RESULTS_DIR/summary.csv, one row per endpoint, to compare runs across
+scenarios and server types.
+EOF
+}
+
+while [ $# -gt 0 ]; do
+  case "$1" in
+    -s|--scenario) SCENARIO="$2"; shift 2 ;;
+    --throughput) MODE="throughput"; shift ;;
+    --seed) SEED=true; shift ;;
+    --server) SERVER_TYPE="$2"; shift 2 ;;
+    -w|--workers) WORKER_COUNT="$2"; shift 2 ;;
+    -u|--users) USERS="$2"; shift 2 ;;
+    -r|--spawn-rate) SPAWN_RATE="$2"; shift 2 ;;
+    -t|--run-time) RUN_TIME="$2"; shift 2 ;;
+    --host) HOST="$2"; shift 2 ;;
+    -h|--help) usage; exit 0 ;;
+    *) echo "Unknown option: $1"; usage; exit 1 ;;
+  esac
+done
+
+# User classes of each scenario
+case "$SCENARIO" in
+  normal) USER_CLASSES="NormalUser" ;;
+  heavy) USER_CLASSES="HeavyHistoryUser" ;;
+  bulk) USER_CLASSES="BulkImportUser" ;;
+  mixed) USER_CLASSES="NormalUser HeavyHistoryUser BulkImportUser" ;;
+  *) echo "Unknown scenario: $SCENARIO"; usage; exit 1 ;;
+esac
+
+if [ "$MODE" = "throughput" ]; then
+  export LOCUST_ZERO_WAIT=1
+fi
+
+CSV_PREFIX="locust_${DB_TYPE}_${SERVER_TYPE}_${WORKER_COUNT}_${SCENARIO}_${MODE}"  # Prefix for CSV files
+
 # Create a results directory if it doesn't exist
 RESULTS_DIR="locust_results"
 mkdir -p $RESULTS_DIR
+export SEEDED_USERS_FILE="$RESULTS_DIR/seeded_users.json"
+
+if [ "$SEED" = true ]; then
+  python manage.py seed_load_test_users --output "$SEEDED_USERS_FILE" || exit 1
+fi
 
 # Get current date/time for unique filenames
 TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
 
 # Run locust in headless mode with CSV output
-echo "Starting Locust test with $USERS users at a rate of $SPAWN_RATE users/second for $RUN_TIME..."
+echo "Starting Locust $SCENARIO scenario ($MODE) with $USERS users at a rate of $SPAWN_RATE users/second for $RUN_TIME..."
 
 # Use a more reliable approach for gradual user spawning
 locust -f $TEST_FILE \
@@ -30,7 +88,32 @@ locust -f $TEST_FILE \
   --headless \
   --csv="$RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}" \
   --html="$RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}.html" \
-  --only-summary
+  --only-summary \
+  $USER_CLASSES
+
+# Append this run's statistics to the summary shared by all runs
+python - "$RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}_stats.csv" "$RESULTS_DIR/summary.csv" \
+  "$TIMESTAMP" "$SCENARIO" "$MODE" "$DB_TYPE" "$SERVER_TYPE" "$WORKER_COUNT" "$USERS" <<'EOF'
+import csv
+import os
+import sys
+
+stats_file, summary_file, *run = sys.argv[1:]
+columns = [
+    "Type", "Name", "Request Count", "Failure Count", "Requests/s",
+    "Average Response Time", "50%", "95%", "99%", "Max Response Time",
+]
+new_file = not os.path.exists(summary_file)
+with open(stats_file) as stats, open(summary_file, "a", newline="") as summary:
+    writer = csv.writer(summary)
+    if new_file:
+        writer.writerow(
+            ["timestamp", "scenario", "mode", "db", "server", "workers", "users"]
+            + columns
+        )
+    for row in csv.DictReader(stats):
+        writer.writerow(run + [row[column] for column in columns])
+EOF
 
 echo "Test completed. Results saved to $RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}"
 echo "CSV files:"
@@ -38,4 +121,5 @@ echo "  - $RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}_stats.csv (Request statistics)
 echo "  - $RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}_stats_history.csv (Time series statistics)"
 echo "  - $RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}_failures.csv (Failed requests)"
 echo "  - $RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}_exceptions.csv (Python exceptions)"
-echo "HTML report: $RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}.html" 
\ No newline at end of file
+echo "  - $RESULTS_DIR/summary.csv (Summary of all runs)"
+echo "HTML report: $RESULTS_DIR/${CSV_PREFIX}_${TIMESTAMP}.html"
@@ -1,7 +1,18 @@
 import json
 import uuid
+from datetime import datetime, timedelta, timezone
 import pytest
-from expenses.models import Expense
+from config.db import (
+    TOMBSTONE_TTL_INDEX,
+    apply_tombstone_retention,
+    initialize_beanie,
+)
+from expenses import crud, rollups, state
+from expenses.cache import expense_cache
+from expenses.explain import explain_aggregate, explain_find, is_index_backed
+from expenses.pagination import encode_cursor
+from expenses.models import Expense, ExpenseRollup, ExpenseTombstone, UserExpenseState
+from expenses.search import text_search_pipeline
 
 
 @pytest.fixture(scope="function", autouse=True)
@@ -10,6 +21,10 @@ async def clean_expenses_collection():
     Clear the expenses collection before each test.
     """
     await Expense.find_all().delete()
+    await ExpenseRollup.find_all().delete()
+    await UserExpenseState.find_all().delete()
+    await ExpenseTombstone.find_all().delete()
+    await expense_cache.clear()
 
 
 @pytest.mark.asyncio
@@ -226,4 +241,792 @@ async def test_delete_nonexistent_expense(client, test_user, auth_headers):
     random_uuid = str(uuid.uuid4())
     response = client.delete(f"/api/expenses/{random_uuid}/", **auth_headers)
     
-    assert response.status_code == 404 
\ No newline at end of file
+    assert response.status_code == 404 
+
+@pytest.mark.asyncio
+async def test_get_expenses_paginated(client, test_user, auth_headers):
+    """
+    Test walking the expense list page by page with cursors.
+    """
+    created_ids = []
+    for amount in (10, 20, 30):
+        create_response = client.post(
+            "/api/expenses/",
+            data=json.dumps({"amount": amount, "tag": "food"}),
+            content_type="application/json",
+            **auth_headers
+        )
+        created_ids.append(json.loads(create_response.content)["id"])
+
+    # First page
+    response = client.get("/api/expenses/?limit=2", **auth_headers)
+
+    assert response.status_code == 200
+    first_page = json.loads(response.content)
+    assert len(first_page) == 2
+    assert 'rel="next"' in response["Link"]
+
+    # Follow the next link
+    next_url = response["Link"].split(">")[0].lstrip("<")
+    response = client.get(next_url, **auth_headers)
+
+    assert response.status_code == 200
+    second_page = json.loads(response.content)
+    assert len(second_page) == 1
+    assert not response.has_header("Link")
+
+    returned_ids = [expense["id"] for expense in first_page + second_page]
+    assert sorted(returned_ids) == sorted(created_ids)
+
+
+@pytest.mark.asyncio
+async def test_get_expenses_invalid_cursor(client, test_user, auth_headers):
+    """
+    Test that a malformed cursor is rejected.
+    """
+    response = client.get("/api/expenses/?cursor=not-a-cursor", **auth_headers)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_stream_expenses(client, test_user, auth_headers):
+    """
+    Test streaming the whole expense history as a JSON array and as NDJSON.
+    """
+    for amount in (10, 20, 30):
+        client.post(
+            "/api/expenses/",
+            data=json.dumps({"amount": amount, "tag": "food"}),
+            content_type="application/json",
+            **auth_headers
+        )
+
+    response = client.get("/api/expenses/?stream=1", **auth_headers)
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/json"
+    body = b"".join([chunk async for chunk in response.streaming_content])
+    assert sorted(expense["amount"] for expense in json.loads(body)) == [10, 20, 30]
+
+    response = client.get(
+        "/api/expenses/", HTTP_ACCEPT="application/x-ndjson", **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    body = b"".join([chunk async for chunk in response.streaming_content])
+    lines = body.decode().splitlines()
+    assert sorted(json.loads(line)["amount"] for line in lines) == [10, 20, 30]
+
+    response = client.get("/api/expenses/?stream=0", **auth_headers)
+
+    assert response.status_code == 200
+    assert not response.streaming
+    assert len(json.loads(response.content)) == 3
+
+
+@pytest.mark.asyncio
+async def test_update_expense_invalid_amount(client, test_user, auth_headers):
+    """
+    Test that an update with an invalid value is rejected and not applied.
+    """
+    create_response = client.post(
+        "/api/expenses/",
+        data=json.dumps({"amount": 100, "tag": "food"}),
+        content_type="application/json",
+        **auth_headers
+    )
+    expense_id = json.loads(create_response.content)["id"]
+
+    response = client.patch(
+        f"/api/expenses/{expense_id}/",
+        data=json.dumps({"amount": "a lot"}),
+        content_type="application/json",
+        **auth_headers
+    )
+
+    assert response.status_code == 400
+    response = client.get(f"/api/expenses/{expense_id}/", **auth_headers)
+    assert json.loads(response.content)["amount"] == 100
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_expenses(client, test_user, auth_headers):
+    """
+    Test importing a JSON array of expenses with an invalid row.
+    """
+    rows = [
+        {"amount": 10, "tag": "food"},
+        {"amount": "ten", "tag": "food"},
+        {"amount": 30, "tag": "travel", "description": "Train"},
+    ]
+
+    response = client.post(
+        "/api/expenses/bulk/?chunk_size=1",
+        data=json.dumps(rows),
+        content_type="application/json",
+        **auth_headers
+    )
+
+    assert response.status_code == 200
+    response_data = json.loads(response.content)
+    assert response_data["created"] == 2
+    assert response_data["failed"] == 1
+    assert [("id" in result) for result in response_data["results"]] == [
+        True,
+        False,
+        True,
+    ]
+    assert "amount" in response_data["results"][1]["detail"]
+    assert await Expense.find_all().count() == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_expenses_ndjson(client, test_user, auth_headers):
+    """
+    Test importing expenses as newline delimited JSON.
+    """
+    body = '{"amount": 10, "tag": "food"}\n\n{"amount": 20, "tag": "food"}\n'
+
+    response = client.post(
+        "/api/expenses/bulk/",
+        data=body,
+        content_type="application/x-ndjson",
+        **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert json.loads(response.content)["created"] == 2
+    assert await Expense.find_all().count() == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content_type", ["application/x-ndjson", "application/json"])
+async def test_bulk_create_expenses_invalid_utf8(
+    client, test_user, auth_headers, content_type
+):
+    """
+    Test that a body which is not valid UTF-8 is rejected.
+    """
+    response = client.post(
+        "/api/expenses/bulk/",
+        data=b'{"amount": 10, "tag": "\xff"}\n',
+        content_type=content_type,
+        **auth_headers
+    )
+
+    assert response.status_code == 400
+    assert await Expense.find_all().count() == 0
+
+
+@pytest.fixture(scope="function")
+def imported_expenses(client, test_user, auth_headers):
+    """
+    Import expenses spread over two months through the bulk endpoint.
+    """
+    rows = [
+        {"amount": 10, "tag": "food", "created_at": "2025-01-05T12:00:00"},
+        {"amount": 15, "tag": "food", "created_at": "2025-01-20T12:00:00"},
+        {"amount": 40, "tag": "travel", "created_at": "2025-01-09T12:00:00"},
+        {"amount": 25, "tag": "food", "created_at": "2025-02-01T12:00:00"},
+    ]
+    response = client.post(
+        "/api/expenses/bulk/",
+        data=json.dumps(rows),
+        content_type="application/json",
+        **auth_headers
+    )
+    return [result["id"] for result in json.loads(response.content)["results"]]
+
+
+@pytest.mark.asyncio
+async def test_summarize_expenses(client, imported_expenses, auth_headers):
+    """
+    Test spending totals grouped by month and tag, and by day.
+    """
+    response = client.get(
+        "/api/expenses/summary/?group_by=month,tag&start=2025-01-01&end=2025-02-01",
+        **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert json.loads(response.content) == [
+        {"period": "2025-01", "tag": "food", "total": 25, "count": 2, "min": 10, "max": 15},
+        {"period": "2025-01", "tag": "travel", "total": 40, "count": 1, "min": 40, "max": 40},
+    ]
+
+    response = client.get(
+        "/api/expenses/summary/?group_by=day&start=2025-01-09T00:00:00&end=2025-02-01",
+        **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert json.loads(response.content) == [
+        {"period": "2025-01-09", "total": 40, "count": 1, "min": 40, "max": 40},
+        {"period": "2025-01-20", "total": 15, "count": 1, "min": 15, "max": 15},
+    ]
+
+    # Aware bounds are converted to UTC: 14:00+02:00 is 12:00 UTC, inclusive
+    response = client.get(
+        "/api/expenses/summary/?group_by=day"
+        "&start=2025-01-09T14:00:00%2B02:00&end=2025-01-20T00:00:00%2B02:00",
+        **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert json.loads(response.content) == [
+        {"period": "2025-01-09", "total": 40, "count": 1, "min": 40, "max": 40},
+    ]
+
+    response = client.get("/api/expenses/summary/?group_by=day,month", **auth_headers)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_writes(client, imported_expenses, auth_headers):
+    """
+    Test that the monthly rollups stay consistent through updates and deletes.
+    """
+    food_ids = imported_expenses[:2]
+
+    # Move an expense to another tag, change the amount of another one
+    client.patch(
+        f"/api/expenses/{food_ids[0]}/",
+        data=json.dumps({"tag": "groceries"}),
+        content_type="application/json",
+        **auth_headers
+    )
+    client.patch(
+        f"/api/expenses/{food_ids[1]}/",
+        data=json.dumps({"amount": 5}),
+        content_type="application/json",
+        **auth_headers
+    )
+    client.delete(f"/api/expenses/{imported_expenses[2]}/", **auth_headers)
+
+    response = client.get("/api/expenses/summary/?group_by=month,tag", **auth_headers)
+
+    assert json.loads(response.content) == [
+        {"period": "2025-01", "tag": "food", "total": 5, "count": 1, "min": 5, "max": 5},
+        {"period": "2025-01", "tag": "groceries", "total": 10, "count": 1, "min": 10, "max": 10},
+        {"period": "2025-02", "tag": "food", "total": 25, "count": 1, "min": 25, "max": 25},
+    ]
+    assert await rollups.check_rollups() == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_expenses_with_offsets(client, test_user, auth_headers):
+    """
+    Test that imported dates with a UTC offset are stored and rolled up in UTC.
+    """
+    rows = [{"amount": 10, "tag": "food", "created_at": "2025-02-01T01:00:00+02:00"}]
+    response = client.post(
+        "/api/expenses/bulk/",
+        data=json.dumps(rows),
+        content_type="application/json",
+        **auth_headers
+    )
+
+    assert response.status_code == 200
+    expense = await Expense.find_one()
+    assert expense.created_at == datetime(2025, 1, 31, 23, 0)
+    assert [rollup.month for rollup in await ExpenseRollup.find_all().to_list()] == [
+        "2025-01"
+    ]
+    assert await rollups.check_rollups() == []
+
+
+@pytest.mark.asyncio
+async def test_cached_reads_follow_writes(client, test_user, auth_headers):
+    """
+    Test that repeated reads are served from the cache and writes invalidate it.
+    """
+    response = client.post(
+        "/api/expenses/",
+        data=json.dumps({"amount": 100, "tag": "food"}),
+        content_type="application/json",
+        **auth_headers
+    )
+    expense_id = json.loads(response.content)["id"]
+
+    client.get(f"/api/expenses/{expense_id}/", **auth_headers)
+    client.get("/api/expenses/", **auth_headers)
+    client.get("/api/expenses/", **auth_headers)
+    response = client.get(f"/api/expenses/{expense_id}/", **auth_headers)
+
+    assert json.loads(response.content)["amount"] == 100
+    assert expense_cache.hits == {"expense": 1, "list": 1}
+
+    client.patch(
+        f"/api/expenses/{expense_id}/",
+        data=json.dumps({"amount": 50}),
+        content_type="application/json",
+        **auth_headers
+    )
+
+    response = client.get(f"/api/expenses/{expense_id}/", **auth_headers)
+    assert json.loads(response.content)["amount"] == 50
+    response = client.get("/api/expenses/", **auth_headers)
+    assert [expense["amount"] for expense in json.loads(response.content)] == [50]
+
+    client.delete(f"/api/expenses/{expense_id}/", **auth_headers)
+
+    response = client.get(f"/api/expenses/{expense_id}/", **auth_headers)
+    assert response.status_code == 404
+    response = client.get("/api/expenses/", **auth_headers)
+    assert json.loads(response.content) == []
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_expenses(client, test_user, auth_headers):
+    """
+    Test that an unchanged list is answered with 304 until an expense is written.
+    """
+    response = client.get("/api/expenses/", **auth_headers)
+    etag = response["ETag"]
+
+    response = client.get("/api/expenses/", HTTP_IF_NONE_MATCH=etag, **auth_headers)
+
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+    client.post(
+        "/api/expenses/",
+        data=json.dumps({"amount": 100, "tag": "food"}),
+        content_type="application/json",
+        **auth_headers
+    )
+    response = client.get("/api/expenses/", HTTP_IF_NONE_MATCH=etag, **auth_headers)
+
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    assert len(json.loads(response.content)) == 1
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_expense(client, test_user, auth_headers):
+    """
+    Test the ETag and Last-Modified validators of a single expense.
+    """
+    response = client.post(
+        "/api/expenses/",
+        data=json.dumps({"amount": 100, "tag": "food"}),
+        content_type="application/json",
+        **auth_headers
+    )
+    expense_id = json.loads(response.content)["id"]
+
+    response = client.get(f"/api/expenses/{expense_id}/", **auth_headers)
+    etag, last_modified = response["ETag"], response["Last-Modified"]
+
+    response = client.get(
+        f"/api/expenses/{expense_id}/", HTTP_IF_NONE_MATCH=etag, **auth_headers
+    )
+    assert response.status_code == 304
+    response = client.get(
+        f"/api/expenses/{expense_id}/",
+        HTTP_IF_MODIFIED_SINCE=last_modified,
+        **auth_headers
+    )
+    assert response.status_code == 304
+
+    client.patch(
+        f"/api/expenses/{expense_id}/",
+        data=json.dumps({"amount": 50}),
+        content_type="application/json",
+        **auth_headers
+    )
+    response = client.get(
+        f"/api/expenses/{expense_id}/", HTTP_IF_NONE_MATCH=etag, **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert json.loads(response.content)["amount"] == 50
+
+
+@pytest.mark.asyncio
+async def test_expense_changes(client, test_user, auth_headers, settings):
+    """
+    Test that delta sync returns the upserts and deletions after a checkpoint.
+    """
+    settings.EXPENSES_CHANGES_SETTLE_SECONDS = 0
+    expense_ids = []
+    for amount in (10, 20, 30):
+        response = client.post(
+            "/api/expenses/",
+            data=json.dumps({"amount": amount, "tag": "food"}),
+            content_type="application/json",
+            **auth_headers
+        )
+        expense_ids.append(json.loads(response.content)["id"])
+
+    # Full sync, two changes at a time
+    response = client.get("/api/expenses/changes/?limit=2", **auth_headers)
+    changes = json.loads(response.content)
+    assert len(changes["upserts"]) == 2
+    assert changes["has_more"]
+    response = client.get(
+        f"/api/expenses/changes/?limit=2&since={changes['next']}", **auth_headers
+    )
+    changes = json.loads(response.content)
+    assert len(changes["upserts"]) == 1
+    assert not changes["has_more"]
+    checkpoint = changes["next"]
+
+    response = client.get(f"/api/expenses/changes/?since={checkpoint}", **auth_headers)
+    assert json.loads(response.content)["upserts"] == []
+
+    client.patch(
+        f"/api/expenses/{expense_ids[0]}/",
+        data=json.dumps({"amount": 15}),
+        content_type="application/json",
+        **auth_headers
+    )
+    client.delete(f"/api/expenses/{expense_ids[1]}/", **auth_headers)
+
+    response = client.get(f"/api/expenses/changes/?since={checkpoint}", **auth_headers)
+    changes = json.loads(response.content)
+    assert [expense["amount"] for expense in changes["upserts"]] == [15]
+    assert changes["deletions"] == [expense_ids[1]]
+
+
+@pytest.mark.asyncio
+async def test_expense_changes_over_old_history(
+    client, user_id, auth_headers, settings
+):
+    """
+    Test that a paginated initial sync over expenses older than the tombstone
+    retention runs to the end.
+    """
+    updated_at = datetime.utcnow() - timedelta(
+        days=settings.EXPENSES_TOMBSTONE_RETENTION_DAYS * 2
+    )
+    await Expense.insert_many(
+        [
+            Expense(user_id=user_id, amount=amount, updated_at=updated_at)
+            for amount in range(5)
+        ]
+    )
+
+    upserts = []
+    response = client.get("/api/expenses/changes/?limit=2", **auth_headers)
+    while True:
+        assert response.status_code == 200
+        changes = json.loads(response.content)
+        upserts += changes["upserts"]
+        if not changes["has_more"]:
+            break
+        response = client.get(
+            f"/api/expenses/changes/?limit=2&since={changes['next']}", **auth_headers
+        )
+
+    assert sorted(expense["amount"] for expense in upserts) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_tombstone_retention_change(settings):
+    """
+    Test that a changed retention updates the TTL index in place, without
+    the index conflict that would stop Beanie from starting.
+    """
+    collection = ExpenseTombstone.get_motor_collection()
+    retention = settings.EXPENSES_TOMBSTONE_RETENTION_DAYS
+
+    settings.EXPENSES_TOMBSTONE_RETENTION_DAYS = retention + 1
+    await initialize_beanie()
+    index = (await collection.index_information())[TOMBSTONE_TTL_INDEX]
+    assert index["expireAfterSeconds"] == (retention + 1) * 86400
+
+    settings.EXPENSES_TOMBSTONE_RETENTION_DAYS = retention
+    await apply_tombstone_retention()
+    index = (await collection.index_information())[TOMBSTONE_TTL_INDEX]
+    assert index["expireAfterSeconds"] == retention * 86400
+
+
+@pytest.mark.asyncio
+async def test_expired_checkpoint(client, test_user, auth_headers):
+    """
+    Test that a checkpoint older than the tombstone retention is rejected.
+    """
+    checkpoint = encode_cursor(datetime(2000, 1, 1), uuid.uuid4())
+
+    response = client.get(f"/api/expenses/changes/?since={checkpoint}", **auth_headers)
+
+    assert response.status_code == 410
+
+
+@pytest.mark.asyncio
+async def test_filter_and_sort_expenses(client, imported_expenses, auth_headers):
+    """
+    Test filtering by tag, amount and date, and paging through a sort by amount.
+    """
+    response = client.get(
+        "/api/expenses/?tag=food&min_amount=12&start=2025-01-01&end=2025-02-01",
+        **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert [expense["amount"] for expense in json.loads(response.content)] == [15]
+
+    response = client.get("/api/expenses/?tag=food,travel&sort=created_at", **auth_headers)
+    assert [expense["amount"] for expense in json.loads(response.content)] == [
+        10, 40, 15, 25
+    ]
+
+    # Follow the Link headers through a sort by amount, descending
+    amounts = []
+    url = "/api/expenses/?sort=-amount&limit=3"
+    while url:
+        response = client.get(url, **auth_headers)
+        amounts += [expense["amount"] for expense in json.loads(response.content)]
+        link = response.get("Link")
+        url = link[link.index("/api/"):link.index(">")] if link else None
+    assert amounts == [40, 25, 15, 10]
+
+    response = client.get("/api/expenses/?sort=tag", **auth_headers)
+    assert response.status_code == 400
+    response = client.get("/api/expenses/?min_amount=ten", **auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_cursor_cannot_escape_filters(client, imported_expenses, auth_headers):
+    """
+    Test that a cursor positioned before the filters' bounds, e.g. taken from
+    another query, only returns expenses within those bounds.
+    """
+    for position in (datetime(2024, 12, 1), datetime(2024, 12, 1, tzinfo=timezone.utc)):
+        cursor = encode_cursor(position, uuid.uuid4())
+        response = client.get(
+            f"/api/expenses/?sort=created_at&start=2025-01-10&cursor={cursor}",
+            **auth_headers
+        )
+
+        assert response.status_code == 200
+        amounts = [expense["amount"] for expense in json.loads(response.content)]
+        assert amounts == [15, 25]
+
+    cursor = encode_cursor(0, uuid.uuid4())
+    response = client.get(
+        f"/api/expenses/?sort=amount&min_amount=20&cursor={cursor}", **auth_headers
+    )
+
+    assert response.status_code == 200
+    assert [expense["amount"] for expense in json.loads(response.content)] == [25, 40]
+
+
+@pytest.mark.asyncio
+async def test_unindexed_filters_are_logged_once(
+    client, imported_expenses, auth_headers, caplog
+):
+    """
+    Test that repeated queries filtering outside their index log one warning.
+    """
+    crud.unindexed_filter_log._last_logged.clear()
+
+    for _ in range(3):
+        response = client.get("/api/expenses/?min_amount=12", **auth_headers)
+        assert response.status_code == 200
+
+    warnings = [
+        record
+        for record in caplog.records
+        if getattr(record, "event", None) == "expense_unindexed_filter"
+    ]
+    assert len(warnings) == 1
+    assert "min_amount" in warnings[0].getMessage()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "filters, sort, index",
+    [
+        ({}, "-created_at", "user_id_created_at_id"),
+        ({"start": datetime(2025, 1, 1)}, "created_at", "user_id_created_at_id"),
+        ({"tags": ["food", "travel"]}, "-created_at", "user_id_tag_created_at_id"),
+        ({"tags": ["food"], "min_amount": 12}, "created_at", "user_id_tag_created_at_id"),
+        ({"min_amount": 12, "max_amount": 30}, "-amount", "user_id_amount_id"),
+        ({"description": "Test"}, "amount", "user_id_amount_id"),
+    ],
+)
+async def test_expense_query_plans(
+    client, imported_expenses, user_id, filters, sort, index
+):
+    """
+    Test that every filter and sort combination runs on its planned index,
+    without collection scans or in-memory sorts, including with a cursor.
+    """
+    sort_key = datetime(2025, 1, 20) if "created_at" in sort else 15
+    for cursor in (None, encode_cursor(sort_key, uuid.uuid4())):
+        plan = crud.plan_expenses_query(user_id, filters, sort, cursor)
+
+        summary = await explain_find(
+            Expense.get_motor_collection(),
+            Expense.find(plan["filter"]).get_filter_query(),
+            plan["sort"],
+            limit=10,
+            hint=plan["hint"],
+        )
+
+        assert plan["hint"] == index
+        assert index in summary["indexes"]
+        assert is_index_backed(summary)
+
+
+@pytest.mark.asyncio
+async def test_summary_and_search_plans(client, imported_expenses, user_id):
+    """
+    Test that the summary and text search pipelines read their documents
+    through an index.
+    """
+    pipelines = [
+        (
+            ExpenseRollup,
+            rollups.summary_pipeline(user_id, ["month", "tag"]),
+            "user_id_month_tag",
+        ),
+        (Expense, crud.summary_pipeline(user_id, ["day"]), "user_id_created_at_id"),
+        (
+            Expense,
+            text_search_pipeline(user_id, "food", {"min_amount": 12}, 10),
+            "user_id_description_text",
+        ),
+    ]
+    for model, pipeline, index in pipelines:
+        summary = await explain_aggregate(model.get_motor_collection(), pipeline)
+
+        assert index in summary["indexes"]
+        assert is_index_backed(summary, sorted_by_index=False)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "backend",
+    [
+        "expenses.search.MongoTextSearchBackend",
+        "expenses.search.InvertedIndexSearchBackend",
+    ],
+)
+async def test_search_expenses(client, test_user, auth_headers, settings, backend):
+    """
+    Test searching descriptions with relevance ranking, filters and pages.
+    """
+    settings.EXPENSES_SEARCH_BACKEND = backend
+    rows = [
+        {"amount": 10, "tag": "food", "description": "Coffee at Blue Bottle"},
+        {"amount": 12, "tag": "food", "description": "Blue Bottle coffee beans, blue bag"},
+        {"amount": 40, "tag": "travel", "description": "Train to the coast"},
+        {"amount": 8, "tag": "groceries", "description": "Milk"},
+    ]
+    client.post(
+        "/api/expenses/bulk/",
+        data=json.dumps(rows),
+        content_type="application/json",
+        **auth_headers
+    )
+
+    response = client.get("/api/expenses/search/?q=blue", **auth_headers)
+    results = json.loads(response.content)
+
+    assert response.status_code == 200
+    # Mentioning the word twice ranks higher
+    assert [result["amount"] for result in results] == [12, 10]
+    assert results[0]["score"] > results[1]["score"]
+
+    response = client.get("/api/expenses/search/?q=coffee train&limit=2", **auth_headers)
+    assert len(json.loads(response.content)) == 2
+    link = response["Link"]
+    response = client.get(link[link.index("/api/"):link.index(">")], **auth_headers)
+    assert len(json.loads(response.content)) == 1
+
+    response = client.get(
+        "/api/expenses/search/?q=coffee&min_amount=11&tag=food", **auth_headers
+    )
+    assert [result["amount"] for result in json.loads(response.content)] == [12]
+
+    response = client.get("/api/expenses/search/?q=milk", **auth_headers)
+    assert [result["amount"] for result in json.loads(response.content)] == [8]
+
+    client.post(
+        "/api/expenses/",
+        data=json.dumps({"amount": 3, "tag": "groceries", "description": "Oat milk"}),
+        content_type="application/json",
+        **auth_headers
+    )
+    response = client.get("/api/expenses/search/?q=milk", **auth_headers)
+    assert len(json.loads(response.content)) == 2
+
+    response = client.get("/api/expenses/search/", **auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_expense_stats(client, test_user, user_id, auth_headers):
+    """
+    Test that the expense count and total follow every kind of write.
+    """
+    response = client.get("/api/expenses/stats/", **auth_headers)
+    assert json.loads(response.content) == {
+        "count": 0, "total": 0, "last_activity": None
+    }
+
+    response = client.post(
+        "/api/expenses/",
+        data=json.dumps({"amount": 10, "tag": "food"}),
+        content_type="application/json",
+        **auth_headers
+    )
+    expense_id = json.loads(response.content)["id"]
+    client.post(
+        "/api/expenses/bulk/",
+        data=json.dumps([{"amount": 20}, {"amount": "x"}, {"amount": 30}]),
+        content_type="application/json",
+        **auth_headers
+    )
+    client.patch(
+        f"/api/expenses/{expense_id}/",
+        data=json.dumps({"amount": 15}),
+        content_type="application/json",
+        **auth_headers
+    )
+    response = client.get("/api/expenses/stats/", **auth_headers)
+    stats = json.loads(response.content)
+    assert response.status_code == 200
+    assert stats["count"] == 3
+    assert stats["total"] == 65
+    assert stats["last_activity"] is not None
+
+    client.delete(f"/api/expenses/{expense_id}/", **auth_headers)
+    response = client.get("/api/expenses/stats/", **auth_headers)
+    assert json.loads(response.content)["count"] == 2
+    assert json.loads(response.content)["total"] == 50
+
+    # Rebuilding from the expenses agrees with the maintained counters
+    await UserExpenseState.find_all().delete()
+    assert await state.rebuild_counters(user_id) == 1
+    stats = await state.get_stats(user_id)
+    assert (stats["count"], stats["total"]) == (2, 50)
+
+    response = client.get("/api/expenses/stats/")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_list_expenses_after_counter_rebuild(client, user_id, auth_headers):
+    """
+    Test that users whose counters were rebuilt, without any write through
+    the API, can still list and read their expenses.
+    """
+    expense = Expense(user_id=user_id, amount=10, tag="food")
+    await expense.insert()
+    assert await state.rebuild_counters(user_id) == 1
+    assert await state.get_version(user_id) == (0, None)
+
+    response = client.get("/api/expenses/", **auth_headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in json.loads(response.content)] == [str(expense.id)]
+
+    response = client.get(f"/api/expenses/{expense.id}/", **auth_headers)
+    assert response.status_code == 200
@@ -1,16 +1,25 @@
+import asyncio
 import json
 import uuid
+from datetime import datetime, timedelta
 import pytest
 from django.test import Client
-from users.models import UserProfile
+from expenses import crud as expenses_crud
+from expenses import state as expenses_state
+from expenses.models import Expense, ExpenseRollup, ExpenseTombstone, UserExpenseState
+from users import crud
+from users.models import UserDeletionJob, UserProfile
 
 
 @pytest.fixture(scope="function", autouse=True)
 async def clean_users_collection():
     """
-    Clear the users collection before each test.
+    Clear the users collection, and the expenses left by other test modules,
+    before each test.
     """
     await UserProfile.find_all().delete()
+    for model in (Expense, ExpenseRollup, ExpenseTombstone, UserExpenseState):
+        await model.find_all().delete()
 
 
 @pytest.mark.asyncio
@@ -57,10 +66,46 @@ async def test_create_existing_user(client):
         content_type="application/json"
     )
     
-    assert response.status_code == 400
+    assert response.status_code == 409
     assert "user already exists" in str(response.content)
 
 
+@pytest.mark.asyncio
+async def test_create_user_concurrently():
+    """
+    Test that concurrent creates of the same user make exactly one user.
+    """
+    user_id = uuid.uuid4()
+
+    results = await asyncio.gather(
+        *[crud.create_user(user_id) for _ in range(200)], return_exceptions=True
+    )
+
+    created = [result for result in results if isinstance(result, UserProfile)]
+    conflicts = [
+        result for result in results
+        if isinstance(result, crud.UserAlreadyExistsError)
+    ]
+    assert len(created) == 1
+    assert len(conflicts) == 199
+    assert await UserProfile.find_all().count() == 1
+
+
+@pytest.mark.asyncio
+async def test_create_user_invalid_id(client):
+    """
+    Test creating a user with an ID that is not a UUID.
+    """
+    response = client.post(
+        "/api/users/",
+        data=json.dumps({"id": "not-a-uuid"}),
+        content_type="application/json"
+    )
+
+    assert response.status_code == 400
+    assert "invalid UUID format" in str(response.content)
+
+
 @pytest.mark.asyncio
 async def test_delete_user(client):
     """
@@ -78,9 +123,94 @@ async def test_delete_user(client):
     assert response.status_code == 200
     response_data = json.loads(response.content)
     assert response_data["message"] == "user deleted"
+    assert response_data["status_url"] == f"/api/users/deletions/{response_data['job_id']}/"
     assert await UserProfile.find_all().count() == 0
 
 
+@pytest.mark.asyncio
+async def test_delete_user_purges_expenses(
+    client, test_user, user_id, auth_headers, settings
+):
+    """
+    Test that deleting a user purges their expenses and derived data in
+    batches, and that the deletion status reports it.
+    """
+    settings.USER_DELETION_BATCH_SIZE = 2
+    settings.USER_DELETION_PAUSE_SECONDS = 0
+    expense_ids = []
+    for amount in [10, 20, 30, 40, 50]:
+        response = client.post(
+            "/api/expenses/",
+            data=json.dumps({"amount": amount, "tag": "food"}),
+            content_type="application/json",
+            **auth_headers
+        )
+        expense_ids.append(json.loads(response.content)["id"])
+    # Leave a tombstone too
+    client.delete(f"/api/expenses/{expense_ids[0]}/", **auth_headers)
+    assert await expenses_crud.count_user_data(user_id) == {
+        "expenses": 4,
+        "expense_rollups": 1,
+        "expense_tombstones": 1,
+    }
+    assert (await expenses_state.get_stats(user_id))["count"] == 4
+    version, _ = await expenses_state.get_version(user_id)
+
+    response = client.delete(f"/api/users/?id={user_id}")
+    assert response.status_code == 200
+    job_id = json.loads(response.content)["job_id"]
+
+    # Run the job to completion, whether or not its task already did
+    job = await crud.run_user_deletion(await crud.get_deletion_job(job_id))
+
+    assert job.status == "done"
+    assert job.orphans == 0
+    assert await expenses_crud.count_user_data(user_id) == {
+        "expenses": 0,
+        "expense_rollups": 0,
+        "expense_tombstones": 0,
+    }
+    # Only the version is kept, and keeps growing, so a recreated user gets
+    # new ETags
+    stats = await expenses_state.get_stats(user_id)
+    assert (stats["count"], stats["total"]) == (0, 0)
+    assert (await expenses_state.get_version(user_id))[0] > version
+    assert await crud.find_orphaned_user_ids() == []
+
+    response = client.get(f"/api/users/deletions/{job_id}/")
+    assert response.status_code == 200
+    response_data = json.loads(response.content)
+    assert response_data["status"] == "done"
+    assert response_data["expenses_deleted"] == 4
+    assert response_data["user_id"] == str(user_id)
+
+    response = client.get(f"/api/users/deletions/{uuid.uuid4()}/")
+    assert response.status_code == 404
+    await UserDeletionJob.find_all().delete()
+
+
+@pytest.mark.asyncio
+async def test_stale_deletion_job(client, settings):
+    """
+    Test that the deletion status flags unfinished jobs without recent
+    progress, e.g. cut short with the request that started them.
+    """
+    settings.USER_DELETION_STALE_SECONDS = 60
+    stalled = UserDeletionJob(
+        user_id=uuid.uuid4(),
+        status="running",
+        updated_at=datetime.utcnow() - timedelta(minutes=5),
+    )
+    running = UserDeletionJob(user_id=uuid.uuid4(), status="running")
+    await UserDeletionJob.insert_many([stalled, running])
+
+    response = client.get(f"/api/users/deletions/{stalled.id}/")
+    assert json.loads(response.content)["stale"] is True
+    response = client.get(f"/api/users/deletions/{running.id}/")
+    assert json.loads(response.content)["stale"] is False
+    await UserDeletionJob.find_all().delete()
+
+
 @pytest.mark.asyncio
 async def test_delete_nonexistent_user(client):
     """
@@ -0,0 +1,61 @@
+"""
+Measure the cost of authenticating a request with get_user_id_from_request,
+with every request decoding its token versus reused tokens served from the
+verified token cache.
+
+No database is needed:
+    python -m tests.benchmarks.bench_auth --requests 100000
+"""
+import argparse
+import time
+import uuid
+
+from tests.benchmarks.utils import print_table, setup_django
+
+
+def run(request_count, token_count):
+    from django.test import RequestFactory
+    from tests.utils import generate_test_access_token
+    from users.auth import get_user_id_from_request, token_cache
+
+    factory = RequestFactory()
+    requests = [
+        factory.get(
+            "/",
+            HTTP_AUTHORIZATION=f"Bearer {generate_test_access_token(uuid.uuid4())}",
+        )
+        for _ in range(token_count)
+    ]
+
+    def authenticate_all(clear_cache):
+        start = time.perf_counter()
+        for index in range(request_count):
+            if clear_cache:
+                token_cache.clear()
+            get_user_id_from_request(requests[index % token_count])
+        return time.perf_counter() - start
+
+    uncached = authenticate_all(clear_cache=True)
+    token_cache.clear()
+    cached = authenticate_all(clear_cache=False)
+
+    rows = [
+        ["decode every request", f"{uncached / request_count * 1e6:.2f}"],
+        ["verified token cache", f"{cached / request_count * 1e6:.2f}"],
+    ]
+    print_table(["auth", "us/request"], rows)
+    print(f"cache: {token_cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    run(args.requests, args.tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure expense ingestion throughput in rows per second: one create_expense
+call per row versus bulk_create_expenses with different chunk sizes.
+
+Requires a running MongoDB (see config.settings):
+    python -m tests.benchmarks.bench_bulk_insert --rows 10000
+"""
+import argparse
+import asyncio
+import random
+import uuid
+
+from tests.benchmarks.utils import measure, print_table, setup_django
+
+
+async def run(row_count, chunk_sizes, repeat):
+    from config.db import close_motor_client, initialize_beanie
+    from expenses import crud
+    from expenses.models import Expense, ExpenseTag
+
+    await initialize_beanie()
+    rows = [
+        {
+            "amount": round(random.uniform(1, 500), 2),
+            "tag": random.choice(ExpenseTag.CHOICES),
+            "description": f"Imported transaction {index}",
+        }
+        for index in range(row_count)
+    ]
+    user_id = uuid.uuid4()
+
+    async def one_by_one():
+        for row in rows:
+            await crud.create_expense(user_id=user_id, **row)
+
+    def bulk(chunk_size):
+        async def insert():
+            await crud.bulk_create_expenses(user_id, rows, chunk_size)
+
+        return insert
+
+    results = []
+    try:
+        benchmarks = [("create_expense per row", one_by_one)] + [
+            (f"bulk, chunks of {chunk_size}", bulk(chunk_size))
+            for chunk_size in chunk_sizes
+        ]
+        for name, fn in benchmarks:
+            seconds = await measure(fn, repeat)
+            results.append(
+                [name, f"{seconds * 1000:.0f}", f"{row_count / seconds:,.0f}"]
+            )
+            await Expense.find({"user_id": user_id}).delete()
+    finally:
+        await Expense.find({"user_id": user_id}).delete()
+        close_motor_client()
+
+    print_table(["ingestion", "best ms", "rows/sec"], results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument(
+        "--chunk-sizes", type=int, nargs="+", default=[100, 1000, 5000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(run(args.rows, args.chunk_sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare the Pydantic model read path with the raw document read path of
+expenses/crud.py, in documents per second.
+
+Requires a running MongoDB (see config.settings):
+    python -m tests.benchmarks.bench_expense_reads --sizes 10000 100000
+"""
+import argparse
+import asyncio
+import uuid
+
+from tests.benchmarks.utils import measure, print_table, seed_expenses, setup_django
+
+
+async def run(sizes, page_size, repeat):
+    from config.db import close_motor_client, initialize_beanie
+    from expenses import crud
+    from expenses.models import Expense
+
+    await initialize_beanie()
+    rows = []
+    try:
+        for size in sizes:
+            user_id = uuid.uuid4()
+            await seed_expenses(user_id, size)
+
+            # The query the list endpoint runs, read through Expense models
+            plan = crud.plan_expenses_query(user_id)
+
+            async def model_full():
+                query = Expense.find(plan["filter"]).sort(plan["sort"])
+                expenses = await query.to_list()
+                return crud.serialize_expenses(expenses)
+
+            async def raw_full():
+                return [data async for data in crud.iter_expenses_data(user_id, 1000)]
+
+            async def model_page():
+                query = Expense.find(plan["filter"]).sort(plan["sort"])
+                expenses = await query.limit(page_size).to_list()
+                return crud.serialize_expenses(expenses)
+
+            async def raw_page():
+                return await crud.get_expenses_page_data(user_id, page_size)
+
+            for name, fn, count in [
+                ("full history (model)", model_full, size),
+                ("full history (raw)", raw_full, size),
+                (f"page of {page_size} (model)", model_page, page_size),
+                (f"page of {page_size} (raw)", raw_page, page_size),
+            ]:
+                seconds = await measure(fn, repeat)
+                rows.append(
+                    [size, name, f"{seconds * 1000:.1f}", f"{count / seconds:,.0f}"]
+                )
+
+            await Expense.find({"user_id": user_id}).delete()
+    finally:
+        close_motor_client()
+
+    print_table(["history", "read", "best ms", "docs/sec"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(run(args.sizes, args.page_size, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
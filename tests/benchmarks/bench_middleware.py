@@ -0,0 +1,70 @@
+"""
+Measure the per-request overhead of the "full" and "lean" middleware
+profiles (see MIDDLEWARE_PROFILE in config.settings), and of the request
+timings (see REQUEST_TIMING) on top of "lean", by sending requests to
+an authenticated API endpoint through Django's ASGI handler in-process.
+
+No database is needed:
+    python -m tests.benchmarks.bench_middleware --requests 5000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from tests.benchmarks.utils import asgi_request, print_table, setup_django
+
+PATH = "/api/users/test-auth/"
+
+
+async def run(request_count):
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test import override_settings
+    from tests.utils import generate_test_access_token
+
+    headers = {"Authorization": f"Bearer {generate_test_access_token(uuid.uuid4())}"}
+    profiles = {
+        "full": settings.SITE_MIDDLEWARE,
+        "lean": ["config.middleware.SitePathMiddleware"],
+        "lean + timing": [
+            "config.middleware.ServerTimingMiddleware",
+            "config.middleware.SitePathMiddleware",
+        ],
+    }
+
+    rows = []
+    for profile, middleware in profiles.items():
+        with override_settings(MIDDLEWARE=middleware):
+            app = ASGIHandler()
+            # Warm up
+            response = await asgi_request(app, "GET", PATH, headers)
+            assert response["status"] == 200, response
+
+            start = time.perf_counter()
+            for _ in range(request_count):
+                await asgi_request(app, "GET", PATH, headers)
+            elapsed = time.perf_counter() - start
+        rows.append(
+            [
+                profile,
+                len(middleware),
+                f"{elapsed / request_count * 1e6:.0f}",
+                f"{request_count / elapsed:,.0f}",
+            ]
+        )
+
+    print_table(["profile", "middleware", "us/request", "requests/sec"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
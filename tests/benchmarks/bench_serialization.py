@@ -0,0 +1,116 @@
+"""
+Measure the time to turn raw expense documents into a JSON list response:
+the previous path (UUIDs and datetimes stringified in Python, then
+django.http.JsonResponse) versus FastJsonResponse with the stdlib fallback
+encoder and with orjson, when it is installed.
+
+No database is needed:
+    python -m tests.benchmarks.bench_serialization --rows 1000 10000
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson import Binary
+
+from tests.benchmarks.utils import print_table, setup_django
+
+
+def make_documents(count):
+    """Build raw expense documents as Motor returns them"""
+    now = datetime.utcnow().replace(microsecond=0)
+    return [
+        {
+            "_id": Binary.from_uuid(uuid.uuid4()),
+            "amount": round(random.uniform(1, 500), 2),
+            "created_at": now - timedelta(minutes=index),
+            "updated_at": now - timedelta(minutes=index),
+            "tag": "food",
+            "description": f"Benchmark expense {index}",
+        }
+        for index in range(count)
+    ]
+
+
+def stringified_data(document):
+    """Response shape with UUIDs and datetimes stringified in Python"""
+    return {
+        "id": str(document["_id"].as_uuid()),
+        "amount": document["amount"],
+        "created_at": document["created_at"].isoformat(),
+        "updated_at": document["updated_at"].isoformat(),
+        "tag": document["tag"],
+        "description": document.get("description"),
+    }
+
+
+def best_time(fn, repeat):
+    """Call fn repeat times and return the best wall time in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes, repeat):
+    from django.http import JsonResponse
+
+    from config import responses
+    from expenses.crud import document_to_data
+
+    encoders = [("stdlib", responses.stdlib_dumps)]
+    if responses.orjson is not None:
+        encoders.append(("orjson", responses.orjson_dumps))
+    else:
+        print("orjson is not installed, only the stdlib encoder is measured")
+
+    rows = []
+    for size in sizes:
+        documents = make_documents(size)
+
+        def json_response():
+            data = [stringified_data(document) for document in documents]
+            return JsonResponse(data, safe=False).content
+
+        paths = [("str() + JsonResponse", json_response)]
+        for name, dumps in encoders:
+
+            def fast_response(dumps=dumps):
+                data = [document_to_data(document) for document in documents]
+                return dumps(data)
+
+            paths.append((f"native + {name}", fast_response))
+
+        baseline = None
+        for name, fn in paths:
+            seconds = best_time(fn, repeat)
+            baseline = baseline or seconds
+            rows.append(
+                [
+                    size,
+                    name,
+                    f"{seconds * 1000:.2f}",
+                    f"{size / seconds:,.0f}",
+                    f"{baseline / seconds:.1f}x",
+                ]
+            )
+
+    print_table(["rows", "encoding", "best ms", "rows/sec", "speedup"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    run(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Regression suite of the CRUD hot paths: expense and user CRUD functions,
+serialize_expenses, get_user_id_from_request and the API views through the
+ASGI handler, in-process and without think time. Reads run against one
+seeded history per dataset size.
+
+Runs against MongoDB (see config.settings), or with --backend memory against
+mongomock-motor, an in-memory stand-in that needs no server but only tracks
+the Python side of the paths:
+    python -m tests.benchmarks.bench_suite --sizes 1000 100000
+
+Save the results as a baseline, then compare a later run against it, with
+the same --sizes; the comparison exits with an error if any case got slower
+than the threshold, or failed or did not run:
+    python -m tests.benchmarks.bench_suite --save baseline.json
+    python -m tests.benchmarks.bench_suite --compare baseline.json --threshold 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from tests.benchmarks.utils import (
+    asgi_request,
+    print_table,
+    seed_expenses,
+    setup_django,
+)
+
+PAGE_SIZE = 100
+
+
+async def time_case(
+    fn: Callable[[], Awaitable], number: int, repeat: int
+) -> Dict[str, float]:
+    """
+    Await fn number times per round, for repeat rounds after a warm-up call.
+    Returns the best and median time per call in microseconds.
+    """
+    await fn()
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        rounds.append((time.perf_counter() - start) / number * 1e6)
+    return {"best_us": min(rounds), "median_us": statistics.median(rounds)}
+
+
+def use_memory_backend():
+    """Point config.db at an in-memory mongomock-motor client"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("--backend memory needs mongomock-motor: pip install mongomock-motor")
+    from config import db
+
+    db.motor_client = AsyncMongoMockClient()
+    db.motor_client_pid = os.getpid()
+
+
+async def history_cases(size: int) -> Tuple[List[Tuple[str, Callable]], Callable]:
+    """
+    Seed a user with size expenses and build the read cases over that
+    history. Returns the cases and a coroutine function deleting the data.
+    """
+    from django.core.handlers.asgi import ASGIHandler
+    from expenses import crud
+    from expenses.models import Expense
+    from tests.utils import generate_test_access_token
+
+    user_id = uuid.uuid4()
+    await seed_expenses(user_id, size)
+    expense_id = (await Expense.find_one({"user_id": user_id})).id
+    headers = {"Authorization": f"Bearer {generate_test_access_token(user_id)}"}
+    app = ASGIHandler()
+
+    async def first_page():
+        await crud.get_expenses_page_data(user_id, PAGE_SIZE)
+
+    async def tag_page():
+        await crud.get_expenses_page_data(
+            user_id, PAGE_SIZE, filters={"tags": ["food"]}
+        )
+
+    async def amount_page():
+        await crud.get_expenses_page_data(user_id, PAGE_SIZE, sort="-amount")
+
+    async def one_expense():
+        await crud.get_expense_data(expense_id, user_id)
+
+    async def summary():
+        await crud.summarize_expenses(user_id, ["tag"])
+
+    async def list_view():
+        response = await asgi_request(
+            app, "GET", "/api/expenses/", headers, f"limit={PAGE_SIZE}"
+        )
+        assert response["status"] == 200, response
+
+    async def detail_view():
+        response = await asgi_request(
+            app, "GET", f"/api/expenses/{expense_id}/", headers
+        )
+        assert response["status"] == 200, response
+
+    async def cleanup():
+        await Expense.find({"user_id": user_id}).delete()
+
+    cases = [
+        ("crud.get_expenses_page_data", first_page),
+        ("crud.get_expenses_page_data tag", tag_page),
+        ("crud.get_expenses_page_data -amount", amount_page),
+        ("crud.get_expense_data", one_expense),
+        ("crud.summarize_expenses tag", summary),
+        ("GET /api/expenses/", list_view),
+        ("GET /api/expenses/{id}/", detail_view),
+    ]
+    return cases, cleanup
+
+
+def standalone_cases() -> Tuple[List[Tuple[str, Callable]], Callable, Callable]:
+    """
+    Build the write, user, serialization and authentication cases.
+    Returns the cases and coroutine functions creating and deleting their data.
+    """
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test import RequestFactory
+    from expenses import crud
+    from expenses.models import Expense, ExpenseTag
+    from tests.utils import generate_test_access_token
+    from users import crud as users_crud
+    from users.auth import get_user_id_from_request, token_cache
+    from users.models import UserProfile
+
+    user_id = uuid.uuid4()
+    user_ids = []
+    headers = {"Authorization": f"Bearer {generate_test_access_token(user_id)}"}
+    request = RequestFactory().get("/", HTTP_AUTHORIZATION=headers["Authorization"])
+    app = ASGIHandler()
+    models = [
+        Expense(
+            user_id=user_id,
+            amount=round(random.uniform(1, 500), 2),
+            tag=random.choice(ExpenseTag.CHOICES),
+            description=f"Benchmark expense {index}",
+        )
+        for index in range(PAGE_SIZE)
+    ]
+    rows = [{"amount": model.amount, "tag": model.tag} for model in models]
+
+    async def create_expense():
+        await crud.create_expense(user_id, 12.5, "food", "Lunch")
+
+    async def update_expense():
+        await crud.update_expense(models[0].id, user_id, {"amount": 20})
+
+    async def bulk_create():
+        await crud.bulk_create_expenses(user_id, rows, PAGE_SIZE)
+
+    async def create_user():
+        user_ids.append(uuid.uuid4())
+        await users_crud.create_user(user_ids[-1])
+
+    async def get_user():
+        await users_crud.get_user_by_id(user_ids[0])
+
+    async def serialize():
+        crud.serialize_expenses(models)
+
+    async def authenticate_cold():
+        token_cache.clear()
+        get_user_id_from_request(request)
+
+    async def authenticate_cached():
+        get_user_id_from_request(request)
+
+    async def create_view():
+        response = await asgi_request(
+            app,
+            "POST",
+            "/api/expenses/",
+            {**headers, "Content-Type": "application/json"},
+            body=b'{"amount": 12.5, "tag": "food"}',
+        )
+        assert response["status"] == 201, response
+
+    async def cleanup():
+        await Expense.find({"user_id": user_id}).delete()
+        await UserProfile.find({"_id": {"$in": user_ids}}).delete()
+
+    cases = [
+        ("crud.create_expense", create_expense),
+        ("crud.update_expense", update_expense),
+        (f"crud.bulk_create_expenses {PAGE_SIZE} rows", bulk_create),
+        ("users.crud.create_user", create_user),
+        ("users.crud.get_user_by_id", get_user),
+        (f"crud.serialize_expenses {PAGE_SIZE} models", serialize),
+        ("get_user_id_from_request decode", authenticate_cold),
+        ("get_user_id_from_request cached", authenticate_cached),
+        ("POST /api/expenses/", create_view),
+    ]
+
+    async def setup():
+        await Expense.insert_many(models[:1])
+        await create_user()
+
+    return cases, setup, cleanup
+
+
+def selected(case: str, only) -> bool:
+    """Whether --only selects a case"""
+    return not only or any(part in case for part in only)
+
+
+async def run(sizes, number, repeat, backend, only):
+    from config.db import close_motor_client, initialize_beanie
+
+    if backend == "memory":
+        use_memory_backend()
+    await initialize_beanie()
+
+    results: Dict[str, Dict[str, float]] = {}
+
+    async def run_cases(cases, suffix=""):
+        for name, fn in cases:
+            case = f"{name}{suffix}"
+            if not selected(case, only):
+                continue
+            try:
+                results[case] = await time_case(fn, number, repeat)
+            except Exception as e:
+                # Left out of the results, so a comparison reports it missing
+                print(f"{case}: failed ({type(e).__name__}: {e})", file=sys.stderr)
+
+    try:
+        cases, setup, cleanup = standalone_cases()
+        await setup()
+        try:
+            await run_cases(cases)
+        finally:
+            await cleanup()
+
+        for size in sizes:
+            cases, cleanup = await history_cases(size)
+            try:
+                await run_cases(cases, f" [{size:,} expenses]")
+            finally:
+                await cleanup()
+    finally:
+        close_motor_client()
+    return results
+
+
+def compare(results, baseline, threshold, only=None):
+    """
+    Compare best times with a baseline.
+    Returns the table rows and the regressions: the cases slower than the
+    threshold allows, and the baseline cases selected by only that failed or
+    did not run.
+    """
+    rows, regressions = [], []
+    for case, timing in results.items():
+        before = baseline.get(case)
+        if before is None:
+            rows.append([case, f"{timing['best_us']:,.1f}", "-", "new"])
+            continue
+        change = timing["best_us"] / before["best_us"] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(case)
+        rows.append(
+            [
+                case,
+                f"{timing['best_us']:,.1f}",
+                f"{before['best_us']:,.1f}",
+                f"{change:+.1%}" + (" REGRESSION" if regressed else ""),
+            ]
+        )
+    for case, before in baseline.items():
+        if case not in results and selected(case, only):
+            regressions.append(case)
+            rows.append([case, "-", f"{before['best_us']:,.1f}", "MISSING"])
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--number", type=int, default=50, help="Calls per round")
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per case")
+    parser.add_argument("--backend", choices=["mongo", "memory"], default="mongo")
+    parser.add_argument(
+        "--only", nargs="+", help="Only run the cases containing one of these"
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with results saved by --save")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Slowdown of the best time counted as a regression (0.15 = 15%%)",
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    results = asyncio.run(
+        run(args.sizes, args.number, args.repeat, args.backend, args.only)
+    )
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(
+                {
+                    "backend": args.backend,
+                    "python": platform.python_version(),
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+
+    if not args.compare:
+        print_table(
+            ["case", "best us", "median us"],
+            [
+                [case, f"{timing['best_us']:,.1f}", f"{timing['median_us']:,.1f}"]
+                for case, timing in results.items()
+            ],
+        )
+        return
+
+    with open(args.compare) as file:
+        baseline = json.load(file)
+    if baseline.get("backend") != args.backend:
+        sys.exit(f"the baseline was measured with --backend {baseline.get('backend')}")
+    rows, regressions = compare(
+        results, baseline["results"], args.threshold, args.only
+    )
+    print_table(["case", "best us", "baseline us", "change"], rows)
+    if regressions:
+        sys.exit(
+            f"{len(regressions)} cases regressed by more than {args.threshold:.0%} "
+            "or are missing"
+        )
+
+
+if __name__ == "__main__":
+    main()
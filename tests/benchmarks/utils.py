@@ -0,0 +1,110 @@
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+import django
+
+
+def setup_django():
+    """Configure Django so the project modules can be imported"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+
+async def measure(fn: Callable[[], Awaitable], repeat: int = 5) -> float:
+    """
+    Await fn repeat times and return the best wall time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def seed_expenses(user_id: UUID, count: int, chunk_size: int = 5000) -> None:
+    """
+    Insert count random expenses for a user.
+    """
+    from expenses.models import Expense, ExpenseTag
+
+    for start in range(0, count, chunk_size):
+        expenses = [
+            Expense(
+                user_id=user_id,
+                amount=round(random.uniform(1, 500), 2),
+                tag=random.choice(ExpenseTag.CHOICES),
+                description=f"Benchmark expense {start + offset}",
+            )
+            for offset in range(min(chunk_size, count - start))
+        ]
+        await Expense.insert_many(expenses)
+
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    headers: Optional[Dict[str, str]] = None,
+    query_string: str = "",
+    body: bytes = b"",
+) -> Dict:
+    """
+    Send one HTTP request to an ASGI application in-process.
+    Returns {"status", "headers", "body"} of the response.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [
+            (name.lower().encode(), value.encode())
+            for name, value in (headers or {}).items()
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client stays connected until the response is complete
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    response = {"status": None, "headers": [], "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+            if not message.get("more_body"):
+                disconnected.set()
+
+    await app(scope, receive, send)
+    return response
+
+
+def print_table(headers: List[str], rows: List[List]) -> None:
+    """Print rows as an aligned text table"""
+    widths = [
+        max(len(str(cell)) for cell in column) for column in zip(headers, *rows)
+    ]
+    for row in [headers, *rows]:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import os
+
+from django.test import Client
+
+from config import db
+
+
+def test_beanie_is_initialized_again_after_a_fork(monkeypatch):
+    """
+    Test that Beanie is initialized once per process, and again in a process
+    forked after the initialization.
+    """
+    calls = []
+
+    async def initialize_beanie():
+        calls.append(os.getpid())
+        db.beanie_pid = os.getpid()
+
+    monkeypatch.setattr(db, "initialize_beanie", initialize_beanie)
+    # Initialized in the parent process before the fork
+    monkeypatch.setattr(db, "beanie_pid", os.getpid() + 1)
+
+    asyncio.run(db.ensure_beanie())
+    asyncio.run(db.ensure_beanie())
+
+    assert calls == [os.getpid()]
+
+
+def test_database_pool_stats():
+    """
+    Test that the connection pool stats of the process's client are served
+    to internal clients only.
+    """
+    client = Client()
+    # Creating the client connects lazily, so no server is needed
+    db.get_motor_client()
+    try:
+        response = client.get("/api/stats/db/", REMOTE_ADDR="127.0.0.1")
+
+        assert response.status_code == 200
+        response_data = json.loads(response.content)
+        assert response_data["pid"] == os.getpid()
+        assert response_data["max_pool_size"] > 0
+        assert "connections_in_use" in response_data
+
+        response = client.get("/api/stats/db/", REMOTE_ADDR="203.0.113.7")
+
+        assert response.status_code == 404
+    finally:
+        db.close_motor_client()
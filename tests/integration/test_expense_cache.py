@@ -0,0 +1,120 @@
+import asyncio
+import uuid
+
+import pytest
+
+from expenses.cache import CacheBackend, ExpenseCache, LocalCacheBackend
+
+
+def load(value, calls):
+    """Build a loader returning value and counting its calls"""
+
+    async def loader():
+        calls.append(value)
+        return value
+
+    return loader
+
+
+def test_expense_is_loaded_once_per_version():
+    """
+    Test that an expense is read through once, then served until the
+    user's version changes.
+    """
+    cache = ExpenseCache(LocalCacheBackend(max_size=10), ttl=60)
+    user_id, expense_id = uuid.uuid4(), uuid.uuid4()
+    calls = []
+
+    async def scenario():
+        await cache.get_expense(user_id, expense_id, 1, load({"amount": 1}, calls))
+        await cache.get_expense(user_id, expense_id, 1, load({"amount": 1}, calls))
+        return await cache.get_expense(
+            user_id, expense_id, 2, load({"amount": 2}, calls)
+        )
+
+    assert asyncio.run(scenario()) == {"amount": 2}
+    assert len(calls) == 2
+    assert cache.stats()["expense"] == {"hits": 1, "misses": 2, "hit_rate": 0.3333}
+
+
+def test_pages_are_cached_per_user_version():
+    """
+    Test that a new version retires the cached pages of its user only.
+    """
+    cache = ExpenseCache(LocalCacheBackend(max_size=10), ttl=60)
+    writer, reader = uuid.uuid4(), uuid.uuid4()
+    calls = []
+
+    async def scenario():
+        for user_id in (writer, reader):
+            await cache.get_page(user_id, 1, "10", load(([], None), calls))
+        await cache.get_page(writer, 2, "10", load(([], None), calls))
+        await cache.get_page(reader, 1, "10", load(([], None), calls))
+
+    asyncio.run(scenario())
+    assert len(calls) == 3
+    assert cache.hits["list"] == 1
+
+
+def test_workers_never_serve_pages_older_than_the_version():
+    """
+    Test that a worker whose local cache holds a page reloads it once
+    another worker's write bumped the version.
+    """
+    workers = [ExpenseCache(LocalCacheBackend(max_size=10), ttl=60) for _ in range(2)]
+    user_id = uuid.uuid4()
+    calls = []
+
+    async def scenario():
+        await workers[0].get_page(user_id, 1, "10", load((["old"], None), calls))
+        # The write happened in the other worker, which bumped the version
+        return await workers[0].get_page(user_id, 2, "10", load((["new"], None), calls))
+
+    assert asyncio.run(scenario()) == (["new"], None)
+    assert len(calls) == 2
+
+
+def test_missing_expenses_are_not_cached():
+    """
+    Test that a miss returning None is loaded again on the next read.
+    """
+    cache = ExpenseCache(LocalCacheBackend(max_size=10), ttl=60)
+    user_id, expense_id = uuid.uuid4(), uuid.uuid4()
+    calls = []
+
+    async def scenario():
+        for _ in range(2):
+            await cache.get_expense(user_id, expense_id, 1, load(None, calls))
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    """
+    Test that the local backend stays within its size by evicting the oldest entry.
+    """
+    backend = LocalCacheBackend(max_size=2)
+
+    async def scenario():
+        await backend.set("a", 1, 60)
+        await backend.set("b", 2, 60)
+        await backend.get("a")
+        await backend.set("c", 3, 60)
+        return [await backend.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == [1, None, 3]
+    assert len(backend) == 2
+
+
+def test_backends_must_implement_the_whole_interface():
+    """
+    Test that a backend missing part of the interface cannot be created.
+    """
+
+    class GetOnlyBackend(CacheBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyBackend()
@@ -0,0 +1,60 @@
+import io
+import json
+import logging
+
+from config import metrics
+from config.logs import BackgroundStreamHandler, JsonFormatter, RateLimitedLog
+
+
+def test_background_handler_writes_json_lines():
+    """
+    Test that records are written by the background thread as JSON lines.
+    """
+    stream = io.StringIO()
+    handler = BackgroundStreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger("tests.logs.background")
+    logger.addHandler(handler)
+    try:
+        logger.warning("slow %s", "query", extra={"duration_ms": 120})
+    finally:
+        logger.removeHandler(handler)
+        handler.stop()
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "slow query"
+    assert entry["level"] == "WARNING"
+    assert entry["duration_ms"] == 120
+
+
+def test_background_handler_drops_records_when_full():
+    """
+    Test that a full queue drops records instead of blocking the caller.
+    """
+    handler = BackgroundStreamHandler(io.StringIO(), max_queue_size=1)
+    handler.stop()
+    record = logging.makeLogRecord({"msg": "flood"})
+
+    handler.emit(record)
+    handler.emit(record)
+
+    assert handler.dropped == 1
+
+
+def test_rate_limited_log_summarizes_bursts(caplog):
+    """
+    Test that a burst of failures logs one line per reason but counts all.
+    """
+    log = RateLimitedLog(logging.getLogger("tests.logs"), "test_failure", 60)
+    before = metrics.events.value("test_failure", "DecodeError")
+
+    with caplog.at_level(logging.WARNING, logger="tests.logs"):
+        for _ in range(5):
+            log.record("DecodeError")
+        log.record("ExpiredSignatureError")
+
+    assert [record.reason for record in caplog.records] == [
+        "DecodeError",
+        "ExpiredSignatureError",
+    ]
+    assert metrics.events.value("test_failure", "DecodeError") == before + 5
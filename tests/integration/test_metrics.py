@@ -0,0 +1,91 @@
+import asyncio
+import contextvars
+import uuid
+from types import SimpleNamespace
+
+from django.test import Client
+
+from config import metrics
+from tests.utils import generate_test_access_token
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    Test that a histogram renders cumulative bucket counts, sum and count.
+    """
+    histogram = metrics.Histogram("test_seconds", "Test.", ("route",), (0.1, 1))
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe(value, "a")
+
+    lines = histogram.render()
+
+    assert lines[:2] == ["# HELP test_seconds Test.", "# TYPE test_seconds histogram"]
+    assert lines[2:] == [
+        'test_seconds_bucket{route="a",le="0.1"} 2',
+        'test_seconds_bucket{route="a",le="1"} 3',
+        'test_seconds_bucket{route="a",le="+Inf"} 4',
+        'test_seconds_sum{route="a"} 3.65',
+        'test_seconds_count{route="a"} 4',
+    ]
+
+
+def test_phases_and_commands_add_up_per_request():
+    """
+    Test that phases and MongoDB commands are charged to the current request,
+    including commands reported from another thread.
+    """
+    timings = metrics.RequestTimings()
+    listener = metrics.CommandTimingListener()
+    event = SimpleNamespace(command_name="find", duration_micros=2000)
+
+    async def request():
+        token = metrics.current_timings.set(timings)
+        try:
+            with metrics.phase("serialize"):
+                pass
+            # Motor reports commands from its executor, in a copy of the context
+            context = contextvars.copy_context()
+            await asyncio.get_running_loop().run_in_executor(
+                None, context.run, listener.succeeded, event
+            )
+        finally:
+            metrics.current_timings.reset(token)
+
+    asyncio.run(request())
+    # Outside a request, commands only reach the command histogram
+    listener.succeeded(event)
+
+    assert timings.db_commands == 1
+    assert timings.phases["db"] == 0.002
+    assert "serialize" in timings.phases
+    header = timings.server_timing(0.01)
+    assert 'db;dur=2.00;desc="1 commands"' in header
+    assert header.endswith("total;dur=10.00")
+
+
+def test_request_timings_are_served_to_internal_clients():
+    """
+    Test that responses carry their phase timings and that the request
+    histograms are served to internal clients only.
+    """
+    client = Client()
+    token = generate_test_access_token(uuid.uuid4())
+    response = client.get(
+        "/api/users/test-auth/", HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+
+    assert response.status_code == 200
+    assert "auth;dur=" in response["Server-Timing"]
+    assert "total;dur=" in response["Server-Timing"]
+
+    response = client.get("/api/metrics/", REMOTE_ADDR="127.0.0.1")
+
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain")
+    content = response.content.decode()
+    assert 'route="api/users/test-auth/",method="GET",status="200"' in content
+    assert 'http_request_phase_duration_seconds_count{phase="auth"}' in content
+
+    response = client.get("/api/metrics/", REMOTE_ADDR="203.0.113.7")
+
+    assert response.status_code == 404
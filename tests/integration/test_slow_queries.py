@@ -0,0 +1,122 @@
+import logging
+from types import SimpleNamespace
+
+from config.db import SlowQueryListener, command_shape
+from expenses.management.commands.summarize_query_profile import summarize_profile
+
+
+def command_event(command, duration_ms, request_id=1):
+    """Build a command event as pymongo reports it"""
+    return SimpleNamespace(
+        command_name=next(iter(command)),
+        connection_id=("localhost", 27017),
+        request_id=request_id,
+        database_name="expense_tracker_db",
+        command=command,
+        duration_micros=int(duration_ms * 1000),
+    )
+
+
+def test_command_shape_redacts_values():
+    """
+    Test that query shapes keep fields, operators and paths but no values.
+    """
+    shape = command_shape(
+        "find",
+        {
+            "find": "expenses",
+            "filter": {
+                "user_id": "3b9f...",
+                "tag": {"$in": ["food", "travel"]},
+                "$or": [{"amount": {"$lt": 10}}, {"amount": 10, "_id": {"$lt": 1}}],
+            },
+            "sort": {"amount": -1, "_id": -1},
+        },
+    )
+
+    assert shape == {
+        "command": "find",
+        "collection": "expenses",
+        "query": {
+            "user_id": "?",
+            "tag": {"$in": "?"},
+            "$or": [{"amount": {"$lt": "?"}}, {"amount": "?", "_id": {"$lt": "?"}}],
+        },
+        "sort": {"amount": -1, "_id": -1},
+    }
+    pipeline_shape = command_shape(
+        "aggregate",
+        {
+            "aggregate": "expenses",
+            "pipeline": [{"$match": {"user_id": 1}}, {"$group": {"_id": "$tag"}}],
+        },
+    )
+    assert pipeline_shape["query"] == [
+        {"$match": {"user_id": "?"}},
+        {"$group": {"_id": "$tag"}},
+    ]
+
+
+def test_get_more_commands_share_a_shape():
+    """
+    Test that getMore batches are shaped by their collection, not by their
+    cursor ID.
+    """
+    shapes = [
+        command_shape("getMore", {"getMore": cursor_id, "collection": "expenses"})
+        for cursor_id in (8234234234, 8234234235)
+    ]
+
+    assert shapes[0] == shapes[1] == {"command": "getMore", "collection": "expenses"}
+
+
+def test_only_slow_commands_are_logged(caplog):
+    """
+    Test that commands under the threshold are not logged, and that slow
+    ones are logged with their shape only.
+    """
+    listener = SlowQueryListener(threshold_ms=50)
+    command = {"find": "expenses", "filter": {"user_id": "secret"}}
+
+    with caplog.at_level(logging.WARNING, logger="config.db.slow_queries"):
+        fast = command_event(command, 5, request_id=1)
+        listener.started(fast)
+        listener.succeeded(fast)
+        slow = command_event(command, 80, request_id=2)
+        listener.started(slow)
+        listener.succeeded(slow)
+
+    assert len(caplog.records) == 1
+    record = caplog.records[0]
+    assert record.duration_ms == 80
+    assert record.shape["query"] == {"user_id": "?"}
+    assert "secret" not in record.getMessage()
+
+
+def test_profile_is_summarized_by_shape():
+    """
+    Test that profiler entries differing only by values share a shape.
+    """
+    entries = [
+        {
+            "op": "query",
+            "ns": "db.expenses",
+            "command": {"find": "expenses", "filter": {"user_id": user_id}},
+            "millis": millis,
+            "docsExamined": 100,
+            "planSummary": "COLLSCAN",
+        }
+        for user_id, millis in [(1, 30), (2, 50)]
+    ]
+    entries.append(
+        {"op": "remove", "ns": "db.expenses", "command": {"q": {"_id": 1}}, "millis": 90}
+    )
+
+    summaries = summarize_profile(entries)
+
+    assert [(summary["total_ms"], summary["count"]) for summary in summaries] == [
+        (90, 1),
+        (80, 2),
+    ]
+    assert summaries[1]["docs_examined"] == 200
+    assert summaries[1]["plans"] == {"COLLSCAN"}
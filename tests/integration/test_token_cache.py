@@ -0,0 +1,67 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+from django.conf import settings
+from django.test import RequestFactory
+
+from users.auth import TokenCache, get_user_id_from_request, token_cache
+
+
+def make_request(token):
+    """Build a request carrying a bearer token"""
+    return RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+
+def test_reused_token_is_served_from_cache():
+    """
+    Test that a token is decoded once and then resolved from the cache.
+    """
+    token_cache.clear()
+    user_id = uuid.uuid4()
+    payload = {"sub": str(user_id), "exp": datetime.now() + timedelta(days=1)}
+    token = jwt.encode(
+        payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM
+    )
+
+    assert get_user_id_from_request(make_request(token)) == user_id
+    assert get_user_id_from_request(make_request(token)) == user_id
+    assert token_cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_invalid_token_is_not_cached():
+    """
+    Test that tokens failing verification are never cached.
+    """
+    token_cache.clear()
+    token = jwt.encode({"sub": str(uuid.uuid4())}, "wrong secret", algorithm="HS256")
+
+    assert get_user_id_from_request(make_request(token)) is None
+    assert token_cache.stats()["size"] == 0
+
+
+def test_entries_expire_with_the_token():
+    """
+    Test that an entry is dropped once the token's exp has passed.
+    """
+    cache = TokenCache(max_size=10, ttl=300)
+    cache.set("token", uuid.uuid4(), expires_at=time.time() - 1)
+
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    """
+    Test that the cache stays within its size by evicting the oldest entry.
+    """
+    cache = TokenCache(max_size=2, ttl=300)
+    cache.set("a", uuid.uuid4())
+    cache.set("b", uuid.uuid4())
+    cache.get("a")
+    cache.set("c", uuid.uuid4())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
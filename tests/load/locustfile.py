@@ -1,13 +1,45 @@
+"""
+Load test scenarios, selected by user class name (see
+scripts/run_locust_test.sh):
+
+- NormalUser: a fresh user creating, reading and editing a few expenses
+- HeavyHistoryUser: reads and writes on users with 10k-1M expenses, seeded
+  with `python manage.py seed_load_test_users`, the most active users
+  being picked most often (Zipf distribution)
+- BulkImportUser: a fresh user uploading batches of expenses to the bulk
+  endpoint
+
+With LOCUST_ZERO_WAIT=1 every user sends its next request as soon as the
+previous one is answered (closed loop, no think time), so the throughput
+measured is bounded by the server instead of by the wait times.
+"""
+import json
 import logging
+import os
+import random
 import uuid
 
-from locust import HttpUser, between, task
+from locust import HttpUser, between, constant, task
+from locust.exception import StopUser
 
 from tests.utils import generate_test_access_token
 
+ZERO_WAIT = os.environ.get("LOCUST_ZERO_WAIT", "") not in ("", "0")
+# Written by the seed_load_test_users management command
+SEEDED_USERS_FILE = os.environ.get(
+    "SEEDED_USERS_FILE", "locust_results/seeded_users.json"
+)
+BULK_IMPORT_ROWS = int(os.environ.get("BULK_IMPORT_ROWS", 1000))
+PAGE_SIZE = 50
+
+
+def think_time(min_wait, max_wait):
+    """Wait between min_wait and max_wait seconds, or not at all in zero-wait mode"""
+    return constant(0) if ZERO_WAIT else between(min_wait, max_wait)
+
 
 class NormalUser(HttpUser):
-    wait_time = between(1, 3)  # Wait between 1-3 seconds between tasks
+    wait_time = think_time(1, 3)  # Wait between 1-3 seconds between tasks
 
     def on_start(self):
         # Generate a unique user ID for this test user
@@ -120,3 +152,185 @@ class NormalUser(HttpUser):
         # Create a new expense if we're running low
         if not self.expense_ids:
             self._create_initial_expense()
+
+
+class HeavyHistoryUser(HttpUser):
+    """
+    Act, for each task, as one of the seeded users with large histories,
+    picked with Zipf weights (1 / rank ** exponent): the lowest ranks, which
+    also have the largest histories, get most of the requests.
+    """
+
+    wait_time = think_time(1, 3)
+    seeded_users = None
+    weights = None
+
+    @classmethod
+    def load_seeded_users(cls):
+        """Read the seeded users once per process"""
+        if cls.seeded_users is None:
+            with open(SEEDED_USERS_FILE) as file:
+                seeded = json.load(file)
+            cls.seeded_users = [
+                {
+                    "id": user["id"],
+                    "headers": {
+                        "Authorization": (
+                            f"Bearer {generate_test_access_token(user['id'])}"
+                        ),
+                        "Content-Type": "application/json",
+                    },
+                }
+                for user in seeded["users"]
+            ]
+            cls.weights = [
+                1 / user["rank"] ** seeded["zipf_exponent"] for user in seeded["users"]
+            ]
+
+    def on_start(self):
+        try:
+            self.load_seeded_users()
+        except FileNotFoundError:
+            logging.error(
+                f"{SEEDED_USERS_FILE} not found, run "
+                "`python manage.py seed_load_test_users` first"
+            )
+            raise StopUser()
+        # Expense IDs seen in the latest listing of each seeded user
+        self.expense_ids = {}
+
+    def _pick_user(self):
+        return random.choices(self.seeded_users, weights=self.weights)[0]
+
+    def _list(self, user, name, **params):
+        """Get a page of a user's expenses and remember their IDs"""
+        response = self.client.get(
+            "/api/expenses/",
+            params={"limit": PAGE_SIZE, **params},
+            headers=user["headers"],
+            name=name,
+        )
+        if response.status_code == 200:
+            self.expense_ids[user["id"]] = [
+                expense["id"] for expense in response.json()
+            ]
+        return response
+
+    @task(5)
+    def list_recent_expenses(self):
+        self._list(self._pick_user(), "/api/expenses/")
+
+    @task(3)
+    def paginate_expenses(self):
+        """Follow the next page links a few pages deep"""
+        user = self._pick_user()
+        response = self._list(user, "/api/expenses/")
+        for _ in range(random.randint(1, 5)):
+            next_page = response.links.get("next")
+            if response.status_code != 200 or not next_page:
+                break
+            response = self.client.get(
+                next_page["url"],
+                headers=user["headers"],
+                name="/api/expenses/?cursor",
+            )
+
+    @task(2)
+    def filter_by_tag(self):
+        tag = random.choice(["food", "groceries", "transportation", "utilities"])
+        self._list(self._pick_user(), "/api/expenses/?tag", tag=tag)
+
+    @task(1)
+    def sort_by_amount(self):
+        self._list(self._pick_user(), "/api/expenses/?sort=-amount", sort="-amount")
+
+    @task(1)
+    def summarize_expenses(self):
+        self.client.get(
+            "/api/expenses/summary/",
+            params={"group_by": "tag,month"},
+            headers=self._pick_user()["headers"],
+            name="/api/expenses/summary/",
+        )
+
+    @task(1)
+    def get_stats(self):
+        self.client.get(
+            "/api/expenses/stats/",
+            headers=self._pick_user()["headers"],
+            name="/api/expenses/stats/",
+        )
+
+    @task(2)
+    def get_expense(self):
+        user = self._pick_user()
+        expense_ids = self.expense_ids.get(user["id"])
+        if not expense_ids:
+            return
+        self.client.get(
+            f"/api/expenses/{random.choice(expense_ids)}/",
+            headers=user["headers"],
+            name="/api/expenses/{id}/",
+        )
+
+    @task(1)
+    def create_expense(self):
+        self.client.post(
+            "/api/expenses/",
+            json={
+                "amount": round(random.uniform(1, 500), 2),
+                "tag": "food",
+                "description": f"Load test expense {uuid.uuid4()}",
+            },
+            headers=self._pick_user()["headers"],
+        )
+
+
+class BulkImportUser(HttpUser):
+    """
+    Upload BULK_IMPORT_ROWS expenses per request to the bulk endpoint, as a
+    JSON array or as NDJSON. The user and its expenses are deleted on stop.
+    """
+
+    wait_time = think_time(5, 10)
+
+    def on_start(self):
+        self.user_id = str(uuid.uuid4())
+        self.client.post("/api/users/", json={"id": self.user_id})
+        self.headers = {
+            "Authorization": f"Bearer {generate_test_access_token(self.user_id)}"
+        }
+
+    def on_stop(self):
+        self.client.delete(
+            "/api/users/", params={"id": self.user_id}, name="/api/users/"
+        )
+
+    def _rows(self):
+        return [
+            {
+                "amount": round(random.uniform(1, 500), 2),
+                "tag": random.choice(["food", "travel", "health", "other"]),
+                "description": f"Imported expense {index}",
+            }
+            for index in range(BULK_IMPORT_ROWS)
+        ]
+
+    @task(3)
+    def import_json(self):
+        self.client.post(
+            "/api/expenses/bulk/",
+            json=self._rows(),
+            headers=self.headers,
+            name="/api/expenses/bulk/ json",
+        )
+
+    @task(1)
+    def import_ndjson(self):
+        body = "\n".join(json.dumps(row) for row in self._rows())
+        self.client.post(
+            "/api/expenses/bulk/",
+            data=body,
+            headers={**self.headers, "Content-Type": "application/x-ndjson"},
+            name="/api/expenses/bulk/ ndjson",
+        )
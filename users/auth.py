@@ -1,8 +1,80 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
 import jwt
 from django.conf import settings
 from uuid import UUID
 
+from config.logs import RateLimitedLog
+from config.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    Bounded LRU cache mapping verified tokens to their user ID.
+    Entries expire after ttl seconds, and never later than the token itself.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[UUID]:
+        """Get the user ID of a cached token, None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token: str, user_id: UUID, expires_at: Optional[float] = None):
+        """Cache a verified token until min(now + ttl, expires_at)"""
+        if self.max_size <= 0:
+            return
+        valid_until = time.time() + self.ttl
+        if expires_at is not None:
+            valid_until = min(valid_until, expires_at)
+        with self._lock:
+            self._entries[token] = (user_id, valid_until)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
 
+    def stats(self) -> Dict[str, int]:
+        """Get the size and hit/miss counters of the cache"""
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(settings.JWT_CACHE_SIZE, settings.JWT_CACHE_TTL)
+
+# A flood of bad or expired tokens is counted, and summarized in the logs
+auth_failure_log = RateLimitedLog(
+    logger, "auth_failure", settings.LOG_RATE_LIMIT_INTERVAL
+)
+
+
+@timed("auth")
 def get_user_id_from_request(request):
     """
     Extract user ID from request's Authorization header
@@ -17,15 +89,23 @@ def get_user_id_from_request(request):
         prefix, token = auth_header.split(' ', 1)
         if prefix.lower() != 'bearer':
             return None
+
+        # Reuse the result of an earlier verification of the same token
+        user_id = token_cache.get(token)
+        if user_id:
+            return user_id
+
         # Decode the token
         payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET_KEY, 
+            token,
+            settings.JWT_SECRET_KEY,
             algorithms=[settings.JWT_ALGORITHM]
         )
-        
+
         # Extract and return the user ID
-        return UUID(payload['sub'])
-    except (ValueError, jwt.DecodeError, jwt.ExpiredSignatureError) as e:
-        print("Error decoding token: ", type(e))
-        return None 
\ No newline at end of file
+        user_id = UUID(payload['sub'])
+        token_cache.set(token, user_id, payload.get('exp'))
+        return user_id
+    except (ValueError, KeyError, jwt.InvalidTokenError) as e:
+        auth_failure_log.record(type(e).__name__)
+        return None
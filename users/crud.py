@@ -1,6 +1,19 @@
-from typing import Dict, Any, Optional, Union
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set, Union
 from uuid import UUID
-from .models import UserProfile
+from beanie.odm.utils.encoder import Encoder
+from django.conf import settings
+from pymongo.errors import DuplicateKeyError
+from expenses import crud as expenses_crud
+from expenses.models import Expense
+from .models import UserDeletionJob, UserDeletionStatus, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Running deletion jobs, referenced so they are not garbage collected
+_deletion_tasks: Set[asyncio.Task] = set()
 
 
 async def get_user_by_id(user_id: Union[str, UUID]) -> Optional[UserProfile]:
@@ -12,52 +25,205 @@ async def get_user_by_id(user_id: Union[str, UUID]) -> Optional[UserProfile]:
         if isinstance(user_id, str):
             user_id = UUID(user_id)
 
-        # Query using Beanie
-        return await UserProfile.find_one({"id": user_id})
+        # Query using Beanie (the `id` field is stored as `_id`)
+        return await UserProfile.find_one({"_id": user_id})
     except (ValueError, Exception):
         return None
 
 
-async def create_user(user_id: Union[str, UUID]) -> Optional[UserProfile]:
-    """
-    Create a new user with the given ID.
-    """
-    try:
-        # Convert string ID to UUID if needed
-        if isinstance(user_id, str):
-            user_id = UUID(user_id)
+class UserAlreadyExistsError(ValueError):
+    """A user with the requested ID already exists"""
 
-        # Check if user already exists
-        existing_user = await UserProfile.find_one({"id": user_id})
-        if existing_user:
-            return None
 
-        # Create new UserProfile document
-        user = UserProfile(id=user_id)
+async def create_user(user_id: Union[str, UUID]) -> UserProfile:
+    """
+    Create a new user with the given ID in a single insert. The unique `_id`
+    index rejects the losers of concurrent creates of the same ID.
+    Raises UserAlreadyExistsError if the user exists, ValueError if the ID
+    is not a UUID.
+    """
+    # Convert string ID to UUID if needed
+    if not isinstance(user_id, UUID):
+        user_id = UUID(str(user_id))
 
-        # Save to database
-        await user.save()
-        return user
-    except (ValueError, Exception):
-        return None
+    user = UserProfile(id=user_id)
+    try:
+        await user.insert()
+    except DuplicateKeyError as e:
+        raise UserAlreadyExistsError("user already exists") from e
+    return user
 
 
-async def delete_user(user_id: Union[str, UUID]) -> bool:
+async def delete_user(user_id: Union[str, UUID]) -> Optional[UserDeletionJob]:
     """
-    Delete a user. Returns True if successful, False otherwise.
+    Delete a user, and purge their expenses and derived data in the
+    background. Returns the deletion job if the user existed, None otherwise.
     """
     # Get the user
     user = await get_user_by_id(user_id)
     if not user:
-        return False
+        return None
 
-    # Delete from database
+    # Delete from database, then purge what referenced the user
     await user.delete()
-    return True
+    job = UserDeletionJob(user_id=user.id)
+    await job.insert()
+    start_user_deletion(job)
+    return job
+
+
+def start_user_deletion(job: UserDeletionJob) -> asyncio.Task:
+    """
+    Run a deletion job as a task of the running event loop, which outlives
+    the request under an ASGI server only: under WSGI each async view runs
+    in its own event loop, cancelled with the task once the response is
+    returned. Jobs cut short (by WSGI or a restart) stay unfinished and are
+    reported as stale, for purge_deleted_users to rerun.
+    """
+    task = asyncio.create_task(run_user_deletion(job))
+    _deletion_tasks.add(task)
+    task.add_done_callback(_deletion_tasks.discard)
+    return task
+
+
+async def run_user_deletion(job: UserDeletionJob) -> UserDeletionJob:
+    """
+    Purge the expenses, rollups and tombstones of a deleted user,
+    in batches of settings.USER_DELETION_BATCH_SIZE expenses, then check
+    that nothing of the user is left. Safe to rerun on an unfinished job.
+    """
+    collection = UserDeletionJob.get_motor_collection()
+    job_query = Encoder().encode({"_id": job.id})
+    await collection.update_one(
+        job_query,
+        {
+            "$set": {
+                "status": UserDeletionStatus.RUNNING,
+                "updated_at": datetime.utcnow(),
+            }
+        },
+    )
+    try:
+        while True:
+            deleted = await expenses_crud.delete_expenses_batch(
+                job.user_id, settings.USER_DELETION_BATCH_SIZE
+            )
+            if not deleted:
+                break
+            await collection.update_one(
+                job_query,
+                {
+                    "$inc": {"expenses_deleted": deleted},
+                    "$set": {"updated_at": datetime.utcnow()},
+                },
+            )
+            await asyncio.sleep(settings.USER_DELETION_PAUSE_SECONDS)
+        await expenses_crud.delete_user_data(job.user_id)
+
+        counts = await expenses_crud.count_user_data(job.user_id)
+        orphans = sum(counts.values())
+        changes = {
+            "status": UserDeletionStatus.DONE,
+            "orphans": orphans,
+            "finished_at": datetime.utcnow(),
+        }
+        if orphans:
+            # Expenses written while the purge ran, e.g. with a token issued
+            # before the deletion
+            logger.warning("user %s deletion left %s", job.user_id, counts)
+            changes["status"] = UserDeletionStatus.FAILED
+            changes["error"] = f"documents left: {counts}"
+    except Exception as e:
+        logger.exception("user %s deletion failed", job.user_id)
+        changes = {
+            "status": UserDeletionStatus.FAILED,
+            "error": str(e),
+            "finished_at": datetime.utcnow(),
+        }
+    changes["updated_at"] = changes["finished_at"]
+    await collection.update_one(job_query, {"$set": changes})
+    return await UserDeletionJob.get(job.id)
+
+
+async def get_deletion_job(job_id: Union[str, UUID]) -> Optional[UserDeletionJob]:
+    """
+    Get a user deletion job by ID. Returns None if not found or invalid.
+    """
+    try:
+        if isinstance(job_id, str):
+            job_id = UUID(job_id)
+    except ValueError:
+        return None
+    return await UserDeletionJob.get(job_id)
+
+
+async def get_unfinished_deletion_jobs() -> List[UserDeletionJob]:
+    """Get the deletion jobs not run to completion, oldest first"""
+    return (
+        await UserDeletionJob.find({"status": {"$in": UserDeletionStatus.UNFINISHED}})
+        .sort("created_at")
+        .to_list()
+    )
+
+
+async def find_orphaned_user_ids(batch_size: int = 1000) -> List[UUID]:
+    """
+    Get the IDs of users without a profile that still own expenses, e.g.
+    deleted before deletions purged expenses.
+    """
+    # Sorting on the user_id index prefix lets the $group skip through it
+    cursor = Expense.get_motor_collection().aggregate(
+        [{"$sort": {"user_id": 1}}, {"$group": {"_id": "$user_id"}}]
+    )
+    orphaned: List[UUID] = []
+    user_ids: List[UUID] = []
+    async for group in cursor:
+        user_ids.append(group["_id"].as_uuid())
+        if len(user_ids) == batch_size:
+            orphaned += await _missing_user_ids(user_ids)
+            user_ids = []
+    if user_ids:
+        orphaned += await _missing_user_ids(user_ids)
+    return orphaned
+
+
+async def _missing_user_ids(user_ids: List[UUID]) -> List[UUID]:
+    """Get the IDs among user_ids that have no profile"""
+    users = await UserProfile.find({"_id": {"$in": user_ids}}).to_list()
+    existing = {user.id for user in users}
+    return [user_id for user_id in user_ids if user_id not in existing]
 
 
 def serialize_user(user: UserProfile) -> Dict[str, Any]:
     """
     Serialize a user object to a dictionary.
     """
-    return {"id": str(user.id), "expense_ids": user.expense_ids}
+    return {"id": user.id}
+
+
+def is_stale(job: UserDeletionJob) -> bool:
+    """
+    Check whether an unfinished job made no progress for
+    USER_DELETION_STALE_SECONDS, i.e. was cut short and needs a rerun.
+    """
+    stale_before = datetime.utcnow() - timedelta(
+        seconds=settings.USER_DELETION_STALE_SECONDS
+    )
+    return job.status in UserDeletionStatus.UNFINISHED and job.updated_at < stale_before
+
+
+def serialize_deletion_job(job: UserDeletionJob) -> Dict[str, Any]:
+    """
+    Serialize a user deletion job to a dictionary.
+    """
+    return {
+        "id": job.id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "expenses_deleted": job.expenses_deleted,
+        "orphans": job.orphans,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "stale": is_stale(job),
+    }
@@ -0,0 +1,57 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.db import close_motor_client, initialize_beanie
+from users import crud
+from users.models import UserDeletionJob, UserDeletionStatus
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the user deletion jobs left unfinished (e.g. by a restart), then "
+        "report users without a profile whose expenses are still stored."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Start a deletion job for each user with orphaned expenses",
+        )
+
+    def handle(self, *args, **options):
+        jobs, orphaned = asyncio.run(self._purge(options["fix"]))
+
+        for job in jobs:
+            self.stdout.write(
+                f"{job.user_id}: {job.status}, "
+                f"{job.expenses_deleted} expenses deleted"
+                + (f" ({job.error})" if job.error else "")
+            )
+        for user_id in orphaned:
+            self.stdout.write(f"{user_id}: orphaned expenses")
+
+        failed = [job for job in jobs if job.status != UserDeletionStatus.DONE]
+        if failed:
+            raise CommandError(f"{len(failed)} user deletions failed")
+        if orphaned and not options["fix"]:
+            raise CommandError(f"{len(orphaned)} deleted users have expenses left")
+        self.stdout.write(self.style.SUCCESS("no orphaned expenses left"))
+
+    async def _purge(self, fix):
+        await initialize_beanie()
+        try:
+            jobs = []
+            for job in await crud.get_unfinished_deletion_jobs():
+                jobs.append(await crud.run_user_deletion(job))
+
+            orphaned = await crud.find_orphaned_user_ids()
+            if fix:
+                for user_id in orphaned:
+                    job = UserDeletionJob(user_id=user_id)
+                    await job.insert()
+                    jobs.append(await crud.run_user_deletion(job))
+            return jobs, orphaned
+        finally:
+            close_motor_client()
@@ -1,19 +1,25 @@
-from typing import List
+from datetime import datetime
+from typing import Optional
 import uuid
 from uuid import UUID
 from beanie import Document
 from pydantic import Field
+from pymongo import ASCENDING, IndexModel
 
 
 class UserProfile(Document):
     """Document model for user profiles"""
 
     id: UUID = Field(default_factory=uuid.uuid4)
-    expense_ids: List[str] = Field(default_factory=list)
+    # A user's expense count and total are kept by the expense writes in
+    # expenses.models.UserExpenseState, not in this document
 
     class Settings:
         name = "users"  # Collection name in MongoDB
         use_state_management = True
+        # Users are only looked up by `id`, stored as the uniquely indexed
+        # `_id`, so no secondary indexes are declared.
+        indexes = []
 
     class Config:
         arbitrary_types_allowed = True
@@ -21,3 +27,46 @@ class UserProfile(Document):
     def __str__(self):
         """String representation of the user profile"""
         return str(self.id)
+
+
+class UserDeletionStatus:
+    """States of a user deletion job"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    UNFINISHED = [PENDING, RUNNING]
+
+
+class UserDeletionJob(Document):
+    """
+    Background purge of a deleted user's expenses and derived data
+    (see crud.run_user_deletion), kept afterwards as a record of it.
+    """
+
+    id: UUID = Field(default_factory=uuid.uuid4)
+    user_id: UUID
+    status: str = UserDeletionStatus.PENDING
+    expenses_deleted: int = 0
+    # Documents of the user still found by the final verification
+    orphans: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Last progress, to tell jobs cut short from jobs still running
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "user_deletion_jobs"
+        # Unfinished jobs are looked up by status to be resumed
+        indexes = [
+            IndexModel(
+                [("status", ASCENDING), ("created_at", ASCENDING)],
+                name="status_created_at",
+            ),
+        ]
+
+    class Config:
+        arbitrary_types_allowed = True
@@ -3,5 +3,10 @@ from . import views
 
 urlpatterns = [
     path("test-auth/", views.TestAuthView.as_view(), name="test-auth"),
+    path(
+        "deletions/<str:job_id>/",
+        views.UserDeletionView.as_view(),
+        name="user-deletion",
+    ),
     path("", views.UserView.as_view(), name="user"),
 ]
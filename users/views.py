@@ -1,66 +1,85 @@
 import json
-from django.http import JsonResponse, HttpRequest
+from django.http import HttpRequest
+from django.urls import reverse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from config.responses import FastJsonResponse
 from .auth import get_user_id_from_request
 from . import crud
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class TestAuthView(View):
-    async def get(self, request: HttpRequest) -> JsonResponse:
+    async def get(self, request: HttpRequest) -> FastJsonResponse:
         """Test authentication endpoint"""
         user_id = get_user_id_from_request(request)
         if not user_id:
-            return JsonResponse({"detail": "Authentication failed"}, status=401)
+            return FastJsonResponse({"detail": "Authentication failed"}, status=401)
 
-        return JsonResponse({"message": f"Auth test successful for user {user_id}"})
+        return FastJsonResponse({"message": f"Auth test successful for user {user_id}"})
 
 
 @method_decorator(csrf_exempt, name="dispatch")
 class UserView(View):
-    async def post(self, request: HttpRequest) -> JsonResponse:
+    async def post(self, request: HttpRequest) -> FastJsonResponse:
         """Create a new user"""
         try:
             data = json.loads(request.body)
             user_id = data.get("id")
 
             if not user_id:
-                return JsonResponse({"detail": "id is required"}, status=400)
+                return FastJsonResponse({"detail": "id is required"}, status=400)
 
             # Create user
-            user = await crud.create_user(user_id)
-
-            if not user:
-                return JsonResponse(
-                    {"detail": "user already exists or invalid UUID format"}, status=400
-                )
+            try:
+                user = await crud.create_user(user_id)
+            except crud.UserAlreadyExistsError as e:
+                return FastJsonResponse({"detail": str(e)}, status=409)
+            except ValueError:
+                return FastJsonResponse({"detail": "invalid UUID format"}, status=400)
 
             # Return created user
-            return JsonResponse(crud.serialize_user(user), status=201)
+            return FastJsonResponse(crud.serialize_user(user), status=201)
 
         except json.JSONDecodeError:
-            return JsonResponse({"detail": "Invalid JSON"}, status=400)
+            return FastJsonResponse({"detail": "Invalid JSON"}, status=400)
         except Exception as e:
-            return JsonResponse({"detail": str(e)}, status=400)
+            return FastJsonResponse({"detail": str(e)}, status=400)
 
-    async def delete(self, request: HttpRequest) -> JsonResponse:
+    async def delete(self, request: HttpRequest) -> FastJsonResponse:
         """Delete a user"""
         try:
             user_id = request.GET.get("id")
             if not user_id:
-                return JsonResponse({"detail": "id parameter is required"}, status=400)
+                return FastJsonResponse({"detail": "id parameter is required"}, status=400)
 
-            # Delete user
-            success = await crud.delete_user(user_id)
+            # Delete user, their expenses are purged in the background
+            job = await crud.delete_user(user_id)
 
-            if success:
-                return JsonResponse({"message": "user deleted"}, status=200)
+            if job:
+                return FastJsonResponse(
+                    {
+                        "message": "user deleted",
+                        "job_id": job.id,
+                        "status_url": reverse("user-deletion", args=[job.id]),
+                    },
+                    status=200,
+                )
             else:
-                return JsonResponse(
+                return FastJsonResponse(
                     {"detail": "user not found or invalid UUID format"}, status=404
                 )
 
         except Exception as e:
-            return JsonResponse({"detail": str(e)}, status=400)
+            return FastJsonResponse({"detail": str(e)}, status=400)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class UserDeletionView(View):
+    async def get(self, request: HttpRequest, job_id: str) -> FastJsonResponse:
+        """Get the progress of a user deletion"""
+        job = await crud.get_deletion_job(job_id)
+        if not job:
+            return FastJsonResponse({"detail": "deletion not found"}, status=404)
+        return FastJsonResponse(crud.serialize_deletion_job(job))